@@ -9,11 +9,11 @@
 
 
 import httplib
-import httplib2
 import logging
 import os
 import simplejson as json
 import socket
+import threading
 import time
 import urllib
 
@@ -27,6 +27,11 @@ logger = logging.getLogger(name=__name__)
 
 TIMEOUT = 15
 
+# Handler instances shared across the process keyed by handler path and
+# instantiation arguments.
+_api_handlers = {}
+_api_handlers_lock = threading.Lock()
+
 
 ##############################################################################
 # Exceptions
@@ -124,6 +129,8 @@ class APIHandlerHTTP(object):
         :raises JSONDecodeError: If status code is 200, but content is not
                 JSON.
         '''
+        # import locally to speed up imports of api_handler.py
+        import httplib2
         # Prepare the request object:
         body = urllib.urlencode(body)
         disable_validation = not os.path.exists(settings.CA_CERTIFICATE_FILE)
@@ -212,6 +219,10 @@ def get_api_handler(handler_path, *args, **kwargs):
     '''
     Returns an instance of the class specified by the handler_path.
 
+    Instances are created once per process for each combination of
+    handler_path and instantiation arguments so that handlers which load
+    data when created, e.g. AnalysisEngineAPIHandlerLocal, only do so once.
+
     :param handler_path: Path to handler module, e.g. project.module.APIHandler
     :type handler_path: string
     :param args: Handler class instantiation args.
@@ -219,6 +230,26 @@ def get_api_handler(handler_path, *args, **kwargs):
     :param kwargs: Handler class instantiation kwargs.
     :type kwargs: dict
     '''
+    key = (handler_path, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable instantiation arguments cannot be memoised.
+        return _create_api_handler(handler_path, *args, **kwargs)
+    with _api_handlers_lock:
+        if key not in _api_handlers:
+            _api_handlers[key] = _create_api_handler(handler_path, *args,
+                                                     **kwargs)
+        return _api_handlers[key]
+
+
+def _create_api_handler(handler_path, *args, **kwargs):
+    '''
+    Creates an instance of the class specified by the handler_path.
+
+    :param handler_path: Path to handler module, e.g. project.module.APIHandler
+    :type handler_path: string
+    '''
     import_path_split = handler_path.split('.')
     class_name = import_path_split.pop()
     module_path = '.'.join(import_path_split)
@@ -228,5 +259,14 @@ def get_api_handler(handler_path, *args, **kwargs):
     return handler_class(*args, **kwargs)
 
 
+def clear_api_handlers():
+    '''
+    Discards memoised handler instances, e.g. after local API data files
+    have changed.
+    '''
+    with _api_handlers_lock:
+        _api_handlers.clear()
+
+
 ##############################################################################
 # vim:et:ft=python:nowrap:sts=4:sw=4:ts=4
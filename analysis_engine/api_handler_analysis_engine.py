@@ -8,14 +8,15 @@
 # Imports
 
 import logging
+import numpy as np
 import os
 import simplejson
 import urllib
 import yaml
 
 from abc import ABCMeta, abstractmethod
-from copy import copy
-from operator import itemgetter
+from copy import deepcopy
+from scipy.spatial import cKDTree
 
 from analysis_engine.api_handler import (APIHandlerHTTP,
                                          IncompleteEntryError,
@@ -311,6 +312,79 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
 # Local API Handler
 ###################
 
+
+class NearestLocationIndex(object):
+    '''
+    Spatial index of records with coordinates for nearest neighbour lookups.
+
+    Coordinates are converted to points on the unit sphere and stored in a
+    k-d tree. Straight line (chord) distance between points on a sphere
+    increases monotonically with great circle distance, so the nearest point
+    within the tree is also the nearest record by great circle distance.
+    '''
+
+    def __init__(self, records, get_coords):
+        '''
+        :param records: Records to index.
+        :type records: [dict]
+        :param get_coords: Returns a (latitude, longitude) tuple for a record or None if it has no coordinates.
+        :type get_coords: callable
+        '''
+        self.records = []
+        coords = []
+        for record in records:
+            record_coords = get_coords(record)
+            if record_coords is None:
+                continue
+            self.records.append(record)
+            coords.append(record_coords)
+        self._tree = cKDTree(self._to_xyz(coords)) if coords else None
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _to_xyz(coords):
+        '''
+        :param coords: (latitude, longitude) in decimal degrees.
+        :type coords: [(float, float)]
+        :returns: Cartesian coordinates on the unit sphere.
+        :rtype: np.ndarray
+        '''
+        lat, lon = np.radians(np.asarray(coords, dtype=np.float64)).T
+        cos_lat = np.cos(lat)
+        return np.column_stack((cos_lat * np.cos(lon),
+                                cos_lat * np.sin(lon),
+                                np.sin(lat)))
+
+    def nearest(self, latitude, longitude):
+        '''
+        :param latitude: Latitude in decimal degrees.
+        :type latitude: float
+        :param longitude: Longitude in decimal degrees.
+        :type longitude: float
+        :returns: Nearest record or None if there are no records.
+        :rtype: dict or None
+        '''
+        if self._tree is None:
+            return None
+        index = self._tree.query(self._to_xyz([(latitude, longitude)])[0])[1]
+        return self.records[index]
+
+
+def _airport_coords(airport):
+    if 'latitude' not in airport or 'longitude' not in airport:
+        return None
+    return airport['latitude'], airport['longitude']
+
+
+def _runway_coords(runway):
+    runway_coords = runway.get('start', runway.get('end'))
+    if not runway_coords:
+        return None
+    return runway_coords['latitude'], runway_coords['longitude']
+
+
 class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
     
     
@@ -346,6 +420,30 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         logger.debug("Loading local API exports from '%s'",
                      LOCAL_API_EXPORTS_PATH)
         self.exports = self._load_data(LOCAL_API_EXPORTS_PATH)
+        self._airport_index = None
+        self._runway_index = None
+
+    @property
+    def airport_index(self):
+        '''
+        :returns: Spatial index of airports, built on first use.
+        :rtype: NearestLocationIndex
+        '''
+        if self._airport_index is None:
+            self._airport_index = NearestLocationIndex(self.airports,
+                                                       _airport_coords)
+        return self._airport_index
+
+    @property
+    def runway_index(self):
+        '''
+        :returns: Spatial index of runways, built on first use.
+        :rtype: NearestLocationIndex
+        '''
+        if self._runway_index is None:
+            self._runway_index = NearestLocationIndex(self.runways,
+                                                      _runway_coords)
+        return self._runway_index
     
     def get_aircraft(self, tail_number):
         '''
@@ -359,10 +457,12 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         :rtype: dict
         '''
         try:
-            return self.aircraft[tail_number]
+            aircraft = self.aircraft[tail_number]
         except KeyError:
             raise NotFoundError("Local API Handler: Aircraft with tail number "
                                 "'%s' could not be found." % tail_number)
+        # Copied as the handler is shared by every flight processed.
+        return deepcopy(aircraft)
     
     def get_airport(self, code):
         '''
@@ -382,7 +482,7 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         else:
             raise NotFoundError("Local API Handler: Airport with code '%s' "
                                 "could not be found." % code)
-        return airport
+        return deepcopy(airport)
     
     def get_analyser_profiles(self, tail_number):
         '''
@@ -408,17 +508,13 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         :returns: Airport dictionary.
         :rtype: dict
         '''
-        airports = []
-        for airport in self.airports:
-            if 'latitude' not in airport or 'longitude' not in airport:
-                continue
-            airport = copy(airport)
-            airport['distance'] = bearing_and_distance(latitude, longitude,
-                                                       airport['latitude'],
-                                                       airport['longitude'])[1]
-            airports.append(airport)
-        
-        airport = min(airports, key=itemgetter('distance'))
+        airport = self.airport_index.nearest(latitude, longitude)
+        if airport is None:
+            raise NotFoundError('Local API Handler: Airport could not be found')
+        airport = deepcopy(airport)
+        airport['distance'] = bearing_and_distance(latitude, longitude,
+                                                   airport['latitude'],
+                                                   airport['longitude'])[1]
         return airport
 
     def get_nearest_runway(self, airport_id, heading, latitude=None,
@@ -455,18 +551,13 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
             # Still no luck? Fail.
             raise NotFoundError('Local API Handler: Runway could not be found')
 
-        runways = []
-        for runway in self.runways:
-            runway = copy(runway)
-            runway_coords = runway.get('start', runway.get('end'))
-            if not runway_coords:
-                continue
-            runway['distance'] = bearing_and_distance(
-                latitude, longitude, runway_coords['latitude'],
-                runway_coords['longitude'])[1]
-            runways.append(runway)
-
-        runway = min(runways, key=itemgetter('distance'))
+        runway = self.runway_index.nearest(latitude, longitude)
+        if runway is None:
+            raise NotFoundError('Local API Handler: Runway could not be found')
+        runway = deepcopy(runway)
+        runway_latitude, runway_longitude = _runway_coords(runway)
+        runway['distance'] = bearing_and_distance(
+            latitude, longitude, runway_latitude, runway_longitude)[1]
         return runway
 
     def get_data_exports(self, tail_number):
@@ -481,10 +572,11 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         :rtype: dict
         '''
         try:
-            return self.exports[tail_number]
+            exports = self.exports[tail_number]
         except (KeyError, TypeError):
             raise NotFoundError("Local API Handler: Aircraft with tail number "
                                 "'%s' could not be found." % tail_number)
+        return deepcopy(exports)
 
 
 ##############################################################################
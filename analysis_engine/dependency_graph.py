@@ -1,25 +1,52 @@
+import ast
+import cPickle
+import inspect
 import os
+import pprint
 import sys
 import logging 
 import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
+import threading
 
-from collections import deque
+from collections import deque, OrderedDict
+from hashlib import sha256
 
 from flightdatautilities.dict_helpers import dict_filter
 
+from analysis_engine import settings, __version__
 from analysis_engine.node import (
     ApproachNode,
     DerivedParameterNode,
+    MultiOutputParameterNode,
     MultistateDerivedParameterNode,
     FlightAttributeNode,
     FlightPhaseNode,
     KeyPointValueNode,
     KeyTimeInstanceNode,
+    can_operate_attribute_names,
 )
 
 logger = logging.getLogger(__name__)
 not_windows = sys.platform not in ('win32', 'win64') # False for Windows :-(
 
+# Dependency orders keyed by dependency_order_key, most recently used last.
+_dependency_order_cache = OrderedDict()
+_dependency_order_cache_lock = threading.Lock()
+# Hashes of node module source files keyed by module name.
+_module_hashes = {}
+# Hashes of the source of each class defined at the top level of a module,
+# keyed by module name and then class name.
+_class_hashes = {}
+# Hashes of the source of the statements at the top level of a module other
+# than class definitions, e.g. imports and helper functions, keyed by module
+# name.
+_module_code_hashes = {}
+# Hashes of the version and files of packages keyed by package name.
+_package_hashes = {}
+# Packages outside of analysis_engine whose code and tables are read by the
+# can_operate and derive methods of nodes, e.g. aircraft tables.
+NODE_PACKAGES = ('flightdatautilities',)
+
 """
 TODO:
 =====
@@ -275,6 +302,7 @@ def graph_nodes(node_mgr):
         ApproachNode: '#663399', # purple
         MultistateDerivedParameterNode: '#2aa52a', # dark green
         DerivedParameterNode: '#72cdf4',  # fds-blue
+        MultiOutputParameterNode: '#72cdf4',  # fds-blue
         FlightAttributeNode: '#b88a00',  # brown
         FlightPhaseNode: '#d93737',  # red
         KeyPointValueNode: '#bed630',  # fds-green
@@ -442,3 +470,313 @@ def dependency_order(node_mgr, draw=not_windows,
     return order, gr_st
 
 
+def _module_source(module_name):
+    '''
+    :param module_name: Name of an imported module.
+    :type module_name: str
+    :returns: Source of the module or None if it is unavailable.
+    :rtype: str or None
+    '''
+    module = sys.modules.get(module_name)
+    try:
+        path = os.path.splitext(inspect.getfile(module))[0] + '.py'
+        with open(path, 'rb') as source:
+            return source.read()
+    except (IOError, TypeError):
+        return None
+
+
+def _module_hash(module_name):
+    '''
+    :param module_name: Name of module containing node classes.
+    :type module_name: str
+    :returns: Hash of the module's source file or the module name if the source is unavailable.
+    :rtype: str
+    '''
+    if module_name not in _module_hashes:
+        source = _module_source(module_name)
+        _module_hashes[module_name] = \
+            module_name if source is None else sha256(source).hexdigest()
+    return _module_hashes[module_name]
+
+
+def _package_hash(package_name):
+    '''
+    :param package_name: Name of a package.
+    :type package_name: str
+    :returns: Hash of the package's version and the files within its directory or the package name if it cannot be imported.
+    :rtype: str
+    '''
+    if package_name not in _package_hashes:
+        try:
+            package = __import__(package_name, globals(), locals(), [''])
+        except ImportError:
+            _package_hashes[package_name] = package_name
+            return package_name
+        key = sha256('version:%s\n' % getattr(package, '__version__', None))
+        root = os.path.dirname(inspect.getfile(package))
+        for dir_path, dir_names, file_names in os.walk(root):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1] in ('.pyc', '.pyo'):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                key.update('file:%s\n' % os.path.relpath(path, root))
+                with open(path, 'rb') as package_file:
+                    key.update(package_file.read())
+        _package_hashes[package_name] = key.hexdigest()
+    return _package_hashes[package_name]
+
+
+def _parse_module(module_name):
+    '''
+    Hash the source of every top level statement of a module from a single
+    parse rather than searching the module's source for each class.
+    Statements other than class definitions are hashed together as they may
+    be used by any class within the module.
+
+    :param module_name: Name of module containing node classes.
+    :type module_name: str
+    '''
+    if module_name in _class_hashes:
+        return
+    hashes = _class_hashes[module_name] = {}
+    source = _module_source(module_name)
+    if source is None:
+        _module_code_hashes[module_name] = _module_hash(module_name)
+        return
+    code = sha256()
+    lines = source.splitlines(True)
+    body = ast.parse(source).body
+    stops = [n.lineno - 1 for n in body[1:]] + [len(lines)]
+    for statement, stop in zip(body, stops):
+        # Decorators precede the statement's line number.
+        start = min([statement.lineno] +
+                    [d.lineno for d in
+                     getattr(statement, 'decorator_list', [])])
+        statement_source = ''.join(lines[start - 1:stop])
+        if isinstance(statement, ast.ClassDef):
+            hashes[statement.name] = sha256(statement_source).hexdigest()
+        else:
+            code.update(statement_source)
+    _module_code_hashes[module_name] = code.hexdigest()
+
+
+def _class_hash(cls):
+    '''
+    :param cls: Class to hash.
+    :type cls: type
+    :returns: Hash of the class' source or of its module's source if the class is not defined at the top level of the module.
+    :rtype: str
+    '''
+    module_name = cls.__module__
+    _parse_module(module_name)
+    return _class_hashes[module_name].get(cls.__name__) or \
+        _module_hash(module_name)
+
+
+def _module_code_hash(module_name):
+    '''
+    :param module_name: Name of module containing node classes.
+    :type module_name: str
+    :returns: Hash of the source of the module's top level statements other than class definitions or of the module's source if it cannot be parsed.
+    :rtype: str
+    '''
+    _parse_module(module_name)
+    return _module_code_hashes[module_name]
+
+
+def dependency_order_key(node_mgr):
+    '''
+    Creates a key which identifies the inputs to dependency_order so that
+    flights with the same available parameters, requested and required
+    nodes, node modules, NODE_PACKAGES and attribute values share a
+    processing order.
+
+    :param node_mgr: 
+    :type node_mgr: NodeManager
+    :returns: Hex digest identifying the dependency order.
+    :rtype: str
+    '''
+    key = sha256(__version__)
+    for name in sorted(node_mgr.hdf_keys):
+        key.update('hdf:%s\n' % name)
+    for name in sorted(node_mgr.requested):
+        key.update('requested:%s\n' % name)
+    for name in sorted(node_mgr.required):
+        key.update('required:%s\n' % name)
+    # NodeManager.operational treats available attributes as operational
+    # nodes.
+    for name in sorted(set(node_mgr.aircraft_info) |
+                       set(node_mgr.achieved_flight_record) |
+                       set(node_mgr.segment_info)):
+        key.update('attribute:%s\n' % name)
+    attribute_names = set()
+    module_names = set()
+    for name in sorted(node_mgr.derived_nodes):
+        node_class = node_mgr.derived_nodes[name]
+        key.update('node:%s:%s:%s\n' % (
+            name, node_class.__module__,
+            ','.join(node_class.get_dependency_names())))
+        module_names.add(node_class.__module__)
+        try:
+            attribute_names.update(can_operate_attribute_names(node_class))
+        except TypeError:
+            pass
+    for module_name in sorted(module_names):
+        key.update('module:%s:%s\n' % (module_name,
+                                        _module_hash(module_name)))
+    # Tables read by can_operate methods, e.g. aircrafttables.
+    for package_name in NODE_PACKAGES:
+        key.update('package:%s:%s\n' % (package_name,
+                                         _package_hash(package_name)))
+    # Values of attributes inspected by can_operate methods.
+    for name in sorted(attribute_names):
+        attribute = node_mgr.get_attribute(name)
+        value = attribute.value if attribute else None
+        key.update('value:%s:%s\n' % (name, pprint.pformat(value)))
+    return key.hexdigest()
+
+
+def cached_dependency_order(node_mgr, cache_size=None, cache_dir=None,
+                            raise_inoperable_requested=False):
+    '''
+    Retrieves the processing order of nodes and the spanning tree from
+    memory or disk if a flight with the same dependency_order_key has been
+    processed before, otherwise resolves them with dependency_order.
+
+    :param node_mgr: 
+    :type node_mgr: NodeManager
+    :param cache_size: Maximum number of dependency orders kept in memory. Defaults to settings.DEPENDENCY_ORDER_CACHE_SIZE.
+    :type cache_size: int or None
+    :param cache_dir: Directory where dependency orders are pickled. Defaults to settings.DEPENDENCY_ORDER_CACHE_DIR; not stored on disk if None.
+    :type cache_dir: str or None
+    :returns: List of Nodes determining the order for processing and the spanning tree graph.
+    :rtype: (list of strings, dict)
+    '''
+    if cache_size is None:
+        cache_size = settings.DEPENDENCY_ORDER_CACHE_SIZE
+    if cache_dir is None:
+        cache_dir = settings.DEPENDENCY_ORDER_CACHE_DIR
+    key = dependency_order_key(node_mgr)
+
+    with _dependency_order_cache_lock:
+        cached = _dependency_order_cache.pop(key, None)
+        if cached is not None:
+            _dependency_order_cache[key] = cached
+
+    cache_path = os.path.join(cache_dir, key + '.pkl') if cache_dir else None
+    if cached is None and cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                cached = cPickle.load(cache_file)
+        except Exception:
+            logger.exception("Unable to load dependency order from '%s'.",
+                             cache_path)
+        else:
+            logger.info("Loaded dependency order from '%s'.", cache_path)
+
+    if cached is None:
+        cached = dependency_order(
+            node_mgr, draw=False,
+            raise_inoperable_requested=raise_inoperable_requested)
+        if cache_path:
+            # Write to a temporary file first so that concurrent processes
+            # never read a partially written file.
+            temp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            with open(temp_path, 'wb') as cache_file:
+                cPickle.dump(cached, cache_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, cache_path)
+    else:
+        logger.info("Using cached dependency order '%s'.", key)
+
+    if cache_size:
+        with _dependency_order_cache_lock:
+            _dependency_order_cache[key] = cached
+            while len(_dependency_order_cache) > cache_size:
+                _dependency_order_cache.popitem(last=False)
+
+    order, gr_st = cached
+    # Copies protect the cache from modification by the caller.
+    return list(order), gr_st.copy()
+
+
+def clear_dependency_order_cache():
+    '''
+    Clears dependency orders cached in memory.
+    '''
+    with _dependency_order_cache_lock:
+        _dependency_order_cache.clear()
+    _module_hashes.clear()
+    _class_hashes.clear()
+    _module_code_hashes.clear()
+    _package_hashes.clear()
+
+
+def node_fingerprints(node_mgr, lfl_param_names):
+    '''
+    Fingerprint each derived node from the source of its class (and base
+    classes), the code outside of class definitions within their modules
+    (helper functions, imports and constants), the modules within
+    settings.NODE_FINGERPRINT_MODULES, the packages within NODE_PACKAGES and
+    the fingerprints of its dependencies. A node's fingerprint therefore
+    only changes if its own code, code shared by all nodes or any of its
+    inputs have changed since it was last derived.
+
+    LFL parameters are fingerprinted by name and attributes by value.
+
+    :param node_mgr: Node manager providing derived nodes and attributes.
+    :type node_mgr: NodeManager
+    :param lfl_param_names: Names of parameters within the HDF file which are not derived.
+    :type lfl_param_names: [str]
+    :returns: Hex digest fingerprints of derived nodes keyed by name.
+    :rtype: dict
+    '''
+    lfl_param_names = set(lfl_param_names)
+    shared = sha256()
+    for module_name in settings.NODE_FINGERPRINT_MODULES:
+        shared.update('%s:%s\n' % (module_name, _module_hash(module_name)))
+    for package_name in NODE_PACKAGES:
+        shared.update('package:%s:%s\n' % (package_name,
+                                            _package_hash(package_name)))
+    shared = shared.hexdigest()
+
+    fingerprints = {}
+    # Nodes whose fingerprint is being created, to detect cycles.
+    visiting = set()
+
+    def fingerprint(name):
+        if name in fingerprints:
+            return fingerprints[name]
+        if name in lfl_param_names:
+            return 'lfl:%s' % name
+        attribute = node_mgr.get_attribute(name)
+        if attribute is not None:
+            return 'attribute:%s:%s' % (name, pprint.pformat(attribute.value))
+        node_class = node_mgr.derived_nodes.get(name)
+        if node_class is None:
+            return 'missing:%s' % name
+        if name in visiting:
+            return 'cycle:%s' % name
+        visiting.add(name)
+        if not isinstance(node_class, type):
+            node_class = type(node_class)
+        key = sha256(shared)
+        module_names = set()
+        for cls in node_class.__mro__[:-1]:
+            key.update('class:%s.%s:%s\n' % (cls.__module__, cls.__name__,
+                                             _class_hash(cls)))
+            module_names.add(cls.__module__)
+        for module_name in sorted(module_names):
+            key.update('module:%s:%s\n' % (module_name,
+                                           _module_code_hash(module_name)))
+        for dep_name in node_class.get_dependency_names():
+            key.update('dependency:%s\n' % fingerprint(dep_name))
+        visiting.discard(name)
+        fingerprints[name] = key.hexdigest()
+        return fingerprints[name]
+
+    for name in node_mgr.derived_nodes:
+        if name not in lfl_param_names:
+            fingerprint(name)
+    return fingerprints
@@ -6,15 +6,12 @@ import geomag
 from copy import deepcopy
 from datetime import date
 from math import radians
-from scipy import interp
-from scipy.interpolate import InterpolatedUnivariateSpline
-from scipy.signal import medfilt
 
 from flightdatautilities import aircrafttables as at, units as ut
 
 from analysis_engine.exceptions import DataFrameError
 from analysis_engine.node import (
-    A, App, DerivedParameterNode, KPV, KTI, M, P, S,
+    A, App, DerivedParameterNode, KPV, KTI, M, MultiOutputParameterNode, P, S,
 )
 from analysis_engine.library import (actuator_mismatch,
                                      air_track,
@@ -81,7 +78,6 @@ from analysis_engine.library import (actuator_mismatch,
                                      second_window,
                                      shift_slice,
                                      slices_and,
-                                     slices_of_runs,
                                      slices_between,
                                      slices_from_ktis,
                                      slices_from_to,
@@ -1004,6 +1000,8 @@ class AltitudeRadioOffsetRemoved(DerivedParameterNode):
     the ground.
     '''
     def derive(self, alt_rad=P('Altitude Radio'), fasts=S('Fast')):
+        # import locally to speed up imports of derived_parameters.py
+        from scipy.signal import medfilt
         self.array = alt_rad.array
         smoothed = np.ma.copy(alt_rad.array)
         smoothed = np.ma.array(medfilt(smoothed, 21), mask=alt_rad.array.mask)
@@ -3701,6 +3699,9 @@ class FlapAngle(DerivedParameterNode):
                flap_D=P('Flap Angle (MCP)'),
                flap_A_inboard=P('Flap Angle (L) Inboard'),
                flap_B_inboard=P('Flap Angle (R) Inboard')):
+        # import locally to speed up imports of derived_parameters.py
+        from scipy import interp
+        from scipy.signal import medfilt
         flap_A = flap_A or flap_A_inboard
         flap_B = flap_B or flap_B_inboard
 
@@ -4244,10 +4245,29 @@ class AimingPointRange(DerivedParameterNode):
             self.array[s] = (app_rng.array[s] - extend) / METRES_TO_NM
 
 
-class CoordinatesSmoothed(object):
+class CoordinatesSmoothed(MultiOutputParameterNode):
     '''
-    Superclass for SmoothedLatitude and SmoothedLongitude classes as they share
-    the adjust_track methods.
+    From a prepared Latitude parameter, which may have been created by
+    straightening out a recorded latitude data set, or from an estimate using
+    heading and true airspeed, we now match the data to the available runway
+    data. (Airspeed is included as an alternative to groundspeed so that the
+    algorithm has wider applicability).
+
+    Where possible we use ILS data to make the landing data as accurate as
+    possible, and we create ground track data with groundspeed and heading if
+    available.
+
+    Once these sections have been created, the parts are 'stitched' together
+    to make a complete latitude trace.
+
+    The first parameter in the derive method is heading_continuous, which is
+    always available and which should always have a sample rate of 1Hz. This
+    ensures that the resulting computations yield a smoothed track with 1Hz
+    spacing, even if the recorded latitude and longitude have only 0.25Hz
+    sample rate.
+
+    Latitude Smoothed and Longitude Smoothed are derived together as both
+    are adjusted by the same track computation.
 
     _adjust_track_pp is used for aircraft with precise positioning, usually
     GPS based and qualitatively determined by a recorded track that puts the
@@ -4259,6 +4279,9 @@ class CoordinatesSmoothed(object):
     cases we use all the data available to correct for errors in the recorded
     position at takeoff, approach and landing.
     '''
+    OUTPUTS = ('Latitude Smoothed', 'Longitude Smoothed')
+    units = ut.DEGREE
+
     def taxi_out_track_pp(self, lat, lon, speed, hdg, freq):
         '''
         Compute a groundspeed and heading based taxi out track.
@@ -4603,31 +4626,6 @@ class CoordinatesSmoothed(object):
 
         return lat_adj, lon_adj
 
-
-class LatitudeSmoothed(DerivedParameterNode, CoordinatesSmoothed):
-    """
-    From a prepared Latitude parameter, which may have been created by
-    straightening out a recorded latitude data set, or from an estimate using
-    heading and true airspeed, we now match the data to the available runway
-    data. (Airspeed is included as an alternative to groundspeed so that the
-    algorithm has wider applicability).
-
-    Where possible we use ILS data to make the landing data as accurate as
-    possible, and we create ground track data with groundspeed and heading if
-    available.
-
-    Once these sections have been created, the parts are 'stitched' together
-    to make a complete latitude trace.
-
-    The first parameter in the derive method is heading_continuous, which is
-    always available and which should always have a sample rate of 1Hz. This
-    ensures that the resulting computations yield a smoothed track with 1Hz
-    spacing, even if the recorded latitude and longitude have only 0.25Hz
-    sample rate.
-    """
-
-    units = ut.DEGREE
-
     # List the minimum acceptable parameters here
     @classmethod
     def can_operate(cls, available):
@@ -4670,56 +4668,8 @@ class LatitudeSmoothed(DerivedParameterNode, CoordinatesSmoothed):
         lat_adj, lon_adj = self._adjust_track(
             lon, lat, ils_loc, app_range, hdg, gspd, tas, toff, toff_rwy, tdwns,
             approaches, mobile, precision)
-        self.array = track_linking(lat.array, lat_adj)
-
-
-class LongitudeSmoothed(DerivedParameterNode, CoordinatesSmoothed):
-    """
-    See Latitude Smoothed for notes.
-    """
-
-    units = ut.DEGREE
-    ##align_frequency = 1.0
-    ##align_offset = 0.0
-
-    @classmethod
-    def can_operate(cls, available):
-        return all_of((
-            'Latitude Prepared',
-            'Longitude Prepared',
-            'Approach Range',
-            'Airspeed True',
-            'Precise Positioning',
-            'Takeoff',
-            'FDR Takeoff Runway',
-            'Touchdown',
-            'Approach Information',
-            'Mobile'), available) \
-               and any_of(('Heading True Continuous',
-                           'Heading Continuous'), available)
-
-    def derive(self, lat = P('Latitude Prepared'),
-               lon = P('Longitude Prepared'),
-               hdg_mag=P('Heading Continuous'),
-               ils_loc = P('ILS Localizer'),
-               app_range = P('Approach Range'),
-               hdg_true = P('Heading True Continuous'),
-               gspd = P('Groundspeed'),
-               tas = P('Airspeed True'),
-               precise =A('Precise Positioning'),
-               toff = S('Takeoff'),
-               toff_rwy = A('FDR Takeoff Runway'),
-               tdwns = S('Touchdown'),
-               approaches = App('Approach Information'),
-               mobile=S('Mobile'),
-               ):
-        precision = bool(getattr(precise, 'value', False))
-
-        hdg = hdg_true if hdg_true else hdg_mag
-        lat_adj, lon_adj = self._adjust_track(lon, lat, ils_loc, app_range, hdg,
-                                            gspd, tas, toff, toff_rwy,
-                                            tdwns, approaches, mobile, precision)
-        self.array = track_linking(lon.array, lon_adj)
+        self.set_output('Latitude Smoothed', track_linking(lat.array, lat_adj))
+        self.set_output('Longitude Smoothed', track_linking(lon.array, lon_adj))
 
 
 class Mach(DerivedParameterNode):
@@ -4762,6 +4712,8 @@ class MagneticVariation(DerivedParameterNode):
     def derive(self, lat=P('Latitude'), lat_coarse=P('Latitude (Coarse)'),
                lon=P('Longitude'), lon_coarse=P('Longitude (Coarse)'),
                alt_aal=P('Altitude AAL'), start_datetime=A('Start Datetime')):
+        # import locally to speed up imports of derived_parameters.py
+        from scipy.interpolate import InterpolatedUnivariateSpline
 
         lat = lat or lat_coarse
         lon = lon or lon_coarse
@@ -7488,7 +7440,7 @@ class FlapManoeuvreSpeed(DerivedParameterNode):
         fms_table = at.get_fms_map(model.value, series.value, family.value)
 
         # For each flap detent calculate the flap manoeuvring speed:
-        for detent, slices in slices_of_runs(flap.array):
+        for detent, slices in flap.slices_of_runs():
 
             fms = fms_table.get(detent)
             if fms is None:
@@ -174,13 +174,20 @@ def json_to_process_flight(txt):
     return res
 
 
-def process_flight_to_nodes(pf_results):
+def process_flight_to_nodes(pf_results, derived_nodes=None):
     '''
     Load process flight results into Node objects.
+
+    :param pf_results: Results as returned by process_flight.
+    :type pf_results: dict
+    :param derived_nodes: Node classes keyed by name. Found within settings.NODE_MODULES if not provided.
+    :type derived_nodes: dict or None
+    :rtype: dict
     '''
     from analysis_engine import node
     
-    derived_nodes = get_derived_nodes(settings.NODE_MODULES)
+    if derived_nodes is None:
+        derived_nodes = get_derived_nodes(settings.NODE_MODULES)
     
     params = {}
     
@@ -264,6 +264,7 @@ class AccelerationLateralDuringTakeoffMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Takeoff Roll',)
 
     def derive(self,
                acc_lat=P('Acceleration Lateral Offset Removed'),
@@ -283,6 +284,7 @@ class AccelerationLateralDuringLandingMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Landing Roll',)
 
     def derive(self,
                acc_lat=P('Acceleration Lateral Offset Removed'),
@@ -304,6 +306,7 @@ class AccelerationLateralWhileAirborneMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Airborne',)
 
     def derive(self,
                acc_lat=P('Acceleration Lateral Offset Removed'),
@@ -435,6 +438,7 @@ class AccelerationLongitudinalDuringTakeoffMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Takeoff',)
 
     def derive(self,
                acc_lon=P('Acceleration Longitudinal Offset Removed'),
@@ -450,6 +454,7 @@ class AccelerationLongitudinalDuringLandingMin(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Landing',)
 
     def derive(self,
                acc_lon=P('Acceleration Longitudinal Offset Removed'),
@@ -470,6 +475,7 @@ class AccelerationNormalMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Mobile',)
 
     def derive(self,
                acc_norm=P('Acceleration Normal Offset Removed'),
@@ -503,6 +509,7 @@ class AccelerationNormalWithFlapUpWhileAirborneMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Airborne',)
 
     @classmethod
     def can_operate(cls, available):
@@ -533,6 +540,7 @@ class AccelerationNormalWithFlapUpWhileAirborneMin(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Airborne',)
 
     @classmethod
     def can_operate(cls, available):
@@ -564,6 +572,7 @@ class AccelerationNormalWithFlapDownWhileAirborneMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Airborne',)
 
     @classmethod
     def can_operate(cls, available):
@@ -594,6 +603,7 @@ class AccelerationNormalWithFlapDownWhileAirborneMin(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Airborne',)
 
     @classmethod
     def can_operate(cls, available):
@@ -653,6 +663,7 @@ class AccelerationNormalTakeoffMax(KeyPointValueNode):
     '''
 
     units = ut.G
+    windows = ('Takeoff',)
 
     def derive(self,
                acc_norm=P('Acceleration Normal Offset Removed'),
@@ -8933,9 +8944,8 @@ class GearDownToLandingFlapConfigurationDuration(KeyPointValueNode):
 
             landing_flap_changes = []
             for valid_setting in detents:
-                landing_flap_changes.extend(find_edges_on_state_change(
+                landing_flap_changes.extend(flap_lever.edges_on_state_change(
                     valid_setting,
-                    flap_lever.array,
                     phase=[approach.slice],
                 ))
 
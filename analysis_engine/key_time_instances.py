@@ -11,6 +11,7 @@ from analysis_engine.library import (
     first_valid_sample,
     hysteresis,
     index_at_value,
+    index_at_values,
     last_valid_sample,
     max_value,
     minimum_unmasked,
@@ -1559,18 +1560,22 @@ class AltitudeWhenClimbing(KeyTimeInstanceNode):
 
         climbs = list(takeoff) + list(initial_climb) + list(climb)
         climb_slices = slices_remove_small_gaps([c.slice for c in climbs])
+        # Use height above airfield up to the transition altitude and
+        # standard altitudes above.
+        alt_thresholds = self.NAME_VALUES['altitude']
+        aal_thresholds = [a for a in alt_thresholds
+                          if a <= TRANSITION_ALTITUDE]
+        std_thresholds = [a for a in alt_thresholds
+                          if a > TRANSITION_ALTITUDE]
         for climb_slice in climb_slices:
-            for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is crossed)
-                # per climbing phase.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold, climb_slice)
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per climbing phase.
+            indices = dict(zip(aal_thresholds, index_at_values(
+                alt_aal.array, aal_thresholds, climb_slice)))
+            indices.update(zip(std_thresholds, index_at_values(
+                alt_std.array, std_thresholds, climb_slice)))
+            for alt_threshold in alt_thresholds:
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -1585,22 +1590,24 @@ class AltitudeWhenDescending(KeyTimeInstanceNode):
     def derive(self, descending=S('Descent'),
                alt_aal=P('Altitude AAL'),
                alt_std=P('Altitude STD Smoothed')):
+        # Use height above airfield up to the transition altitude and
+        # standard altitudes above.
+        alt_thresholds = self.NAME_VALUES['altitude']
+        aal_thresholds = [a for a in alt_thresholds
+                          if a <= TRANSITION_ALTITUDE]
+        std_thresholds = [a for a in alt_thresholds
+                          if a > TRANSITION_ALTITUDE]
         for descend in descending:
-            for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is
-                # crossed) per descending phase. The altitude array is
-                # scanned backwards to make sure we trap the last instance at
-                # each height.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold,
-                                       slice(descend.slice.stop,
-                                             descend.slice.start, -1))
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per descending phase. The altitude array is scanned backwards
+            # to make sure we trap the last instance at each height.
+            _slice = slice(descend.slice.stop, descend.slice.start, -1)
+            indices = dict(zip(aal_thresholds, index_at_values(
+                alt_aal.array, aal_thresholds, _slice)))
+            indices.update(zip(std_thresholds, index_at_values(
+                alt_std.array, std_thresholds, _slice)))
+            for alt_threshold in alt_thresholds:
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
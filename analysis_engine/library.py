@@ -10,9 +10,6 @@ from decimal import Decimal
 from hashlib import sha256
 from itertools import izip, izip_longest, tee
 from math import asin, atan2, ceil, cos, degrees, floor, log, radians, sin, sqrt
-from scipy import interpolate as scipy_interpolate, optimize
-from scipy.ndimage import filters
-from scipy.signal import medfilt
 
 from hdfaccess.parameter import MappedArray
 
@@ -356,12 +353,6 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
     assert is_power2(ws) or is_5_10_20(ws), \
            "slave @ %sHz; ws=%s" % (slave_frequency, ws)
 
-    # Trap 5, 10 or 20Hz parameters that have non-zero offsets (this case is not currently covered)
-    if is_5_10_20(wm) and master_offset:
-        raise ValueError('Align: Master offset non-zero at sample rate %sHz' % master_frequency)
-    if is_5_10_20(ws) and slave_offset:
-        raise ValueError('Align: Slave offset non-zero at sample rate %sHz' % slave_frequency)
-
     # Compute the sample rate ratio:
     r = wm / float(ws)
 
@@ -371,15 +362,14 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
     if len_aligned != (len(slave_array) * r):
         raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(len(slave_array) * r, dtype=_dtype)
-
     # Where offsets are equal, the slave_array recorded values remain
     # unchanged and interpolation is performed between these values.
     # - and we do not interpolate mapped arrays!
     if not delta and interpolate and (is_power2(slave_frequency) and
                                       is_power2(master_frequency)):
-        slave_aligned.mask = True
         if master_frequency > slave_frequency:
+            slave_aligned = np.ma.zeros(len_aligned, dtype=_dtype)
+            slave_aligned.mask = True
             # populate values and interpolate
             slave_aligned[0::r] = slave_array[0::1]
             # Interpolate and do not extrapolate masked ends or gaps
@@ -398,53 +388,80 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
             # step through slave taking the required samples
             return slave_array[0::1/r]
 
-    # Each sample in the master parameter may need different combination parameters
-    for i in range(int(wm)):
-        bracket = (i / r) + delta
-        # Interpolate between the hth and (h+1)th samples of the slave array
-        h = int(floor(bracket))
-        h1 = h + 1
-
-        # Compute the linear interpolation coefficients, b & a
-        b = bracket - h
-
+    ws = int(ws)
+    lower, weights = _alignment_kernel(ws, int(wm), delta, interpolate)
+
+    # View the slave array as overlapping rows spanning the previous, current
+    # and next period so that the samples either side of every aligned
+    # sample are gathered at once. Samples outside of the slave array are
+    # masked padding.
+    periods = -(-len(slave_array) // ws)
+    padded_length = (periods + 2) * ws
+    data = np.zeros(padded_length, dtype=slave_array.dtype)
+    data[ws:ws + len(slave_array)] = np.ma.getdata(slave_array)
+    mask = np.ones(padded_length, dtype=np.bool_)
+    mask[ws:ws + len(slave_array)] = np.ma.getmaskarray(slave_array)
+    shape = (periods, 3 * ws)
+    data = np.lib.stride_tricks.as_strided(
+        data, shape, (ws * data.itemsize, data.itemsize))
+    mask = np.lib.stride_tricks.as_strided(
+        mask, shape, (ws * mask.itemsize, mask.itemsize))
+    columns = lower + ws
+
+    # Weights have the precision arithmetic with a Python float would give.
+    dtype = np.result_type(data, 1.0)
+    aligned_data = (1 - weights).astype(dtype) * data[:, columns] + \
+        weights.astype(dtype) * data[:, columns + 1]
+    aligned_mask = mask[:, columns] | mask[:, columns + 1]
+    # We can't interpolate values outside the range of the slave
+    # parameters. Treat ends as "padding"; Value of 0 and Masked.
+    aligned_data[0, columns < ws] = 0
+    aligned_data[-1, columns + 1 >= 2 * ws] = 0
+
+    return np.ma.array(aligned_data.ravel()[:len_aligned].astype(_dtype),
+                       mask=aligned_mask.ravel()[:len_aligned])
+
+
+# Alignment kernels keyed by (slave samples per period, master samples per
+# period, delta, interpolate).
+_alignment_kernels = {}
+
+
+def _alignment_kernel(ws, wm, delta, interpolate):
+    '''
+    Computes the slave sample before each master sample within a period and
+    the weight of the following slave sample when combining the two. A
+    period lasts for ws slave samples and wm master samples.
+
+    :param ws: Number of slave samples within a period.
+    :type ws: int
+    :param wm: Number of master samples within a period.
+    :type wm: int
+    :param delta: Timing disparity in terms of the slave sample interval.
+    :type delta: float
+    :param interpolate: Whether to interpolate between slave samples or take the closest.
+    :type interpolate: bool
+    :returns: Index of the preceding slave sample relative to the start of the period and the weight of the following slave sample for each master sample within the period.
+    :rtype: (np.ndarray, np.ndarray)
+    :raises ValueError: If the timing mismatch exceeds a period.
+    '''
+    key = (ws, wm, delta, interpolate)
+    if key not in _alignment_kernels:
+        # Position of each master sample in terms of slave samples.
+        brackets = np.arange(wm) * ws / float(wm) + delta
+        lower = np.floor(brackets).astype(int)
+        if lower.min() < -ws or lower.max() >= ws:
+            raise ValueError('Align called with excessive timing mismatch')
+        # Compute the linear interpolation coefficients.
+        weights = brackets - lower
         # Cunningly, if we are interpolating (working with mapped arrays e.g.
         # discrete or multi-state parameters), by reverting to 1,0 or 0,1
         # coefficients we gather the closest value in time to the master
         # parameter.
         if not interpolate:
-            b = round(b)
-
-        # Either way, a is the residual part.
-        a = 1 - b
-
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
-
-    return slave_aligned
+            weights = np.array([round(w) for w in weights])
+        _alignment_kernels[key] = (lower, weights)
+    return _alignment_kernels[key]
 
 
 def align_slices(slave, master, slices):
@@ -658,6 +675,9 @@ def calculate_surface_angle(mode, param, detents):
     :returns: array and frequency
     :rtype: np.ma.array, int or float
     '''
+    # import locally to speed up imports of library.py
+    from scipy.ndimage import filters
+    from scipy.signal import medfilt
     freq_multiplier = 4 if param.frequency < 2 else 2
     freq = param.frequency * freq_multiplier
     # No need to re-align if high frequency.
@@ -1921,6 +1941,52 @@ def find_edges(array, _slice=slice(None), direction='rising_edges'):
     return list(edge_list)
 
 
+def state_period_edges(state_periods, length, offset=0, change='entering',
+                       min_samples=1):
+    '''
+    Find the edges of periods within a state, as used by
+    find_edges_on_state_change.
+
+    :param state_periods: Slices where the state is active relative to the start of the scanned section.
+    :type state_periods: [slice]
+    :param length: Length of the scanned section. Periods which start at 0 or stop at length are not entered or left within the section.
+    :type length: int
+    :param offset: Added to the edges, i.e. the start of the scanned section less half a sample.
+    :type offset: int or float
+    :param change: Condition for detecting edge. Default 'entering', 'leaving' and 'entering_and_leaving' alternatives
+    :type change: text
+    :param min_samples: Minimum number of samples within desired state.
+    :type min_samples: int
+    :returns: list of indexes
+    :raises: ValueError if change not recognised
+    '''
+    # ignore small periods where slice is in state, then remove small
+    # gaps where slices are not in state
+    # we are taking 1 away from min_samples here as
+    # slices_remove_small_slices removes slices of less than count
+    state_periods = slices_remove_small_slices(state_periods, count=min_samples - 1)
+    state_periods = slices_remove_small_gaps(state_periods, count=min_samples)
+    edge_list = []
+    for period in state_periods:
+        if change == 'entering':
+            if period.start > 0:
+                edge_list.append(period.start + offset)
+
+        elif change == 'leaving':
+            if period.stop < length:
+                edge_list.append(period.stop + offset)
+
+        elif change == 'entering_and_leaving':
+            if period.start > 0:
+                edge_list.append(period.start + offset)
+            if period.stop < length:
+                edge_list.append(period.stop + offset)
+        else:
+            raise  ValueError("Change '%s'in find_edges_on_state_change not recognised" % change)
+
+    return edge_list
+
+
 def find_edges_on_state_change(state, array, change='entering', phase=None, min_samples=1):
     '''
     Version of find_edges tailored to suit multi-state parameters.
@@ -1954,31 +2020,8 @@ def find_edges_on_state_change(state, array, change='entering', phase=None, min_
         offset = _slice.start - 0.5
         state_periods = np.ma.clump_unmasked(
             np.ma.masked_not_equal(array[_slice], array.state[state]))
-        # ignore small periods where slice is in state, then remove small
-        # gaps where slices are not in state
-        # we are taking 1 away from min_samples here as
-        # slices_remove_small_slices removes slices of less than count
-        state_periods = slices_remove_small_slices(state_periods, count=min_samples - 1)
-        state_periods = slices_remove_small_gaps(state_periods, count=min_samples)
-        edge_list = []
-        for period in state_periods:
-            if change == 'entering':
-                if period.start > 0:
-                    edge_list.append(period.start + offset)
-
-            elif change == 'leaving':
-                if period.stop < length:
-                    edge_list.append(period.stop + offset)
-
-            elif change == 'entering_and_leaving':
-                if period.start > 0:
-                    edge_list.append(period.start + offset)
-                if period.stop < length:
-                    edge_list.append(period.stop + offset)
-            else:
-                raise  ValueError("Change '%s'in find_edges_on_state_change not recognised" % change)
-
-        return edge_list
+        return state_period_edges(state_periods, length, offset=offset,
+                                  change=change, min_samples=min_samples)
 
     if phase is None:
         return state_changes(state, array, change, min_samples=min_samples)
@@ -2745,6 +2788,8 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
     :Invalid mode fails with ValueError
     :Mismatched array lengths fails with ValueError
     """
+    # import locally to speed up imports of library.py
+    from scipy import optimize
     # Build arrays to return the computed track.
     lat_return = np_ma_masked_zeros_like(lat)
     lon_return = np_ma_masked_zeros_like(lat)
@@ -2868,6 +2913,58 @@ def hash_array(array, sections, min_samples):
     return checksum.hexdigest()
 
 
+def _hysteresis_pass(data, quarter_range, initial):
+    """
+    Applies one pass of hysteresis to unmasked data.
+
+    Each step of the hysteresis loop clamps the previous value to within
+    quarter_range of the new sample, and a clamp of a clamp is itself a
+    clamp. The data is split into blocks and the clamp bounds are composed
+    across all blocks at once, one position within the blocks at a time.
+    The value entering each block is then found from the composed bounds of
+    the preceding block, so only about 2*sqrt(len(data)) steps are taken in
+    Python rather than one for every sample.
+
+    :param data: Unmasked data.
+    :type data: np.ndarray
+    :param quarter_range: Distance each sample may be from the result.
+    :type quarter_range: float
+    :param initial: Value of the result before the first sample.
+    :type initial: float
+    :returns: Result of the hysteresis loop at each sample.
+    :rtype: np.ndarray
+    """
+    length = len(data)
+    width = int(ceil(sqrt(length)))
+    blocks = -(-length // width)
+    # Padding with infinite bounds leaves values unchanged.
+    lower = np.empty(blocks * width)
+    lower[:length] = data - quarter_range
+    lower[length:] = -np.inf
+    upper = np.empty(blocks * width)
+    upper[:length] = data + quarter_range
+    upper[length:] = np.inf
+    # Rows are positions within each block, columns are blocks.
+    lower = lower.reshape(blocks, width).T.copy()
+    upper = upper.reshape(blocks, width).T.copy()
+    for index in xrange(1, width):
+        # Compose the bounds from the start of the block with this sample's.
+        new_lower = np.minimum(np.maximum(lower[index - 1], lower[index]),
+                               upper[index])
+        upper[index] = np.minimum(np.maximum(upper[index - 1], lower[index]),
+                                  upper[index])
+        lower[index] = new_lower
+    # Value entering each block.
+    starts = np.empty(blocks)
+    value = initial
+    for block, (block_lower, block_upper) in enumerate(
+            izip(lower[-1].tolist(), upper[-1].tolist())):
+        starts[block] = value
+        value = min(max(value, block_lower), block_upper)
+    result = np.minimum(np.maximum(starts, lower), upper)
+    return result.T.ravel()[:length]
+
+
 def hysteresis(array, hysteresis):
     """
     Applies hysteresis to an array of data. The function applies half the
@@ -2890,36 +2987,17 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
+    result = np.zeros(len(array))
 
     # get a list of the unmasked data - allow for array.mask = False (not an array)
-    if array.mask is np.False_:
-        notmasked = np.arange(length+1)
-    else:
-        notmasked = np.ma.where(array.mask == False)[0]
+    notmasked = np.flatnonzero(~np.ma.getmaskarray(array))
+    data = np.ma.getdata(array)[notmasked].astype(np.float64)
     # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
-
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
+    half_done = _hysteresis_pass(data, quarter_range, data[0])
 
     # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    result[notmasked] = _hysteresis_pass(half_done[::-1], quarter_range,
+                                         half_done[-1])[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
@@ -3772,6 +3850,287 @@ def slices_remove_small_slices(slice_list, time_limit=10, hz=1, count=None):
     return new_list
 
 
+class IntervalSet(object):
+    '''
+    Set of half-open intervals, equivalent to a list of slices with a step
+    of 1, stored as sorted start and stop arrays. Overlapping and adjacent
+    intervals are merged so that the set operations can be computed with
+    vectorised array operations rather than by comparing slices in Python.
+
+    Slice starts and stops of None are stored as -inf and inf and converted
+    back to None by to_slices.
+    '''
+    def __init__(self, starts=(), stops=()):
+        '''
+        :param starts: Start of each interval.
+        :type starts: np.array or list
+        :param stops: Stop of each interval, excluded from the interval.
+        :type stops: np.array or list
+        '''
+        starts = np.asarray(starts, dtype=np.float64).ravel()
+        stops = np.asarray(stops, dtype=np.float64).ravel()
+        if starts.shape != stops.shape:
+            raise ValueError('IntervalSet requires the same number of starts '
+                             'and stops.')
+        # Empty intervals do not contain any indices.
+        not_empty = starts < stops
+        starts = starts[not_empty]
+        stops = stops[not_empty]
+        if len(starts) > 1:
+            order = np.argsort(starts, kind='mergesort')
+            starts = starts[order]
+            reach = np.maximum.accumulate(stops[order])
+            # New intervals begin after the furthest stop of those before.
+            begins = np.concatenate(
+                ([0], np.flatnonzero(starts[1:] > reach[:-1]) + 1))
+            ends = np.concatenate((begins[1:] - 1, [len(starts) - 1]))
+            starts = starts[begins]
+            stops = reach[ends]
+        self.starts = starts
+        self.stops = stops
+
+    @classmethod
+    def from_slices(cls, slices):
+        '''
+        :param slices: Slices as returned by np.ma.clump_unmasked or runs_of_ones. Reverse slices are converted to forward slices and None is ignored.
+        :type slices: [slice] or None
+        :raises ValueError: If a slice has a step other than 1 or -1.
+        :rtype: IntervalSet
+        '''
+        starts = []
+        stops = []
+        for _slice in slices or []:
+            if _slice is None:
+                continue
+            start, stop, step = _slice.start, _slice.stop, _slice.step
+            if step is not None and abs(step) != 1:
+                raise ValueError('IntervalSet does not cater for non-unity '
+                                 'steps')
+            if step == -1:
+                start, stop = (None if stop is None else stop + 1,
+                               None if start is None else start + 1)
+            starts.append(-np.inf if start is None else start)
+            stops.append(np.inf if stop is None else stop)
+        return cls(starts, stops)
+
+    @classmethod
+    def from_mask(cls, mask):
+        '''
+        Equivalent to IntervalSet.from_slices(runs_of_ones(mask)) without
+        creating slices.
+
+        :param mask: Boolean array which is True within intervals. Masked values are outside intervals.
+        :type mask: np.array or np.ma.masked_array
+        :rtype: IntervalSet
+        '''
+        mask = np.ma.filled(mask, False).astype(np.bool_).ravel()
+        edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+        return cls(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+    @classmethod
+    def from_unmasked(cls, array):
+        '''
+        Equivalent to IntervalSet.from_slices(np.ma.clump_unmasked(array))
+        without creating slices.
+
+        :type array: np.ma.masked_array
+        :rtype: IntervalSet
+        '''
+        return cls.from_mask(~np.ma.getmaskarray(array))
+
+    def to_slices(self):
+        '''
+        :returns: Slices in ascending order. Integral starts and stops are converted to int and infinite starts and stops to None.
+        :rtype: [slice]
+        '''
+        def convert(values):
+            converted = values.tolist()
+            for position, value in enumerate(converted):
+                if np.isinf(value):
+                    converted[position] = None
+                elif value.is_integer():
+                    converted[position] = int(value)
+            return converted
+        return [slice(start, stop) for start, stop in
+                izip(convert(self.starts), convert(self.stops))]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(self.to_slices())
+
+    def __nonzero__(self):
+        return len(self.starts) > 0
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and \
+            np.array_equal(self.starts, other.starts) and \
+            np.array_equal(self.stops, other.stops)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.to_slices())
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def union(self, *others):
+        '''
+        Equivalent to slices_or.
+
+        :type others: IntervalSet
+        :returns: Intervals within any of the sets.
+        :rtype: IntervalSet
+        '''
+        sets = (self,) + others
+        return IntervalSet(np.concatenate([s.starts for s in sets]),
+                           np.concatenate([s.stops for s in sets]))
+
+    def intersection(self, other):
+        '''
+        Equivalent to slices_and, except that the result is merged and in
+        ascending order.
+
+        :type other: IntervalSet
+        :returns: Intervals within both sets.
+        :rtype: IntervalSet
+        '''
+        boundaries = np.concatenate((self.starts, other.starts,
+                                     self.stops, other.stops))
+        counts = np.concatenate((np.ones(len(self) + len(other), np.int8),
+                                 -np.ones(len(self) + len(other), np.int8)))
+        # Stops are ordered before starts at the same boundary as the
+        # intervals are half-open.
+        order = np.lexsort((counts, boundaries))
+        boundaries = boundaries[order]
+        # Neither set overlaps itself, so both sets contain the intervals
+        # starting where two intervals are open until the next boundary.
+        begins = np.flatnonzero(np.cumsum(counts[order]) == 2)
+        return IntervalSet(boundaries[begins], boundaries[begins + 1])
+
+    def complement(self, begin=None, end=None):
+        '''
+        Equivalent to slices_not.
+
+        :param begin: Start of the range to invert within. Defaults to the first start of the set.
+        :type begin: int or float or None
+        :param end: Stop of the range to invert within. Defaults to the last stop of the set.
+        :type end: int or float or None
+        :returns: Intervals between begin and end outside the set.
+        :rtype: IntervalSet
+        '''
+        if begin is None:
+            begin = self.starts[0] if len(self) else -np.inf
+        if end is None:
+            end = self.stops[-1] if len(self) else np.inf
+        starts = np.concatenate(([begin], self.stops))
+        stops = np.concatenate((self.starts, [end]))
+        return IntervalSet(np.maximum(starts, begin), np.minimum(stops, end))
+
+    def difference(self, other):
+        '''
+        Equivalent to slices_and_not.
+
+        :type other: IntervalSet
+        :returns: Intervals within self and outside other.
+        :rtype: IntervalSet
+        '''
+        if not len(self):
+            return IntervalSet()
+        return self.intersection(other.complement(begin=self.starts[0],
+                                                  end=self.stops[-1]))
+
+    def durations(self, hz=1):
+        '''
+        :param hz: Frequency of the starts and stops.
+        :type hz: int or float
+        :returns: Duration of each interval in seconds.
+        :rtype: np.array
+        '''
+        return (self.stops - self.starts) / float(hz)
+
+    def remove_small_gaps(self, time_limit=10, hz=1, count=None):
+        '''
+        Equivalent to slices_remove_small_gaps.
+
+        :param time_limit: Tolerance below which intervals will be joined.
+        :type time_limit: int or float
+        :param hz: Frequency of the starts and stops.
+        :type hz: int or float
+        :param count: Tolerance based on count, not time.
+        :type count: int or None
+        :returns: Intervals with gaps smaller than the tolerance filled.
+        :rtype: IntervalSet
+        '''
+        if len(self) < 2:
+            return self
+        sample_limit = count if count is not None else time_limit * hz
+        # Intervals which begin after a gap which is not filled.
+        begins = np.concatenate(
+            ([True], self.starts[1:] - self.stops[:-1] >= sample_limit))
+        ends = np.concatenate((begins[1:], [True]))
+        return IntervalSet(self.starts[begins], self.stops[ends])
+
+    def remove_small_intervals(self, time_limit=10, hz=1, count=None):
+        '''
+        Equivalent to slices_remove_small_slices.
+
+        :param time_limit: Tolerance below which intervals will be removed.
+        :type time_limit: int or float
+        :param hz: Frequency of the starts and stops.
+        :type hz: int or float
+        :param count: Tolerance based on count, not time.
+        :type count: int or None
+        :returns: Intervals longer than the tolerance.
+        :rtype: IntervalSet
+        '''
+        sample_limit = count if count is not None else time_limit * hz
+        keep = self.stops - self.starts > sample_limit
+        return IntervalSet(self.starts[keep], self.stops[keep])
+
+    def shift(self, offset):
+        '''
+        :type offset: int or float
+        :returns: Intervals shifted by offset.
+        :rtype: IntervalSet
+        '''
+        return IntervalSet(self.starts + offset, self.stops + offset)
+
+    def overlaps(self, other):
+        '''
+        Equivalent to slices_overlap for sets of slices.
+
+        :type other: IntervalSet
+        :returns: Whether any interval of self overlaps an interval of other.
+        :rtype: bool
+        '''
+        return bool(len(self.intersection(other)))
+
+    def contains(self, indices):
+        '''
+        :type indices: int or float or np.array
+        :returns: Whether each index is within an interval.
+        :rtype: bool or np.array of bool
+        '''
+        indices = np.asarray(indices)
+        if not len(self):
+            within = np.zeros(indices.shape, dtype=np.bool_)
+        else:
+            # Position of the last interval starting at or before each index.
+            positions = np.searchsorted(self.starts, indices, side='right') - 1
+            within = (positions >= 0) & (indices < self.stops[positions])
+        return within if within.ndim else bool(within)
+
+
 def trim_slices(slices, seconds, frequency, hdf_duration):
     '''
     Trims slices by a number of seconds and excludes slices which are too small
@@ -4569,6 +4928,8 @@ def blend_parameters_cubic(this_valid, frequency, min_ip_freq, offset, params, p
     To be used with care as this both gives a smoother transition at sample
     boundaries, but suffers from overswing which can cause problems.
     '''
+    # import locally to speed up imports of library.py
+    from scipy import interpolate as scipy_interpolate
 
     new_t = np.linspace(result_slice.start / frequency,
                         result_slice.stop / frequency,
@@ -5491,54 +5852,104 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     else:
         repair_samples = None
 
-    masked_sections = np.ma.clump_masked(array)
-    
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples and length > repair_samples:
+    # Find the start and stop of every masked section at once rather than
+    # looping over np.ma.clump_masked slices.
+    edges = np.diff(np.concatenate(
+        ([0], np.ma.getmaskarray(array).view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    lengths = stops - starts
+
+    if repair_samples:
+        too_long = lengths > repair_samples
+        if too_long.any():
             if raise_duration_exceedance:
+                length = lengths[too_long][0]
                 raise ValueError("Length of masked section '%s' exceeds "
                                  "repair duration '%s'." % (length * frequency,
                                                             repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate or method == 'fill_stop':
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                array[section] = array[section.stop]
-            else:
-                continue # Can't interpolate if we don't know the first sample
-
-        elif section.stop == len(array):
-            if extrapolate or method == 'fill_start':
-                array[section] = array[section.start - 1]
-            else:
-                continue # Can't interpolate if we don't know the last sample
-            
+            # Too long to repair
+            starts = starts[~too_long]
+            stops = stops[~too_long]
+            lengths = lengths[~too_long]
+
+    data = array.data
+
+    def fill(starts, lengths, values):
+        # Equivalent to array[section] = value for each section.
+        indices = _section_indices(starts, lengths)
+        array.unshare_mask()
+        data[indices] = np.repeat(values, lengths)
+        array.mask[indices] = False
+
+    if len(starts) and starts[0] == 0:
+        if extrapolate or method == 'fill_stop':
+            # TODO: Does it make sense to subtract 1 from the section stop??
+            #array.data[section] = array.data[section.stop - 1]
+            fill(starts[:1], lengths[:1], data[stops[:1]])
+        # Can't interpolate if we don't know the first sample
+        starts, stops, lengths = starts[1:], stops[1:], lengths[1:]
+
+    end_section = None
+    if len(starts) and stops[-1] == len(array):
+        if extrapolate or method == 'fill_start':
+            end_section = (starts[-1:], lengths[-1:])
+        # Can't interpolate if we don't know the last sample
+        starts, stops, lengths = starts[:-1], stops[:-1], lengths[:-1]
+
+    if len(starts):
+        start_values = data[starts - 1]
+        stop_values = data[stops]
+        if method == 'interpolate':
+            if repair_above is not None:
+                repair = (start_values > repair_above) & \
+                    (stop_values > repair_above)
+                starts, stops, lengths = \
+                    starts[repair], stops[repair], lengths[repair]
+                start_values = start_values[repair]
+                stop_values = stop_values[repair]
+            indices = _section_indices(starts, lengths)
+            # Position of each sample within its section, numbered from 1,
+            # for the equivalent of np.linspace(start_value, stop_value,
+            # length+2)[1:-1].
+            positions = indices - np.repeat(starts - 1, lengths)
+            start_values = start_values.astype(np.float64)
+            steps = (stop_values - start_values) / (lengths + 1)
+            data[indices] = positions * np.repeat(steps, lengths) + \
+                np.repeat(start_values, lengths)
+            array.mask[indices] = False
+        elif method == 'fill_start':
+            fill(starts, lengths, start_values)
+        elif method == 'fill_stop':
+            fill(starts, lengths, stop_values)
         else:
-            start_value = array[section.start - 1]
-            stop_value = array[section.stop]
-            if method == 'interpolate':
-                if (repair_above is None or 
-                    (start_value > repair_above and stop_value > repair_above)):
-                    # XXX: Find neater solution, potentially
-                    # scipy.interpolate.InterpolatedUnivariateSpline, as
-                    # optimisation.
-                    array.data[section] = np.linspace(start_value, stop_value,
-                                                      length+2)[1:-1]
-                    array.mask[section] = False
-            elif method == 'fill_start':
-                array[section] = start_value
-            elif method == 'fill_stop':
-                array[section] = stop_value
-            else:
-                raise NotImplementedError('Repair method %s not implemented.',
-                                          method)
+            raise NotImplementedError('Repair method %s not implemented.',
+                                      method)
+
+    if end_section:
+        starts, lengths = end_section
+        fill(starts, lengths, data[starts - 1])
 
     return array
 
 
+def _section_indices(starts, lengths):
+    '''
+    Indices of every sample within sections of an array.
+
+    :param starts: Start index of each section.
+    :type starts: np.ndarray
+    :param lengths: Number of samples within each section.
+    :type lengths: np.ndarray
+    :returns: Concatenated indices of all sections.
+    :rtype: np.ndarray
+    '''
+    # Offset of each sample from the start of the concatenated sections,
+    # adjusted to restart at each section's start index.
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(offsets.size) + offsets
+
+
 def resample(array, orig_hz, resample_hz):
     '''
     Upsample or downsample an array for it to match resample_hz.
@@ -6944,6 +7355,111 @@ def index_closest_value(array, threshold, _slice=slice(None)):
     return index_at_value(array, threshold, _slice, endpoint='closing')
 
 
+def _index_at_value_limits(array, _slice):
+    '''
+    Arrange the limits of the scan of index_at_value, ensuring that we stay
+    inside the array.
+
+    :type array: masked array
+    :type _slice: slice
+    :raises ValueError: If the step of _slice is not 1 or -1.
+    :returns: Index the scan begins and ends at, the step of the scan and slices of the first and second value of each pair of consecutive values scanned.
+    :rtype: (int, int, int, slice, slice)
+    '''
+    step = _slice.step or 1
+    max_index = len(array)
+
+    if step == 1:
+        begin = max(int(round(_slice.start or 0)), 0)
+        end = min(int(round(_slice.stop or max_index)), max_index)
+        left, right = slice(begin, end - 1, step), slice(begin + 1, end,step)
+
+    elif step == -1:
+        begin = min(int(round(_slice.start or max_index)), max_index-1)
+        # Indexing from the end of the array results in an array length
+        # mismatch. There is a failing test to cover this case which may work
+        # with array[:end:-1] construct, but using slices appears insoluble.
+        end = max(int(_slice.stop or 0),0)
+        left = slice(begin, end, step)
+        right = slice(begin - 1, end - 1 if end > 0 else None, step)
+
+    else:
+        raise ValueError('Step length not 1 in index_at_value')
+
+    return begin, end, step, left, right
+
+
+def _index_at_value_not_crossed(array, threshold, _slice, begin, step,
+                                endpoint):
+    '''
+    Result of index_at_value where the parameter does not pass through the
+    threshold within the slice.
+
+    :returns: Index determined by endpoint or None.
+    :rtype: float or int or None
+    '''
+    if endpoint in ['closing', 'first_closing']:
+        # Rescan the data to find the last point where the array data is
+        # closing.
+        diff = np.ma.ediff1d(array[_slice])
+        if _slice.step >= 0:
+            start_index = _slice.start
+            stop_index = _slice.stop
+        else:
+            start_index = _slice.stop
+            stop_index = _slice.start
+        value = closest_unmasked_value(array, _slice.start or 0,
+                                       start_index=start_index,
+                                       stop_index=stop_index)
+        if value:
+            value = value.value
+        else:
+            return None
+
+        if endpoint == 'closing':
+            if threshold >= value:
+                diff_where = np.ma.where(diff < 0)
+            else:
+                diff_where = np.ma.where(diff > 0)
+        elif endpoint == 'first_closing':
+            if threshold >= value:
+                diff_where = np.ma.where(diff <= 0)
+            else:
+                diff_where = np.ma.where(diff >= 0)
+        else:
+            raise 'Unrecognised command in index_at_value'
+            
+        try:
+            return (_slice.start or 0) + (step * diff_where[0][0])
+        except IndexError:
+            return (_slice.stop - step) if _slice.stop else len(array) - 1
+    elif endpoint == 'nearest':
+        closing_array = abs(array-threshold)
+        return begin + step * np.ma.argmin(closing_array[_slice])
+    else:
+        return None  #TODO: raise exception when not found?
+
+
+def _index_at_value_crossed(array, threshold, begin, step, n):
+    '''
+    Interpolate between the pair of values at n where the array passes
+    through the threshold.
+
+    :returns: Index where the array crosses the threshold.
+    :rtype: float
+    '''
+    a = array[begin + (step * n)]
+    b = array[begin + (step * (n + 1))]
+    # Force threshold to float as often passed as an integer.
+    # Also check for b=a as otherwise we get a divide by zero condition.
+    if (a is np.ma.masked or b is np.ma.masked or a == b):
+        r = 0.5
+    else:
+        r = (float(threshold) - a) / (b - a)
+
+    return (begin + step * (n + r))
+
+
 def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     '''
     This function seeks the moment when the parameter in question first crosses
@@ -6954,6 +7470,8 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     For example, to find 50ft Rad Alt on the descent, use something like:
        idx_50 = index_at_value(alt_rad, 50.0, slice(on_gnd_idx,0,-1))
 
+    To seek several thresholds within the same slice use index_at_values.
+
     :param array: input data
     :type array: masked array
     :param threshold: the value that we expect the array to cross in this slice.
@@ -6970,26 +7488,7 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     :returns type: Float or None
     '''
     assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
-    step = _slice.step or 1
-    max_index = len(array)
-
-    # Arrange the limits of our scan, ensuring that we stay inside the array.
-    if step == 1:
-        begin = max(int(round(_slice.start or 0)), 0)
-        end = min(int(round(_slice.stop or max_index)), max_index)
-        left, right = slice(begin, end - 1, step), slice(begin + 1, end,step)
-
-    elif step == -1:
-        begin = min(int(round(_slice.start or max_index)), max_index-1)
-        # Indexing from the end of the array results in an array length
-        # mismatch. There is a failing test to cover this case which may work
-        # with array[:end:-1] construct, but using slices appears insoluble.
-        end = max(int(_slice.stop or 0),0)
-        left = slice(begin, end, step)
-        right = slice(begin - 1, end - 1 if end > 0 else None, step)
-
-    else:
-        raise ValueError('Step length not 1 in index_at_value')
+    begin, end, step, left, right = _index_at_value_limits(array, _slice)
 
     if begin == end:
         logger.warning('No range for seek function to scan across')
@@ -7013,58 +7512,117 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     elif not np.ma.count(test_array):
         # The parameter does not pass through threshold in the period in
         # question, so return empty-handed.
-        if endpoint in ['closing', 'first_closing']:
-            # Rescan the data to find the last point where the array data is
-            # closing.
-            diff = np.ma.ediff1d(array[_slice])
-            if _slice.step >= 0:
-                start_index = _slice.start
-                stop_index = _slice.stop
-            else:
-                start_index = _slice.stop
-                stop_index = _slice.start
-            value = closest_unmasked_value(array, _slice.start or 0,
-                                           start_index=start_index,
-                                           stop_index=stop_index)
-            if value:
-                value = value.value
-            else:
-                return None
-
-            if endpoint == 'closing':
-                if threshold >= value:
-                    diff_where = np.ma.where(diff < 0)
-                else:
-                    diff_where = np.ma.where(diff > 0)
-            elif endpoint == 'first_closing':
-                if threshold >= value:
-                    diff_where = np.ma.where(diff <= 0)
-                else:
-                    diff_where = np.ma.where(diff >= 0)
-            else:
-                raise 'Unrecognised command in index_at_value'
-                
-            try:
-                return (_slice.start or 0) + (step * diff_where[0][0])
-            except IndexError:
-                return (_slice.stop - step) if _slice.stop else len(array) - 1
-        elif endpoint == 'nearest':
-            closing_array = abs(array-threshold)
-            return begin + step * np.ma.argmin(closing_array[_slice])
-        else:
-            return None  #TODO: raise exception when not found?
+        return _index_at_value_not_crossed(array, threshold, _slice, begin,
+                                           step, endpoint)
     else:
         n, dummy = np.ma.flatnotmasked_edges(test_array)
-        a = array[begin + (step * n)]
-        b = array[begin + (step * (n + 1))]
-        # Force threshold to float as often passed as an integer.
-        # Also check for b=a as otherwise we get a divide by zero condition.
-        if (a is np.ma.masked or b is np.ma.masked or a == b):
-            r = 0.5
-        else:
-            r = (float(threshold) - a) / (b - a)
+        return _index_at_value_crossed(array, threshold, begin, step, n)
 
-    return (begin + step * (n + r))
+
+def index_at_values(array, thresholds, _slice=slice(None), endpoint='exact'):
+    '''
+    Equivalent to index_at_value for each of the thresholds, but the array
+    is scanned once for all of them rather than once per threshold.
+
+    The pairs of consecutive values scanned form runs where neither value is
+    masked. Within a run the array passes through every value between its
+    first value and the furthest value reached so far, so the first
+    crossing of each threshold is found by searching the running maximum
+    (or minimum) of the run.
+
+    For example, to find the last time each height was passed on the
+    descent:
+       idxs = index_at_values(alt_aal, [1000, 500, 50], slice(end, start, -1))
+
+    :param array: input data
+    :type array: masked array
+    :param thresholds: values that we expect the array to cross in this slice.
+    :type thresholds: iterable of float
+    :param _slice: slice where we want to seek the threshold transits.
+    :type _slice: slice
+    :param endpoint: type of end condition being sought. See index_at_value.
+    :type endpoint: str
+    :returns: interpolated time when the array values crossed each threshold, in the order of thresholds.
+    :rtype: [float or None]
+    '''
+    assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
+    thresholds = list(thresholds)
+    if not thresholds:
+        return []
+    begin, end, step, left, right = _index_at_value_limits(array, _slice)
+
+    if begin == end:
+        logger.warning('No range for seek function to scan across')
+        return [None] * len(thresholds)
+
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+    first = data[left]
+    second = data[right]
+    if len(first) != len(second) or data.ndim != 1 or \
+       not np.issubdtype(data.dtype, np.number):
+        # Scans which index_at_value cannot perform are left to it.
+        return [index_at_value(array, threshold, _slice, endpoint)
+                for threshold in thresholds]
+
+    if len(first) == 0 or \
+       ((_slice.stop == _slice.start) and (_slice.start is not None)):
+        return [None] * len(thresholds)
+
+    valid = ~(mask[left] | mask[right])
+    # NaN values pass through every threshold, as with index_at_value.
+    passing = valid & (np.isnan(first) | np.isnan(second))
+    valid &= ~passing
+    values = np.asarray(thresholds, dtype=np.float64)
+    crossings = np.full(len(values), -1, dtype=int)
+    pending = np.arange(len(values))
+    nan_thresholds = np.isnan(values)
+    if nan_thresholds.any():
+        # NaN thresholds are passed through by every pair of values.
+        everywhere = np.flatnonzero(valid | passing)
+        if len(everywhere):
+            crossings[nan_thresholds] = everywhere[0]
+        pending = pending[~nan_thresholds]
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], valid, [0]))))
+    runs = [(start, stop) for start, stop in zip(edges[::2], edges[1::2])]
+    runs.extend((index, None) for index in np.flatnonzero(passing))
+    runs.sort()
+    for start, stop in runs:
+        if not len(pending):
+            break
+        if stop is None:
+            crossings[pending] = start
+            pending = pending[:0]
+            continue
+        run = np.concatenate((first[start:start + 1], second[start:stop]))
+        pending_values = values[pending]
+        found = np.full(len(pending), -1, dtype=int)
+        found[pending_values == run[0]] = 0
+        rising = pending_values > run[0]
+        if rising.any():
+            positions = np.searchsorted(np.maximum.accumulate(run)[1:],
+                                        pending_values[rising])
+            found[rising] = np.where(positions < len(run) - 1, positions, -1)
+        falling = pending_values < run[0]
+        if falling.any():
+            positions = np.searchsorted(-np.minimum.accumulate(run)[1:],
+                                        -pending_values[falling])
+            found[falling] = np.where(positions < len(run) - 1, positions,
+                                      -1)
+        crossed = found >= 0
+        crossings[pending[crossed]] = start + found[crossed]
+        pending = pending[~crossed]
+
+    results = []
+    for threshold, n in zip(thresholds, crossings):
+        if n < 0:
+            results.append(_index_at_value_not_crossed(
+                array, threshold, _slice, begin, step, endpoint))
+        else:
+            results.append(_index_at_value_crossed(array, threshold, begin,
+                                                   step, n))
+    return results
 
 
 def index_at_value_or_level_off(array, frequency, value, _slice, abs_threshold=None):
@@ -7173,6 +7731,52 @@ def value_at_time(array, hz, offset, time_index):
     return value_at_index(array, location_in_array)
 
 
+def values_at_time(array, hz, offset, time_indices):
+    '''
+    Finds the values of the data in array at many times at once. Equivalent
+    to calling value_at_time for each time.
+
+    :param array: input data
+    :type array: masked array
+    :param hz: sample rate for the input data (sec-1)
+    :type hz: float
+    :param offset: fdr offset for the array (sec)
+    :type offset: float
+    :param time_indices: times into the array where we want to find the array values. NaN is treated as an unknown time.
+    :type time_indices: np.array or list of floats
+    :returns: interpolated values from the array, masked where value_at_time would return None or a masked value.
+    :rtype: np.ma.array
+    '''
+    # Timedelta truncates to 6 digits, therefore round offset down.
+    locations = (np.asarray(time_indices, dtype=np.float64) -
+                 round(offset - 0.0000005, 6)) * hz
+    if not len(array):
+        return np.ma.array(locations, mask=True)
+    unknown = np.isnan(locations)
+    locations[unknown] = 0
+    # Trap overruns which arise from compensation for timing offsets.
+    locations = np.clip(locations, 0, len(array) - 1)
+
+    low = locations.astype(np.int)
+    high = np.minimum(low + 1, len(array) - 1)
+    r = locations - low
+    exact = r == 0
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+    low_value = data[low]
+    high_value = data[high]
+    low_masked = mask[low]
+    high_masked = mask[high]
+
+    values = np.where(exact, low_value,
+                      r * high_value + (1 - r) * low_value)
+    # Crude handling of masked values as within value_at_index.
+    values = np.where(~exact & low_masked & ~high_masked, high_value, values)
+    values = np.where(~exact & high_masked & ~low_masked, low_value, values)
+    values_mask = np.where(exact, low_masked, low_masked & high_masked)
+    return np.ma.array(values, mask=values_mask | unknown)
+
+
 def value_at_datetime(start_datetime, array, hz, offset, value_datetime):
     '''
     Finds the value of the data in array at the time given by value_datetime.
@@ -1,3 +1,4 @@
+import bisect
 import copy
 import gzip
 import inspect
@@ -7,9 +8,11 @@ import numpy as np
 import cPickle
 import re
 import pprint
+import threading
+import weakref
 
 from abc import ABCMeta
-from collections import namedtuple, Iterable
+from collections import namedtuple, Iterable, OrderedDict
 from functools import total_ordering
 from itertools import product
 from operator import attrgetter
@@ -18,6 +21,8 @@ from analysis_engine.library import (
     align,
     align_slices,
     find_edges,
+    find_edges_on_state_change,
+    IntervalSet,
     is_index_within_slice,
     is_index_within_slices,
     is_slice_within_slice,
@@ -30,9 +35,11 @@ from analysis_engine.library import (
     slices_between,
     slices_from_to,
     slices_remove_small_gaps,
+    state_period_edges,
     value_at_index,
     value_at_time,
 )
+from analysis_engine.profiling import timer
 from analysis_engine.recordtype import recordtype
 
 # FIXME: a better place for this class
@@ -41,6 +48,14 @@ from hdfaccess.parameter import MappedArray
 
 logger = logging.getLogger(name=__name__)
 
+# Dependency names and names of the Attributes inspected by can_operate,
+# which are static once a node class is defined, keyed by node class.
+_dependency_names = weakref.WeakKeyDictionary()
+_can_operate_attribute_names = weakref.WeakKeyDictionary()
+# Valid names of each FormattedNameNode class along with the NAME_FORMAT
+# and NAME_VALUES they were created from.
+_formatted_names = weakref.WeakKeyDictionary()
+
 # Define named tuples for KPV and KTI and FlightPhase
 ApproachItem = recordtype(
     'ApproachItem',
@@ -157,6 +172,59 @@ def get_param_kwarg_names(method):
     return defaults
 
 
+def can_operate_attribute_names(node_class):
+    """
+    Names of the Attributes which are keyword arguments of a node's
+    can_operate method. Cached for node classes.
+
+    :param node_class: Node class to be inspected.
+    :type node_class: class
+    :raises TypeError: If a keyword argument is not an Attribute.
+    :returns: Attribute names in the order of the keyword arguments.
+    :rtype: [str]
+    """
+    names = _can_operate_attribute_names.get(node_class) \
+        if inspect.isclass(node_class) else None
+    if names is None:
+        # NOTE: Raises "Unbound method" here due to can_operate being
+        # overridden without wrapping with @classmethod decorator
+        argspec = inspect.getargspec(node_class.can_operate)
+        for default in argspec.defaults or ():
+            if not isinstance(default, Attribute):
+                raise TypeError('Only Attributes may be keyword '
+                                'arguments in can_operate methods.')
+        names = tuple(d.name for d in argspec.defaults or ())
+        if inspect.isclass(node_class):
+            _can_operate_attribute_names[node_class] = names
+    return list(names)
+
+
+def set_node_metadata(node_class, dependency_names=None,
+                      attribute_names=None):
+    """
+    Store previously inspected metadata of a node class, e.g. loaded from a
+    node registry manifest, to avoid inspecting its methods again.
+
+    :type node_class: class
+    :param dependency_names: Names returned by get_dependency_names.
+    :type dependency_names: [str] or None
+    :param attribute_names: Names returned by can_operate_attribute_names.
+    :type attribute_names: [str] or None
+    """
+    if dependency_names is not None:
+        _dependency_names[node_class] = tuple(dependency_names)
+    if attribute_names is not None:
+        _can_operate_attribute_names[node_class] = tuple(attribute_names)
+
+
+def clear_node_metadata():
+    """
+    Clear the cached metadata of all node classes.
+    """
+    _dependency_names.clear()
+    _can_operate_attribute_names.clear()
+
+
 #------------------------------------------------------------------------------
 # Abstract Node Classes
 # =====================
@@ -263,12 +331,17 @@ class Node(object):
         :returns: A list of dependency names.
         :rtype: [str]
         """
-        # TypeError:'ABCMeta' object is not iterable?
-        # this probably means dependencies for this class isn't a list!
-        params = get_param_kwarg_names(cls.derive)
-        # Here due to an AttributeError? Derive kwarg is a string not a Node:
-        # e.g. derive(a='String') instead of derive(a=P('String'))
-        return [d.name or d.get_name() for d in params]
+        names = _dependency_names.get(cls)
+        if names is None:
+            # TypeError:'ABCMeta' object is not iterable?
+            # this probably means dependencies for this class isn't a list!
+            params = get_param_kwarg_names(cls.derive)
+            # Here due to an AttributeError? Derive kwarg is a string not a
+            # Node: e.g. derive(a='String') instead of derive(a=P('String'))
+            names = _dependency_names[cls] = \
+                tuple(d.name or d.get_name() for d in params)
+        # A copy protects the cache from modification by the caller.
+        return list(names)
 
     @classmethod
     def can_operate(cls, available):
@@ -318,7 +391,7 @@ def can_operate(cls, available):
         """
         raise NotImplementedError("Abstract Method")
 
-    def get_derived(self, args):
+    def get_derived(self, args, aligned_cache=None):
         """
         Accessor for derive method which first aligns all parameters to the
         first to ensure parameter data and indices are consistent.
@@ -327,6 +400,8 @@ def can_operate(cls, available):
 
         :param args: List of available Parameter objects
         :type args: list
+        :param aligned_cache: Optional cache of aligned parameters shared between nodes.
+        :type aligned_cache: AlignedParameterCache or None
         :returns: self after having aligned dependencies and called derive.
         :rtype: self
         """
@@ -357,17 +432,23 @@ def can_operate(cls, available):
 
             # align the dependencies
             aligned_args = []
-            for arg in args:
-                if arg in dependencies_to_align:
-                    try:
-                        aligned_arg = arg.get_aligned(self)
-                    except AttributeError:
-                        # If parameter came from an HDF its missing get_aligned
-                        arg = derived_param_from_hdf(arg)
-                        aligned_arg = arg.get_aligned(self)
-                    aligned_args.append(aligned_arg)
-                else:
-                    aligned_args.append(arg)
+            with timer('align'):
+                for arg in args:
+                    if arg in dependencies_to_align:
+                        try:
+                            if aligned_cache is None:
+                                aligned_arg = arg.get_aligned(self)
+                            else:
+                                aligned_arg = aligned_cache.get_aligned(
+                                    arg, self)
+                        except AttributeError:
+                            # If parameter came from an HDF its missing
+                            # get_aligned
+                            arg = derived_param_from_hdf(arg)
+                            aligned_arg = arg.get_aligned(self)
+                        aligned_args.append(aligned_arg)
+                    else:
+                        aligned_args.append(arg)
             args = aligned_args
 
         elif dependencies_to_align:
@@ -691,6 +772,63 @@ class DerivedParameterNode(Node):
 
 P = Parameter = DerivedParameterNode # shorthand
 
+
+class MultiOutputParameterNode(DerivedParameterNode):
+    '''
+    Derives several parameters, named by OUTPUTS, from a single call of the
+    derive method. Each output is registered as a separate node within the
+    dependency tree, but all of the outputs are written to the HDF file once
+    the node has been derived for the first of them.
+
+    The derive method sets the array of each output with set_output. Every
+    output shares the frequency and offset of the node.
+    '''
+    # Names of the derived parameters.
+    OUTPUTS = ()
+
+    def __init__(self, *args, **kwargs):
+        super(MultiOutputParameterNode, self).__init__(*args, **kwargs)
+        self.output_arrays = OrderedDict((n, None) for n in self.OUTPUTS)
+        self.output_units = {}
+
+    @classmethod
+    def names(cls):
+        '''
+        :returns: Names of the derived parameters.
+        :rtype: [str]
+        '''
+        return list(cls.OUTPUTS)
+
+    def set_output(self, name, array, units=None):
+        '''
+        :param name: Name of the output, one of OUTPUTS.
+        :type name: str
+        :type array: np.ma.masked_array
+        :param units: Units of the output. Defaults to the units of the node.
+        :type units: str or None
+        :raises ValueError: If name is not one of OUTPUTS.
+        '''
+        if name not in self.output_arrays:
+            raise ValueError("'%s' is not an output of '%s'." %
+                             (name, self.__class__.__name__))
+        self.output_arrays[name] = array
+        if units is not None:
+            self.output_units[name] = units
+
+    def get_outputs(self):
+        '''
+        :returns: A parameter for each output in the order of OUTPUTS. The array of outputs which were not set is None.
+        :rtype: [DerivedParameterNode]
+        '''
+        outputs = []
+        for name, array in self.output_arrays.iteritems():
+            output = DerivedParameterNode(name, frequency=self.frequency,
+                                          offset=self.offset)
+            output.array = array
+            output.units = self.output_units.get(name, self.units)
+            outputs.append(output)
+        return outputs
+
 def multistate_string_to_integer(string_array, mapping):
     """
     Converts (['one', 'two'], {1:'one', 2:'two'}) to [1, 2]
@@ -727,6 +865,44 @@ def multistate_string_to_integer(string_array, mapping):
     return int_array
 
 
+class _StateRuns(object):
+    '''
+    Run-length representation of a multistate array: the start, stop and raw
+    state of each run of consecutive unmasked samples in the same state.
+    Masked samples are not within any run.
+    '''
+    def __init__(self, array):
+        '''
+        :type array: MappedArray
+        '''
+        self.array = array
+        data = np.ma.getdata(array).ravel()
+        mask = np.ma.getmaskarray(array).ravel()
+        self.size = len(data)
+        changes = np.flatnonzero((data[1:] != data[:-1]) |
+                                 (mask[1:] != mask[:-1])) + 1
+        starts = np.concatenate(([0], changes)).astype(int)
+        stops = np.concatenate((changes, [self.size])).astype(int)
+        if not self.size:
+            starts = stops = starts[:0]
+        unmasked = ~mask[starts]
+        self.starts = starts[unmasked]
+        self.stops = stops[unmasked]
+        self.codes = data[self.starts]
+
+    def intervals(self, codes, invert=False):
+        '''
+        :param codes: Raw states to select.
+        :type codes: [int]
+        :param invert: Select runs not in codes instead.
+        :type invert: bool
+        :returns: Intervals of the selected runs, with adjacent runs merged.
+        :rtype: IntervalSet
+        '''
+        selected = np.in1d(self.codes, codes, invert=invert)
+        return IntervalSet(self.starts[selected], self.stops[selected])
+
+
 class MultistateDerivedParameterNode(DerivedParameterNode):
     '''
     MappedArray stored as array will be of integer dtype.
@@ -776,6 +952,154 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
                 "'%s' requires either values_mapping passed into constructor "
                 "or as a class attribute." % self.__class__.__name__)
         return node
+
+    def get_runs(self):
+        '''
+        The run-length representation of the array is built when first
+        required and rebuilt once another array is assigned. Call
+        clear_runs after modifying the array in place.
+
+        :returns: Runs of each state within the array.
+        :rtype: _StateRuns
+        '''
+        runs = self.__dict__.get('_state_runs')
+        if runs is None or runs.array is not self.array:
+            runs = self._state_runs = _StateRuns(self.array)
+        return runs
+
+    def clear_runs(self):
+        '''
+        Discard the run-length representation of the array.
+        '''
+        self.__dict__.pop('_state_runs', None)
+
+    def _state_codes(self, state):
+        '''
+        :param state: State or states.
+        :type state: str or [str]
+        :raises KeyError: If a state is not within values_mapping.
+        :returns: Raw values of the states.
+        :rtype: [int]
+        '''
+        states = [state] if isinstance(state, basestring) else state
+        codes = {v: k for k, v in self.values_mapping.iteritems()}
+        return [codes[s] for s in states]
+
+    def slices_of_state(self, state, min_samples=None):
+        '''
+        Equivalent to runs_of_ones(self.array == state, min_samples) without
+        scanning the array.
+
+        :param state: State or list of states, any of which are matched.
+        :type state: str or [str]
+        :param min_samples: Slices of this many samples or fewer are removed.
+        :type min_samples: int or None
+        :returns: Slices where the array is in the state.
+        :rtype: [slice]
+        '''
+        intervals = self.get_runs().intervals(self._state_codes(state))
+        if min_samples:
+            intervals = intervals.remove_small_intervals(count=min_samples)
+        return intervals.to_slices()
+
+    def slices_not_state(self, state, min_samples=None):
+        '''
+        Equivalent to runs_of_ones(self.array != state, min_samples) without
+        scanning the array. Masked samples are excluded.
+
+        :param state: State or list of states, none of which are matched.
+        :type state: str or [str]
+        :param min_samples: Slices of this many samples or fewer are removed.
+        :type min_samples: int or None
+        :returns: Slices where the array is not in the state.
+        :rtype: [slice]
+        '''
+        intervals = self.get_runs().intervals(self._state_codes(state),
+                                              invert=True)
+        if min_samples:
+            intervals = intervals.remove_small_intervals(count=min_samples)
+        return intervals.to_slices()
+
+    def slices_of_runs(self, min_samples=None):
+        '''
+        Equivalent to library.slices_of_runs(self.array, min_samples).
+
+        :param min_samples: Slices of this many samples or fewer are removed.
+        :type min_samples: int or None
+        :returns: Each state within the array in order of raw value and the slices where the array is in the state. The state is None if min_samples removes every slice.
+        :rtype: generator of (str, [slice])
+        '''
+        runs = self.get_runs()
+        for code in np.unique(runs.codes).tolist():
+            intervals = runs.intervals([code])
+            if min_samples:
+                intervals = intervals.remove_small_intervals(count=min_samples)
+            slices = intervals.to_slices()
+            state = self.values_mapping.get(code, code)
+            yield (None if min_samples and not slices else state), slices
+
+    def edges_on_state_change(self, state, change='entering', phase=None,
+                              min_samples=1):
+        '''
+        Equivalent to find_edges_on_state_change(state, self.array, change,
+        phase, min_samples) without scanning the array.
+
+        :param state: State, e.g. 'Ground'.
+        :type state: str
+        :param change: Condition for detecting edge. Default 'entering', 'leaving' and 'entering_and_leaving' alternatives
+        :type change: str
+        :param phase: Flight phase or list of slices within which edges will be detected.
+        :type phase: list of slices or SectionNode or None
+        :param min_samples: Minimum number of samples within desired state.
+        :type min_samples: int
+        :raises ValueError: If change is not recognised.
+        :raises KeyError: If state is not recognised.
+        :returns: Indices of the edges.
+        :rtype: [float]
+        '''
+        runs = self.get_runs()
+        intervals = runs.intervals(self._state_codes(state))
+        if phase is None:
+            _slices = [slice(0, -1)]
+        else:
+            _slices = [getattr(p, 'slice', p) for p in phase]
+        edge_list = []
+        for _slice in _slices:
+            if _slice.start is None or _slice.step not in (None, 1):
+                # Scan the array to reproduce the library's handling.
+                edge_list.extend(find_edges_on_state_change(
+                    state, self.array, change=change, phase=[_slice],
+                    min_samples=min_samples))
+                continue
+            # The library slices the array, which truncates float bounds.
+            start, stop = slice(
+                int(_slice.start),
+                None if _slice.stop is None else int(_slice.stop),
+            ).indices(runs.size)[:2]
+            length = max(stop - start, 0)
+            state_periods = intervals.intersection(
+                IntervalSet([start], [start + length])).shift(-start)
+            # The offset puts the transition midway between the two
+            # conditions.
+            edge_list.extend(state_period_edges(
+                state_periods.to_slices(), length, offset=_slice.start - 0.5,
+                change=change, min_samples=min_samples))
+        return edge_list
+
+    def transitions(self, from_state, to_state):
+        '''
+        :param from_state: State or list of states transitioned from.
+        :type from_state: str or [str]
+        :param to_state: State or list of states transitioned to.
+        :type to_state: str or [str]
+        :returns: Indices midway between the last sample in from_state and the first sample in to_state where the array changes directly from one to the other.
+        :rtype: [float]
+        '''
+        runs = self.get_runs()
+        following = runs.stops[:-1] == runs.starts[1:]
+        following &= np.in1d(runs.codes[:-1], self._state_codes(from_state))
+        following &= np.in1d(runs.codes[1:], self._state_codes(to_state))
+        return (runs.starts[1:][following] - 0.5).tolist()
         
     def __setattr__(self, name, value):
         '''
@@ -853,6 +1177,7 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
         :rtype: dict
         '''
         odict = self.__dict__.copy()
+        odict.pop('_state_runs', None)
         return odict
     
     def __setstate__(self, state):
@@ -895,7 +1220,299 @@ def derived_param_from_hdf(hdf_parameter):
         )
 
 
-class SectionNode(Node, list):
+class AlignedParameterCache(object):
+    '''
+    Least recently used cache of parameters aligned to a frequency and
+    offset, shared by the nodes derived for a single flight. Many nodes align
+    the same dependency (e.g. Altitude AAL) to the same frequency and offset,
+    so the interpolated array only needs to be computed once.
+
+    Cached parameters are identified by name, therefore a cache must only be
+    shared by parameters whose data does not change, e.g. those loaded from
+    the HDF file of the flight being processed.
+
+    Nodes may modify the arrays of their dependencies within derive, so a
+    copy of the cached array is returned each time.
+    '''
+    def __init__(self, max_bytes):
+        '''
+        :param max_bytes: Maximum size of the cached arrays and masks in bytes.
+        :type max_bytes: int
+        '''
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        # Nodes may be derived concurrently by a thread pool.
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%d items, %d/%d bytes, %d hits, %d misses)' % (
+            self.__class__.__name__, len(self._items), self.size,
+            self.max_bytes, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _array_bytes(array):
+        '''
+        :type array: np.ma.MaskedArray
+        :returns: Size of the array's data and mask in bytes.
+        :rtype: int
+        '''
+        return array.nbytes + np.ma.getmask(array).nbytes
+
+    @staticmethod
+    def _copy(param):
+        '''
+        :type param: DerivedParameterNode
+        :returns: A copy of param which does not share its array.
+        :rtype: DerivedParameterNode
+        '''
+        param_copy = param.__class__(
+            name=param.name,
+            frequency=param.frequency,
+            offset=param.offset,
+        )
+        param_copy.array = param.array.copy()
+        if hasattr(param, 'values_mapping'):
+            param_copy.values_mapping = param.values_mapping
+        return param_copy
+
+    def clear(self):
+        '''
+        Remove all cached parameters. Counters are not reset.
+        '''
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def get_aligned(self, param, master):
+        '''
+        Equivalent to param.get_aligned(master) with the result cached by the
+        parameter's name, frequency and offset and those of master.
+
+        :param param: Parameter to align.
+        :type param: DerivedParameterNode
+        :param master: Node to align param to.
+        :type master: Node
+        :returns: A copy of param aligned to master.
+        :rtype: DerivedParameterNode
+        '''
+        if not isinstance(param, DerivedParameterNode) or \
+           (param.frequency == master.frequency and
+            param.offset == master.offset):
+            # Only parameter arrays are worth caching, and no interpolation
+            # is required if param is already aligned.
+            return param.get_aligned(master)
+
+        key = (param.name, param.frequency, param.offset,
+               master.frequency, master.offset)
+        with self._lock:
+            cached = self._items.pop(key, None)
+            if cached is not None:
+                # Reinsert to mark as most recently used.
+                self._items[key] = cached
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if cached is None:
+            cached = param.get_aligned(master)
+            self._store(key, cached)
+        return self._copy(cached)
+
+    def _store(self, key, aligned):
+        '''
+        Store an aligned parameter, evicting the least recently used
+        parameters until the cache is within max_bytes.
+
+        :type key: tuple
+        :type aligned: DerivedParameterNode
+        '''
+        nbytes = self._array_bytes(aligned.array)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                # Stored by another thread in the meantime.
+                return
+            self._items[key] = aligned
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= self._array_bytes(evicted.array)
+                self.evictions += 1
+
+
+class _IndexedList(list):
+    '''
+    List which discards the index of its items, built lazily by queries,
+    whenever it is modified. The index is not copied or pickled.
+    '''
+    _item_index = None
+
+    def __getstate__(self):
+        '''
+        :rtype: dict
+        '''
+        state = self.__dict__.copy()
+        state.pop('_item_index', None)
+        return state
+
+    def append(self, item):
+        self._item_index = None
+        super(_IndexedList, self).append(item)
+
+    def extend(self, items):
+        self._item_index = None
+        super(_IndexedList, self).extend(items)
+
+    def insert(self, position, item):
+        self._item_index = None
+        super(_IndexedList, self).insert(position, item)
+
+    def remove(self, item):
+        self._item_index = None
+        super(_IndexedList, self).remove(item)
+
+    def pop(self, *args):
+        self._item_index = None
+        return super(_IndexedList, self).pop(*args)
+
+    def sort(self, *args, **kwargs):
+        self._item_index = None
+        super(_IndexedList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        self._item_index = None
+        super(_IndexedList, self).reverse()
+
+    def __setitem__(self, key, value):
+        self._item_index = None
+        super(_IndexedList, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._item_index = None
+        super(_IndexedList, self).__delitem__(key)
+
+    def __setslice__(self, start, stop, items):
+        self._item_index = None
+        super(_IndexedList, self).__setslice__(start, stop, items)
+
+    def __delslice__(self, start, stop):
+        self._item_index = None
+        super(_IndexedList, self).__delslice__(start, stop)
+
+    def __iadd__(self, items):
+        self._item_index = None
+        return super(_IndexedList, self).__iadd__(items)
+
+    def __imul__(self, count):
+        self._item_index = None
+        return super(_IndexedList, self).__imul__(count)
+
+
+def _is_number(value):
+    '''
+    :returns: Whether value is a number which is not NaN.
+    :rtype: bool
+    '''
+    return isinstance(value, (int, long, float, np.number)) and value == value
+
+
+class _SectionIndex(object):
+    '''
+    Positions of the sections of a SectionNode sorted by the start and stop
+    of their slices for finding the sections which may overlap an index or
+    slice by bisection. Only valid if every slice has a numeric start and
+    stop, no step and does not stop before it starts.
+    '''
+    def __init__(self, sections):
+        '''
+        :type sections: SectionNode
+        '''
+        self.sections = sections
+        self.valid = all(s.slice.step is None and _is_number(s.slice.start)
+                         and _is_number(s.slice.stop)
+                         and s.slice.start <= s.slice.stop
+                         for s in sections)
+        self._names = None
+        self._orders = {}
+        self._max_stops = None
+
+    def order(self, by='start'):
+        '''
+        :param by: Either 'start' or 'stop' of slice.
+        :type by: str
+        :returns: Positions of sections sorted by start or stop, with equal values in list order, and their starts or stops.
+        :rtype: ([int], [int or float])
+        '''
+        order = self._orders.get(by)
+        if order is None:
+            pairs = sorted((getattr(s.slice, by), p)
+                           for p, s in enumerate(self.sections))
+            order = self._orders[by] = ([p for v, p in pairs],
+                                        [v for v, p in pairs])
+        return order
+
+    def named(self, name):
+        '''
+        :type name: str
+        :returns: Positions of sections with the name.
+        :rtype: [int]
+        '''
+        if self._names is None:
+            names = {}
+            for position, section in enumerate(self.sections):
+                names.setdefault(section.name, []).append(position)
+            self._names = names
+        return self._names.get(name, [])
+
+    def between(self, lower, upper, by='start'):
+        '''
+        :param lower: Lower bound, inclusive.
+        :param upper: Upper bound, inclusive.
+        :param by: Either 'start' or 'stop' of slice.
+        :type by: str
+        :returns: Positions of sections whose start or stop is between lower and upper.
+        :rtype: [int]
+        '''
+        positions, values = self.order(by)
+        return sorted(positions[bisect.bisect_left(values, lower):
+                                bisect.bisect_right(values, upper)])
+
+    def overlapping(self, lower, upper):
+        '''
+        :param lower: Lower bound, inclusive.
+        :param upper: Upper bound, inclusive.
+        :returns: Positions of sections which start before or at upper and stop after or at lower.
+        :rtype: [int]
+        '''
+        positions, starts = self.order('start')
+        if self._max_stops is None:
+            # Greatest stop of each section and those starting before it.
+            max_stops = []
+            max_stop = None
+            for position in positions:
+                stop = self.sections[position].slice.stop
+                max_stop = stop if max_stop is None else max(max_stop, stop)
+                max_stops.append(max_stop)
+            self._max_stops = max_stops
+        overlapping = []
+        rank = bisect.bisect_right(starts, upper) - 1
+        while rank >= 0 and self._max_stops[rank] >= lower:
+            position = positions[rank]
+            if self.sections[position].slice.stop >= lower:
+                overlapping.append(position)
+            rank -= 1
+        return sorted(overlapping)
+
+
+class SectionNode(Node, _IndexedList):
     '''
     Derives from list to implement iteration and list methods.
 
@@ -991,6 +1608,24 @@ class SectionNode(Node, list):
     slice_attrgetters = {'start': attrgetter('slice.start'),
                          'stop': attrgetter('slice.stop')}
 
+    def _convert_arguments(self, containing_index=None, within_slice=None,
+                           param=None):
+        '''
+        Convert containing_index and within_slice sourced from param to the
+        frequency of self.
+
+        :returns: Converted containing_index and within_slice.
+        :rtype: (int or float or None, slice or None)
+        '''
+        if param is not None:
+            if within_slice:
+                # FIXME: This does not account for different offsets.
+                within_slice = slice_multiply(within_slice, param.hz)
+            if containing_index is not None:
+                containing_index = \
+                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+        return containing_index, within_slice
+
     def _get_condition(self, name=None, containing_index=None,
                        within_slice=None, within_use='slice', param=None):
         '''
@@ -1012,13 +1647,9 @@ class SectionNode(Node, list):
         '''
         # Function for testing if Section is within a slice depending on
         # within_use.
-        if param is not None:
-            if within_slice:
-                # FIXME: This does not account for different offsets.
-                within_slice = slice_multiply(within_slice, param.hz)
-            if containing_index is not None:
-                containing_index = \
-                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+        containing_index, within_slice = self._convert_arguments(
+            containing_index=containing_index, within_slice=within_slice,
+            param=param)
         if within_slice:
             within_func = lambda s, within: is_slice_within_slice(
                 s.slice, within, within_use=within_use)
@@ -1034,6 +1665,90 @@ class SectionNode(Node, list):
         return lambda e: (within_func(e, within_slice) and name_func(e) and
                           index_func(e))
 
+    def _get_index(self):
+        '''
+        :returns: Index of sections, or None if the sections cannot be indexed.
+        :rtype: _SectionIndex or None
+        '''
+        section_index = self._item_index
+        if section_index is None:
+            section_index = self._item_index = _SectionIndex(self)
+        return section_index if section_index.valid else None
+
+    def _get_candidates(self, name=None, containing_index=None,
+                        within_slice=None, within_use='slice', param=None):
+        '''
+        Find the sections which may match the conditions of _get_condition
+        using the index of sections.
+
+        :returns: Positions of candidate sections in list order, or None if every section is a candidate.
+        :rtype: [int] or None
+        '''
+        section_index = self._get_index()
+        if section_index is None:
+            return None
+        containing_index, within_slice = self._convert_arguments(
+            containing_index=containing_index, within_slice=within_slice,
+            param=param)
+        if containing_index is not None:
+            if not _is_number(containing_index):
+                return None
+            return section_index.overlapping(containing_index,
+                                             containing_index)
+        elif within_slice:
+            lower, upper = within_slice.start, within_slice.stop
+            if any(b is not None and not _is_number(b) for b in (lower, upper)):
+                return None
+            negative_step = within_slice.step is not None and \
+                within_slice.step < 0
+            if negative_step and within_use in ('start', 'stop'):
+                # Indices from start down to stop.
+                lower, upper = upper, lower
+            lower = -float('inf') if lower is None else lower
+            upper = float('inf') if upper is None else upper
+            if within_use in ('slice', 'start'):
+                return section_index.between(lower, upper, by='start')
+            elif within_use == 'stop':
+                return section_index.between(lower, upper, by='stop')
+            elif within_use == 'any' and not (
+                    within_slice.step is not None and within_slice.step < 1):
+                return section_index.overlapping(lower, upper)
+            # slices_overlap raises ValueError for steps less than 1.
+            return None
+        elif name:
+            return section_index.named(name)
+        return None
+
+    def _get_positions(self, **kwargs):
+        '''
+        :param kwargs: Passed into _get_condition (see docstring).
+        :returns: Positions of matching sections in list order.
+        :rtype: [int]
+        '''
+        candidates = self._get_candidates(**kwargs)
+        if candidates is None:
+            candidates = xrange(len(self))
+        condition = self._get_condition(**kwargs)
+        return [p for p in candidates if condition(self[p])]
+
+    def _get_order(self, order_by='start', **kwargs):
+        '''
+        :param order_by: Index of slice to use when ordering, either 'start' or 'stop'.
+        :type order_by: str
+        :param kwargs: Passed into _get_condition (see docstring).
+        :returns: Positions of matching sections sorted by order_by, with equal values in list order, and their values, or None if the sections cannot be indexed.
+        :rtype: ([int], [int or float]) or None
+        '''
+        section_index = self._get_index()
+        if section_index is None:
+            return None
+        if not kwargs:
+            return section_index.order(order_by)
+        getter = self.slice_attrgetters[order_by]
+        pairs = sorted((getter(self[p]), p)
+                       for p in self._get_positions(**kwargs))
+        return [p for v, p in pairs], [v for v, p in pairs]
+
     def get(self, **kwargs):
         '''
         Gets elements either within_slice or with name. Duplicated from
@@ -1044,8 +1759,7 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing matching elements.
         :rtype: Section
         '''
-        condition = self._get_condition(**kwargs)
-        matching = [s for s in self if condition(s)]
+        matching = [self[p] for p in self._get_positions(**kwargs)]
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=matching)
 
@@ -1057,6 +1771,10 @@ class SectionNode(Node, list):
         :returns: First Section matching conditions.
         :rtype: Section
         '''
+        order = self._get_order(order_by=first_by, **kwargs)
+        if order is not None:
+            positions = order[0]
+            return self[positions[0]] if positions else None
         matching = self.get(**kwargs)
         if matching:
             return min(matching, key=self.slice_attrgetters[first_by])
@@ -1071,6 +1789,13 @@ class SectionNode(Node, list):
         :returns: Last Section matching conditions.
         :rtype: Section
         '''
+        order = self._get_order(order_by=last_by, **kwargs)
+        if order is not None:
+            positions, values = order
+            if not positions:
+                return None
+            # max returns the first of equal values in list order.
+            return self[positions[bisect.bisect_left(values, values[-1])]]
         matching = self.get(**kwargs)
         if matching:
             return max(matching, key=self.slice_attrgetters[last_by])
@@ -1085,9 +1810,13 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: Section
         '''
-        matching = self.get(**kwargs)
-        ordered_by_start = sorted(matching,
-                                  key=self.slice_attrgetters[order_by])
+        order = self._get_order(order_by=order_by, **kwargs)
+        if order is not None:
+            ordered_by_start = [self[p] for p in order[0]]
+        else:
+            matching = self.get(**kwargs)
+            ordered_by_start = sorted(matching,
+                                      key=self.slice_attrgetters[order_by])
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=ordered_by_start)
 
@@ -1108,6 +1837,12 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        order = self._get_order(**kwargs) \
+            if use == kwargs.get('order_by', 'start') else None
+        if order is not None:
+            positions, values = order
+            rank = bisect.bisect_right(values, index)
+            return self[positions[rank]] if rank < len(positions) else None
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in ordered:
             if getattr(elem.slice, use) > index:
@@ -1131,12 +1866,23 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        order = self._get_order(**kwargs) \
+            if kwargs.get('order_by', 'start') in (use, 'start') else None
+        if order is not None:
+            positions, values = order
+            # Indexed sections do not stop before they start, so only
+            # sections ordered before the first at or after index can match.
+            for rank in xrange(bisect.bisect_left(values, index) - 1, -1, -1):
+                position = positions[rank]
+                if getattr(self[position].slice, use) < index:
+                    return self[position]
+            return None
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if getattr(elem.slice, use) < index:
                 return elem
         return None
-    
+
     def get_longest(self, **kwargs):
         '''
         Gets the longest section matching the lookup criteria.
@@ -1173,6 +1919,12 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
+        section_index = self._get_index()
+        if section_index is not None:
+            surrounded = [self[p] for p in
+                          section_index.overlapping(index, index)]
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=surrounded)
         surrounded = []
         for section in self:
             if section.slice.start <= index <= section.slice.stop or\
@@ -1202,7 +1954,7 @@ class FlightPhaseNode(SectionNode):
     create_phases = SectionNode.create_sections
 
 
-class ListNode(Node, list):
+class ListNode(Node, _IndexedList):
     def __init__(self, *args, **kwargs):
         '''
         If the there is not an 'items' kwarg and the first argument is a list
@@ -1225,6 +1977,211 @@ class ListNode(Node, list):
         return '%s' % pprint.pformat(list(self))
 
 
+def _within_slices(within_slice=None, within_slices=None):
+    '''
+    :type within_slice: slice or None
+    :type within_slices: [slice] or None
+    :returns: within_slice combined with within_slices.
+    :rtype: [slice] or None
+    '''
+    if within_slice and within_slices:
+        within_slices.append(within_slice)
+    elif within_slice:
+        within_slices = [within_slice]
+    return within_slices
+
+
+def _bisect_slice(keys, _slice):
+    '''
+    Find the range of sorted keys within a slice, matching
+    is_index_within_slice.
+
+    :type keys: [int or float]
+    :type _slice: slice
+    :returns: Start and stop positions within keys.
+    :rtype: (int, int)
+    '''
+    if _slice.step is not None and _slice.step < 0:
+        # Indices from start down to, but excluding, stop.
+        start = 0 if _slice.stop is None else \
+            bisect.bisect_right(keys, _slice.stop)
+        stop = len(keys) if _slice.start is None else \
+            bisect.bisect_right(keys, _slice.start)
+    else:
+        start = 0 if _slice.start is None else \
+            bisect.bisect_left(keys, _slice.start)
+        stop = len(keys) if _slice.stop is None else \
+            bisect.bisect_left(keys, _slice.stop)
+    return start, max(start, stop)
+
+
+class _ItemIndex(object):
+    '''
+    Positions of the items of a FormattedNameNode grouped by name and sorted
+    by index, built lazily and discarded whenever the node's list of items is
+    modified.
+    '''
+    def __init__(self, items):
+        '''
+        :param items: Items of the node.
+        :type items: FormattedNameNode
+        '''
+        self.items = items
+        self._positions = None
+        self._orders = {}
+        # Indices which are None or NaN cannot be bisected.
+        self.valid = all(_is_number(i.index) for i in items)
+
+    def positions(self, name):
+        '''
+        :type name: str
+        :returns: Positions of items with the name in list order.
+        :rtype: [int]
+        '''
+        if self._positions is None:
+            positions = {}
+            for position, item in enumerate(self.items):
+                positions.setdefault(item.name, []).append(position)
+            self._positions = positions
+        return self._positions.get(name, [])
+
+    def order(self, name=None):
+        '''
+        :param name: Only include items with this name.
+        :type name: str or None
+        :returns: Positions of items sorted by index, with equal indices in list order, and their indices.
+        :rtype: ([int], [int or float])
+        '''
+        order = self._orders.get(name)
+        if order is None:
+            positions = xrange(len(self.items)) if name is None else \
+                self.positions(name)
+            pairs = sorted((self.items[p].index, p) for p in positions)
+            order = self._orders[name] = ([p for i, p in pairs],
+                                          [i for i, p in pairs])
+        return order
+
+    def select(self, name=None, within_slices=None):
+        '''
+        :param name: Only include items with this name.
+        :type name: str or None
+        :param within_slices: Only include items within these slices.
+        :type within_slices: [slice] or None
+        :returns: Positions of matching items sorted by index and their indices. These may be the index's own lists so must not be modified.
+        :rtype: ([int], [int or float])
+        '''
+        positions, keys = self.order(name)
+        if not within_slices:
+            return positions, keys
+        if len(within_slices) == 1:
+            start, stop = _bisect_slice(keys, within_slices[0])
+            return positions[start:stop], keys[start:stop]
+        ranks = set()
+        for _slice in within_slices:
+            ranks.update(xrange(*_bisect_slice(keys, _slice)))
+        ranks = sorted(ranks)
+        return [positions[r] for r in ranks], [keys[r] for r in ranks]
+
+
+class _Windows(object):
+    '''
+    Windows of a flight which the dependencies of a node are restricted to
+    and the conversion of indices between the flight and the windows joined
+    end to end.
+    '''
+    def __init__(self, windows):
+        '''
+        :param windows: Start and stop of each window in seconds, in order and not overlapping. Each is a multiple of the sample period of every dependency.
+        :type windows: [(float, float)]
+        '''
+        self.starts = [float(start) for start, stop in windows]
+        self.stops = [float(stop) for start, stop in windows]
+        # Start of each window once joined.
+        self.joined_starts = []
+        joined = 0.0
+        for start, stop in windows:
+            self.joined_starts.append(joined)
+            joined += stop - start
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _bounds(self, position, frequency):
+        '''
+        :returns: Start and stop of a window in samples and the number of samples the window moves by once joined.
+        :rtype: (int, int, int)
+        '''
+        return (int(round(self.starts[position] * frequency)),
+                int(round(self.stops[position] * frequency)),
+                int(round((self.starts[position] -
+                           self.joined_starts[position]) * frequency)))
+
+    def restrict(self, node):
+        '''
+        :param node: Dependency of a node.
+        :type node: Node or Attribute or None
+        :returns: Copy of node restricted to the windows joined end to end or node if it does not contain indices.
+        :rtype: Node or Attribute or None
+        '''
+        if isinstance(node, DerivedParameterNode):
+            parts = []
+            for position in range(len(self)):
+                start, stop, shift = self._bounds(position, node.frequency)
+                parts.append(node.array[start:stop])
+            windowed = copy.copy(node)
+            windowed.array = parts[0] if len(parts) == 1 else \
+                np.ma.concatenate(parts)
+            return windowed
+
+        if isinstance(node, SectionNode):
+            items = []
+            for position in range(len(self)):
+                start, stop, shift = self._bounds(position, node.frequency)
+                for section in node:
+                    # Sections are clipped to the window.
+                    begin = section.slice.start
+                    begin = start if begin is None else max(begin, start)
+                    end = section.slice.stop
+                    end = stop if end is None else min(end, stop)
+                    if begin >= end:
+                        continue
+                    start_edge = begin if section.start_edge is None else \
+                        min(max(section.start_edge, start), end)
+                    stop_edge = end if section.stop_edge is None else \
+                        min(max(section.stop_edge, begin), stop)
+                    items.append(Section(section.name,
+                                         slice(begin - shift, end - shift),
+                                         start_edge - shift,
+                                         stop_edge - shift))
+        elif isinstance(node, (KeyTimeInstanceNode, KeyPointValueNode)):
+            items = []
+            for position in range(len(self)):
+                start, stop, shift = self._bounds(position, node.frequency)
+                for item in node:
+                    if start <= item.index < stop:
+                        item = copy.copy(item)
+                        item.index -= shift
+                        items.append(item)
+        else:
+            return node
+        windowed = copy.copy(node)
+        windowed[:] = items
+        return windowed
+
+    def to_flight(self, index, frequency):
+        '''
+        :param index: Index within the windows joined end to end.
+        :type index: int or float
+        :param frequency: Frequency of index.
+        :type frequency: float
+        :returns: Index within the flight.
+        :rtype: int or float
+        '''
+        joined_starts = [s * frequency for s in self.joined_starts]
+        position = max(bisect.bisect_right(joined_starts, index) - 1, 0)
+        return index + self._bounds(position, frequency)[2]
+
+
 class FormattedNameNode(ListNode):
     '''
     NAME_FORMAT example:
@@ -1233,9 +2190,20 @@ class FormattedNameNode(ListNode):
     NAME_VALUES example:
     {'phase'    : ['ascent', 'descent'],
      'altitude' : [1000,1500],}
+
+    Queries by name, slice and index use an index of the items which is
+    rebuilt after the list is modified. Items modified in place, e.g.
+    kpv.index = 10, are not re-indexed until the list is next modified.
     '''
     NAME_FORMAT = ""
     NAME_VALUES = {}
+    # Names of phase dependencies whose sections bound the data the node
+    # reads. If set, dependencies are restricted to windows around each
+    # section, so that aligning them costs in proportion to the duration of
+    # the phases rather than the flight. See get_derived.
+    windows = ()
+    # Seconds of data either side of each section within the windows.
+    window_padding = 10
 
     def __init__(self, *args, **kwargs):
         '''
@@ -1244,6 +2212,93 @@ class FormattedNameNode(ListNode):
         super(FormattedNameNode, self).__init__(*args, **kwargs)
         self.restrict_names = kwargs.get('restrict_names', True)
 
+    def _get_windows(self, args):
+        '''
+        :param args: Dependencies in the order of the derive method's arguments.
+        :type args: list
+        :returns: Windows around the sections of the phases named by windows or None if the node is derived over the whole flight.
+        :rtype: _Windows or None
+        '''
+        if not self.windows or not self.align:
+            return None
+        frequencies = [self.align_frequency] if self.align_frequency else []
+        params = []
+        phases = []
+        for name, arg in zip(self.get_dependency_names(), args):
+            if arg is None or isinstance(arg, (Attribute,
+                                               FlightAttributeNode)):
+                continue
+            if not isinstance(arg, (DerivedParameterNode, SectionNode,
+                                    KeyTimeInstanceNode, KeyPointValueNode)):
+                # Other nodes cannot be restricted to windows.
+                return None
+            frequencies.append(arg.frequency)
+            if isinstance(arg, DerivedParameterNode):
+                params.append(arg)
+            elif name in self.windows and isinstance(arg, SectionNode):
+                phases.append(arg)
+        if not params or not phases:
+            return None
+        # Windows start and stop at a multiple of the longest sample period
+        # so that they start and stop at a sample of every dependency.
+        period = max([1.0] + [1.0 / f for f in frequencies])
+        if any(abs(period * f - round(period * f)) > 1e-9
+               for f in frequencies):
+            return None
+        duration = max(len(p.array) / p.frequency for p in params)
+        limit = math.ceil(duration / period) * period
+        windows = []
+        for phase in phases:
+            for section in phase:
+                start = section.slice.start
+                start = 0 if start is None else start / phase.frequency
+                stop = section.slice.stop
+                stop = duration if stop is None else stop / phase.frequency
+                if start >= stop:
+                    continue
+                windows.append((
+                    max(math.floor((start - self.window_padding) / period)
+                        * period, 0),
+                    min(math.ceil((stop + self.window_padding) / period)
+                        * period, limit)))
+        windows.sort()
+        merged = []
+        for start, stop in windows:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], stop)
+            elif start < stop:
+                merged.append([start, stop])
+        return _Windows(merged)
+
+    def get_derived(self, args, aligned_cache=None):
+        '''
+        If windows is set, dependencies are restricted to the sections of
+        those phases, padded by window_padding, joined end to end and derive
+        is called once. The indices of the items created are then converted
+        back to the flight. Data outside of the windows is not visible to
+        derive, e.g. sections of other phases are clipped to the windows and
+        KTIs outside of them are removed, and derive is not called if the
+        phases have no sections.
+
+        See Node.get_derived.
+        '''
+        windows = self._get_windows(args)
+        if windows is None:
+            return super(FormattedNameNode, self).get_derived(
+                args, aligned_cache=aligned_cache)
+        if not windows:
+            return self
+        count = len(self)
+        # The aligned cache is keyed by name so would return arrays of the
+        # whole flight.
+        super(FormattedNameNode, self).get_derived(
+            [windows.restrict(arg) for arg in args])
+        for item in self[count:]:
+            item.index = windows.to_flight(item.index, self.frequency)
+        # Items were modified in place.
+        self._item_index = None
+        return self
+
     @classmethod
     def names(cls):
         """
@@ -1263,6 +2318,19 @@ class FormattedNameNode(ListNode):
         ##cls.names = names  #cache
         return names
 
+    @classmethod
+    def name_set(cls):
+        """
+        :returns: The names returned by names(), cached until NAME_FORMAT or NAME_VALUES change.
+        :rtype: frozenset
+        """
+        key = (cls.NAME_FORMAT,
+               tuple((k, tuple(v)) for k, v in cls.NAME_VALUES.iteritems()))
+        cached = _formatted_names.get(cls)
+        if cached is None or cached[0] != key:
+            cached = _formatted_names[cls] = (key, frozenset(cls.names()))
+        return cached[1]
+
     def _validate_name(self, name):
         """
         Test that name is a valid combination of NAME_FORMAT and NAME_VALUES.
@@ -1270,7 +2338,7 @@ class FormattedNameNode(ListNode):
         :type name: str
         :rtype: bool
         """
-        return name in self.names()
+        return name in self.name_set()
 
     def format_name(self, replace_values={}, **kwargs):
         """
@@ -1310,10 +2378,7 @@ class FormattedNameNode(ListNode):
         :returns: Either a condition function or None.
         :rtype: func or None
         '''
-        if within_slice and within_slices:
-            within_slices.append(within_slice)
-        elif within_slice:
-            within_slices = [within_slice]
+        within_slices = _within_slices(within_slice, within_slices)
         
         within_slices_func = \
             lambda e: is_index_within_slices(e.index, within_slices)
@@ -1324,16 +2389,42 @@ class FormattedNameNode(ListNode):
         elif within_slices:
             return within_slices_func
         elif name:
-            #Q: If restrict names BUT the named item is in the list of objects
-            # contained, should we not return it anyway rather than raise?
-            if self.restrict_names and name not in self.names():
-                raise ValueError("Attempted to filter by invalid name '%s' "
-                                 "within '%s'." % (name,
-                                                   self.__class__.__name__))
+            self._check_name(name)
             return name_func
         else:
             return None
 
+    def _check_name(self, name):
+        '''
+        :raises ValueError: If names are restricted and name is invalid.
+        '''
+        #Q: If restrict names BUT the named item is in the list of objects
+        # contained, should we not return it anyway rather than raise?
+        if self.restrict_names and name not in self.name_set():
+            raise ValueError("Attempted to filter by invalid name '%s' "
+                             "within '%s'." % (name,
+                                               self.__class__.__name__))
+
+    def _get_positions(self, within_slice=None, within_slices=None,
+                       name=None):
+        '''
+        Find the items matching the conditions of _get_condition using the
+        index of items.
+
+        :returns: Positions of matching items sorted by index, with equal indices in list order, and their indices, or None if the items cannot be indexed.
+        :rtype: ([int], [int or float]) or None
+        '''
+        within_slices = _within_slices(within_slice, within_slices)
+        if name and not within_slices:
+            self._check_name(name)
+        item_index = self._item_index
+        if item_index is None:
+            item_index = self._item_index = _ItemIndex(self)
+        if not item_index.valid:
+            return None
+        return item_index.select(name=name or None,
+                                 within_slices=within_slices)
+
     def get(self, **kwargs):
         '''
         Gets elements either within_slice or with name.
@@ -1346,8 +2437,13 @@ class FormattedNameNode(ListNode):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
-        condition = self._get_condition(**kwargs)
-        matching = filter(condition, self) if condition else self
+        selected = self._get_positions(**kwargs) if any(kwargs.values()) \
+            else None
+        if selected is not None:
+            matching = [self[p] for p in sorted(selected[0])]
+        else:
+            condition = self._get_condition(**kwargs)
+            matching = filter(condition, self) if condition else self
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=matching)
 
@@ -1360,8 +2456,12 @@ class FormattedNameNode(ListNode):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
-        matching = self.get(**kwargs)
-        ordered_by_index = sorted(matching, key=attrgetter('index'))
+        selected = self._get_positions(**kwargs)
+        if selected is not None:
+            ordered_by_index = [self[p] for p in selected[0]]
+        else:
+            matching = self.get(**kwargs)
+            ordered_by_index = sorted(matching, key=attrgetter('index'))
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=ordered_by_index)
 
@@ -1374,6 +2474,10 @@ class FormattedNameNode(ListNode):
         :returns: First element matching conditions.
         :rtype: item within self or None
         '''
+        selected = self._get_positions(**kwargs)
+        if selected is not None:
+            positions = selected[0]
+            return self[positions[0]] if positions else None
         matching = self.get(**kwargs)
         if matching:
             return min(matching, key=attrgetter('index')) if matching else None
@@ -1389,6 +2493,13 @@ class FormattedNameNode(ListNode):
         :returns: Element with the lowest index matching criteria.
         :rtype: item within self or None
         '''
+        selected = self._get_positions(**kwargs)
+        if selected is not None:
+            positions, indices = selected
+            if not positions:
+                return None
+            # The first of the elements with the greatest index, as max.
+            return self[positions[bisect.bisect_left(indices, indices[-1])]]
         matching = self.get(**kwargs)
         if matching:
             return max(matching, key=attrgetter('index')) if matching else None
@@ -1410,6 +2521,12 @@ class FormattedNameNode(ListNode):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        selected = self._get_positions(**kwargs)
+        if selected is not None:
+            positions, indices = selected
+            position = bisect.bisect_right(indices, index)
+            return self[positions[position]] \
+                if position < len(positions) else None
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in ordered:
             if elem.index > index:
@@ -1431,6 +2548,11 @@ class FormattedNameNode(ListNode):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        selected = self._get_positions(**kwargs)
+        if selected is not None:
+            positions, indices = selected
+            position = bisect.bisect_left(indices, index)
+            return self[positions[position - 1]] if position else None
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if elem.index < index:
@@ -2329,16 +3451,8 @@ class NodeManager(object):
             return True
         elif name in self.derived_nodes:
             derived_node = self.derived_nodes[name]
-            # NOTE: Raises "Unbound method" here due to can_operate being
-            # overridden without wrapping with @classmethod decorator
-            attributes = []
-            argspec = inspect.getargspec(derived_node.can_operate)
-            if argspec.defaults:
-                for default in argspec.defaults:
-                    if not isinstance(default, Attribute):
-                        raise TypeError('Only Attributes may be keyword '
-                                        'arguments in can_operate methods.')
-                    attributes.append(self.get_attribute(default.name))
+            attributes = [self.get_attribute(n) for n in
+                          can_operate_attribute_names(derived_node)]
             # can_operate expects attributes.
             res = derived_node.can_operate(available, *attributes)
             ##if not res:
@@ -2453,5 +3567,6 @@ NODE_SUBCLASSES = {
     FlightPhaseNode,
     KeyPointValueNode,
     KeyTimeInstanceNode,
+    MultiOutputParameterNode,
     MultistateDerivedParameterNode,
 }
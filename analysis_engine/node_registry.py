@@ -0,0 +1,339 @@
+'''
+Registry of the node classes defined within node modules along with the
+metadata of each node which the dependency tree requires: its type, the
+names of its dependencies and the names of the Attributes inspected by its
+can_operate method.
+
+Registries are built once per process for each list of module names and may
+be stored as a JSON manifest so that other processes avoid inspecting every
+node again. A manifest is only used while the source of each module it was
+built from is unchanged. Manifests may be precompiled, e.g. while building
+the image of short-lived workers, with:
+
+    python -m analysis_engine.node_registry CACHE_DIR
+'''
+import argparse
+import logging
+import os
+import simplejson
+import sys
+import threading
+
+from collections import namedtuple, OrderedDict
+from hashlib import sha256
+from inspect import isclass
+
+from analysis_engine import settings, __version__
+from analysis_engine.dependency_graph import _module_hash
+from analysis_engine.node import (
+    NODE_SUBCLASSES,
+    MultiOutputParameterNode,
+    Node,
+    can_operate_attribute_names,
+    set_node_metadata,
+)
+
+
+logger = logging.getLogger(name=__name__)
+
+# VERSION is stored within manifests. Only manifests matching the current
+# VERSION number will be loaded.
+VERSION = '0.1'
+
+# Metadata of a node. dependencies and attributes are None if the node's
+# derive or can_operate methods cannot be inspected.
+NodeMetadata = namedtuple(
+    'NodeMetadata',
+    'name module class_name node_type dependencies attributes')
+
+# Registries keyed by module names.
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def _import_modules(module_names):
+    '''
+    :type module_names: [str]
+    :returns: Imported modules in the order of module_names.
+    :rtype: [module]
+    '''
+    # The last parameter of __import__ must not be empty, otherwise
+    # importing "A.B.C.D" only returns "A".
+    return [__import__(name, globals(), locals(), [''])
+            for name in module_names]
+
+
+def _is_node_class(value):
+    '''
+    :returns: Whether value is a concrete node class, i.e. a subclass of one of NODE_SUBCLASSES.
+    :rtype: bool
+    '''
+    if not isclass(value):
+        return False
+    # OPT: Lookup from set instead of issubclass (200x speedup).
+    for base_class in value.__bases__:
+        if base_class in NODE_SUBCLASSES:
+            return True
+    return issubclass(value, Node)
+
+
+def _node_names(node_class):
+    '''
+    :returns: Names the node class is registered as. Multi-output nodes are registered as each of their outputs.
+    :rtype: [str]
+    '''
+    if issubclass(node_class, MultiOutputParameterNode):
+        return node_class.names()
+    return [node_class.get_name()]
+
+
+def _node_metadata(name, node_class):
+    '''
+    Inspect the methods of a node class.
+
+    :type name: str
+    :type node_class: class
+    :rtype: NodeMetadata
+    '''
+    try:
+        dependencies = node_class.get_dependency_names()
+    except (AttributeError, NotImplementedError, TypeError, ValueError):
+        dependencies = None
+    try:
+        attributes = can_operate_attribute_names(node_class)
+    except TypeError:
+        attributes = None
+    return NodeMetadata(name, node_class.__module__, node_class.__name__,
+                        node_class.__base__.__name__, dependencies,
+                        attributes)
+
+
+def manifest_path(module_names, cache_dir):
+    '''
+    :type module_names: [str]
+    :param cache_dir: Directory where manifests are stored.
+    :type cache_dir: str
+    :returns: Path of the manifest of the node modules.
+    :rtype: str
+    '''
+    key = sha256('%s\n%s' % (__version__, '\n'.join(module_names)))
+    return os.path.join(cache_dir,
+                        'node_registry_%s.json' % key.hexdigest())
+
+
+class NodeRegistry(object):
+    '''
+    Node classes within node modules keyed by node name along with the
+    metadata of each node.
+    '''
+    def __init__(self, module_names, nodes, metadata, module_hashes):
+        '''
+        :param module_names: Names of the modules the registry was built from.
+        :type module_names: [str]
+        :param nodes: Node classes keyed by node name.
+        :type nodes: dict
+        :param metadata: NodeMetadata keyed by node name.
+        :type metadata: dict
+        :param module_hashes: Hashes of the source of each module which defines a node, keyed by module name.
+        :type module_hashes: dict
+        '''
+        self.module_names = list(module_names)
+        self.nodes = nodes
+        self.metadata = metadata
+        self.module_hashes = module_hashes
+        self._modules = [sys.modules.get(n) for n in self.module_names]
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def build(cls, module_names):
+        '''
+        Import the modules and inspect every node class defined within them.
+        Nodes within later modules replace nodes of the same name within
+        earlier modules.
+
+        :type module_names: [str]
+        :rtype: NodeRegistry
+        '''
+        nodes = OrderedDict()
+        for module in _import_modules(module_names):
+            for value in vars(module).values():
+                if not _is_node_class(value) or \
+                   value.__module__ == 'analysis_engine.node':
+                    continue
+                try:
+                    names = _node_names(value)
+                except TypeError:
+                    # Abstract classes cannot be named.
+                    logger.exception('Failed to import class: %s', value)
+                    continue
+                for name in names:
+                    nodes[name] = value
+        metadata = OrderedDict((name, _node_metadata(name, node_class))
+                               for name, node_class in nodes.iteritems())
+        module_hashes = {m.module: _module_hash(m.module)
+                         for m in metadata.itervalues()}
+        return cls(module_names, nodes, metadata, module_hashes)
+
+    @classmethod
+    def load(cls, path, module_names):
+        '''
+        Load a registry from a manifest written by save. The modules are
+        imported but their nodes are not inspected.
+
+        :param path: Path of the manifest.
+        :type path: str
+        :type module_names: [str]
+        :returns: Registry or None if the manifest is for a different version or modules, a module's source has changed or a node class no longer exists.
+        :rtype: NodeRegistry or None
+        '''
+        with open(path) as fh:
+            manifest = simplejson.load(fh)
+        if manifest.get('version') != VERSION or \
+           manifest.get('module_names') != list(module_names):
+            return None
+        _import_modules(module_names)
+        module_hashes = manifest['module_hashes']
+        for module_name, module_hash in module_hashes.iteritems():
+            if module_name not in sys.modules:
+                _import_modules([module_name])
+            if _module_hash(module_name) != module_hash:
+                logger.info("Node module '%s' has changed since the node "
+                            "registry manifest '%s' was written.",
+                            module_name, path)
+                return None
+        nodes = OrderedDict()
+        metadata = OrderedDict()
+        for values in manifest['nodes']:
+            meta = NodeMetadata(*values)
+            node_class = getattr(sys.modules[meta.module], meta.class_name,
+                                 None)
+            if node_class is None:
+                return None
+            nodes[meta.name] = node_class
+            metadata[meta.name] = meta
+        for name, meta in metadata.iteritems():
+            set_node_metadata(nodes[name], dependency_names=meta.dependencies,
+                              attribute_names=meta.attributes)
+        return cls(module_names, nodes, metadata, module_hashes)
+
+    def save(self, path):
+        '''
+        Write the registry to a manifest.
+
+        :param path: Path of the manifest.
+        :type path: str
+        '''
+        manifest = OrderedDict([
+            ('version', VERSION),
+            ('module_names', self.module_names),
+            ('module_hashes', self.module_hashes),
+            ('nodes', [list(m) for m in self.metadata.itervalues()]),
+        ])
+        # Write to a temporary file first so that concurrent processes never
+        # read a partially written file.
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'w') as fh:
+            simplejson.dump(manifest, fh)
+        os.rename(temp_path, path)
+
+    def is_current(self):
+        '''
+        :returns: Whether none of the modules have been reloaded since the registry was built.
+        :rtype: bool
+        '''
+        return all(sys.modules.get(n) is m
+                   for n, m in zip(self.module_names, self._modules))
+
+    def derived_nodes(self):
+        '''
+        :returns: Node classes keyed by node name, as returned by utils.get_derived_nodes.
+        :rtype: dict
+        '''
+        # A copy protects the registry from modification by the caller.
+        return dict(self.nodes)
+
+
+def get_registry(module_names, cache_dir=None):
+    '''
+    Get the registry of nodes within the modules from memory, from a
+    manifest within cache_dir or by building it.
+
+    :param module_names: Module names to import as locations on PYTHON PATH.
+    :type module_names: [str] or str
+    :param cache_dir: Directory where manifests are stored. Defaults to settings.NODE_REGISTRY_CACHE_DIR; not stored on disk if None.
+    :type cache_dir: str or None
+    :rtype: NodeRegistry
+    '''
+    if isinstance(module_names, basestring):
+        module_names = [module_names]
+    module_names = list(module_names)
+    if cache_dir is None:
+        cache_dir = settings.NODE_REGISTRY_CACHE_DIR
+    key = tuple(module_names)
+
+    with _registries_lock:
+        registry = _registries.get(key)
+    if registry is not None and registry.is_current():
+        return registry
+
+    registry = None
+    path = manifest_path(module_names, cache_dir) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            registry = NodeRegistry.load(path, module_names)
+        except Exception:
+            logger.exception("Unable to load node registry from '%s'.", path)
+        else:
+            if registry:
+                logger.info("Loaded node registry from '%s'.", path)
+
+    if registry is None:
+        registry = NodeRegistry.build(module_names)
+        if path:
+            registry.save(path)
+
+    with _registries_lock:
+        _registries[key] = registry
+    return registry
+
+
+def clear_registries():
+    '''
+    Clear the registries kept in memory.
+    '''
+    with _registries_lock:
+        _registries.clear()
+
+
+def main():
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+    parser = argparse.ArgumentParser(
+        description='Write the node registry manifest which is loaded by '
+        'processes with NODE_REGISTRY_CACHE_DIR set to the same directory.')
+    parser.add_argument('cache_dir', type=str,
+                        help='Directory to write the manifest to.')
+    parser.add_argument('-m', '--modules', type=str, nargs='+',
+                        dest='modules', default=settings.NODE_MODULES,
+                        help='Node modules in the order they are passed to '
+                        'get_derived_nodes. Defaults to NODE_MODULES.')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        os.makedirs(args.cache_dir)
+    registry = get_registry(args.modules, cache_dir=args.cache_dir)
+    logger.info("Node registry of %d nodes written to '%s'.", len(registry),
+                manifest_path(args.modules, args.cache_dir))
+
+
+if __name__ == '__main__':
+    main()
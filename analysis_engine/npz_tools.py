@@ -0,0 +1,364 @@
+'''
+Stores process_flight results in a compact columnar format within numpy
+.npz files.
+
+Key point values, key time instances and phases are stored as columns of
+every item of each type, grouped by node. Columns are only read from the
+file when accessed and the columns of a node are views upon them. Flight
+attributes and approaches, which are few and contain nested values, are
+stored as JSON (see json_tools).
+
+Numbers are stored as floats along with whether each was an integer so
+that integers, e.g. indices and slice bounds, are loaded as integers.
+Datetimes are stored to the microsecond. Aware datetimes are stored in UTC
+and loaded with a UTC timezone while naive datetimes are loaded naive. None
+is stored as NaN (or NaT for datetimes).
+'''
+import numpy as np
+import pytz
+import simplejson as json
+
+from collections import OrderedDict
+from datetime import datetime
+
+from analysis_engine.json_tools import (jsondict_to_node, node_to_jsondict,
+                                        process_flight_to_nodes)
+from analysis_engine.node import KeyPointValue, KeyTimeInstance, Section
+
+
+# VERSION is stored within the file. Only files matching the current VERSION
+# number will be loaded.
+VERSION = '0.2'
+
+# Columns of the items of each type of result stored in columns.
+COLUMNS = OrderedDict([
+    ('kpv', ('index', 'value', 'name', 'slice', 'datetime', 'latitude',
+             'longitude')),
+    ('kti', ('index', 'name', 'datetime', 'latitude', 'longitude')),
+    ('phases', ('name', 'slice', 'start_edge', 'stop_edge')),
+])
+
+# Types of result stored as JSON.
+JSON_KEYS = ('flight', 'approach')
+
+# Item types created for each type of result stored in columns.
+ITEM_TYPES = {
+    'kpv': KeyPointValue,
+    'kti': KeyTimeInstance,
+    'phases': Section,
+}
+
+SLICE_FIELDS = ('start', 'stop', 'step')
+
+
+def _encode(text):
+    '''
+    :type text: str or unicode
+    :rtype: str
+    '''
+    return text.encode('utf-8') if isinstance(text, unicode) else text
+
+
+def _float_columns(values):
+    '''
+    :type values: list of float, int or None
+    :returns: Values as floats and whether each value was an integer.
+    :rtype: (np.array, np.array)
+    '''
+    column = np.array([np.nan if v is None else v for v in values],
+                      dtype=np.float64)
+    integers = np.array([isinstance(v, (int, long, np.integer))
+                         for v in values], dtype=np.bool_)
+    return column, integers
+
+
+def _float_list(column, integers):
+    '''
+    :type column: np.array
+    :param integers: Whether each value was an integer.
+    :type integers: np.array
+    :returns: Values of the column with NaN converted to None.
+    :rtype: list
+    '''
+    return [int(v) if i else v for v, i in
+            zip(np.ma.masked_invalid(column).tolist(), integers.tolist())]
+
+
+def _datetime_columns(values):
+    '''
+    :type values: list of datetime or None
+    :returns: Naive datetimes, in UTC if aware, and whether each datetime was aware.
+    :rtype: (np.array, np.array)
+    '''
+    naive = []
+    aware = []
+    for value in values:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+            aware.append(True)
+        else:
+            aware.append(False)
+        naive.append(value)
+    return (np.array(naive, dtype='datetime64[us]'),
+            np.array(aware, dtype=np.bool_))
+
+
+def _datetime_list(column, aware):
+    '''
+    :type column: np.array
+    :param aware: Whether each datetime was aware.
+    :type aware: np.array
+    :returns: Datetimes, with a UTC timezone if aware, with NaT converted to None.
+    :rtype: list
+    '''
+    return [v.replace(tzinfo=pytz.utc) if a and v is not None else v
+            for v, a in zip(column.astype(datetime).tolist(),
+                            aware.tolist())]
+
+
+def _name_columns(values):
+    '''
+    :type values: list of str
+    :returns: Id of each value within the distinct values and the distinct values.
+    :rtype: (np.array, np.array)
+    '''
+    names, ids = np.unique(np.array([_encode(v) for v in values],
+                                    dtype=np.str_), return_inverse=True)
+    return ids.astype(np.int32), names
+
+
+def _result_arrays(key, nodes):
+    '''
+    Convert the items of a type of result into columns.
+
+    :param key: Type of result, e.g. 'kpv'.
+    :type key: str
+    :param nodes: Lists of items keyed by node name.
+    :type nodes: dict
+    :returns: Arrays keyed by name within the file.
+    :rtype: dict
+    '''
+    node_names = sorted(nodes)
+    items = []
+    offsets = [0]
+    for node_name in node_names:
+        items.extend(nodes[node_name])
+        offsets.append(len(items))
+
+    arrays = {
+        '%s_nodes' % key: np.array([_encode(n) for n in node_names],
+                                   dtype=np.str_),
+        '%s_offsets' % key: np.array(offsets, dtype=np.int64),
+    }
+    for column in COLUMNS[key]:
+        values = [getattr(item, column) for item in items]
+        prefix = '%s_%s' % (key, column)
+        if column == 'name':
+            arrays[prefix], arrays['%s_names' % key] = _name_columns(values)
+        elif column == 'datetime':
+            arrays[prefix], arrays['%s_aware' % prefix] = \
+                _datetime_columns(values)
+        elif column == 'slice':
+            for field in SLICE_FIELDS:
+                name = '%s_%s' % (prefix, field)
+                arrays[name], arrays['%s_int' % name] = _float_columns(
+                    [getattr(v, field) for v in values])
+        else:
+            arrays[prefix], arrays['%s_int' % prefix] = \
+                _float_columns(values)
+    return arrays
+
+
+def process_flight_to_npz(pf_results, dest, compress=False):
+    '''
+    Write process_flight results to a .npz file.
+
+    :param pf_results: Results as returned by process_flight.
+    :type pf_results: dict
+    :param dest: Path or file object to write to.
+    :type dest: str or file
+    :param compress: Compress the columns. Compressed files are smaller but slower to load.
+    :type compress: bool
+    '''
+    arrays = {'version': np.array(VERSION)}
+    for key in COLUMNS:
+        arrays.update(_result_arrays(key, pf_results[key]))
+    for key in JSON_KEYS:
+        d = OrderedDict()
+        for name, items in sorted(pf_results[key].items()):
+            d[name] = [node_to_jsondict(i) for i in items]
+        arrays['%s_json' % key] = np.array(json.dumps(d))
+    if compress:
+        np.savez_compressed(dest, **arrays)
+    else:
+        np.savez(dest, **arrays)
+
+
+class ColumnarResults(object):
+    '''
+    Read access to process_flight results within a .npz file. Columns are
+    read when first accessed.
+    '''
+    def __init__(self, arrays):
+        '''
+        :param arrays: Arrays keyed by name as loaded by np.load.
+        :type arrays: np.lib.npyio.NpzFile or dict
+        '''
+        self._arrays = arrays
+        self._cache = {}
+        self._positions = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            self._cache[name] = self._arrays[name]
+        return self._cache[name]
+
+    @property
+    def version(self):
+        '''
+        :rtype: str
+        '''
+        return str(self['version'])
+
+    def node_names(self, key):
+        '''
+        :param key: Type of result, e.g. 'kpv'.
+        :type key: str
+        :rtype: [str]
+        '''
+        return self['%s_nodes' % key].tolist()
+
+    def names(self, key):
+        '''
+        :param key: Type of result, e.g. 'kpv'.
+        :type key: str
+        :returns: Distinct item names referred to by the 'name' column.
+        :rtype: np.array
+        '''
+        return self['%s_names' % key]
+
+    def _slice(self, key, node_name):
+        '''
+        :rtype: slice
+        '''
+        if key not in self._positions:
+            self._positions[key] = {
+                n: i for i, n in enumerate(self.node_names(key))}
+        position = self._positions[key][node_name]
+        offsets = self['%s_offsets' % key]
+        return slice(offsets[position], offsets[position + 1])
+
+    def columns(self, key, node_name=None):
+        '''
+        :param key: Type of result, e.g. 'kpv'.
+        :type key: str
+        :param node_name: Name of node to get the columns of. Columns of every node are returned if None.
+        :type node_name: str or None
+        :raises KeyError: If the node has no results.
+        :returns: Column arrays keyed by name. Slices are split into columns suffixed with '_start', '_stop' and '_step'.
+        :rtype: dict
+        '''
+        _slice = slice(None) if node_name is None else \
+            self._slice(key, node_name)
+        columns = {}
+        for column in COLUMNS[key]:
+            prefix = '%s_%s' % (key, column)
+            if column == 'slice':
+                for field in SLICE_FIELDS:
+                    name = '%s_%s' % (column, field)
+                    columns[name] = self['%s_%s' % (prefix, field)][_slice]
+            else:
+                columns[column] = self[prefix][_slice]
+        return columns
+
+    def items(self, key, node_name=None):
+        '''
+        :param key: Type of result, e.g. 'kpv'.
+        :type key: str
+        :param node_name: Name of node to create items for. Items of every node are returned if None.
+        :type node_name: str or None
+        :returns: KeyPointValue, KeyTimeInstance or Section items.
+        :rtype: list
+        '''
+        columns = self.columns(key, node_name)
+        _slice = slice(None) if node_name is None else \
+            self._slice(key, node_name)
+
+        def flags(name):
+            return self['%s_%s' % (key, name)][_slice]
+
+        values = []
+        for column in COLUMNS[key]:
+            if column == 'name':
+                values.append(self.names(key)[columns['name']].tolist())
+            elif column == 'datetime':
+                values.append(_datetime_list(columns['datetime'],
+                                             flags('datetime_aware')))
+            elif column == 'slice':
+                values.append([slice(*s) for s in zip(*[
+                    _float_list(columns['slice_%s' % f],
+                                flags('slice_%s_int' % f))
+                    for f in SLICE_FIELDS])])
+            else:
+                values.append(_float_list(columns[column],
+                                          flags('%s_int' % column)))
+        item_type = ITEM_TYPES[key]
+        return [item_type(*v) for v in zip(*values)]
+
+    def to_process_flight(self):
+        '''
+        :returns: Results as returned by process_flight.
+        :rtype: dict
+        '''
+        res = {}
+        for key in COLUMNS:
+            items = self.items(key)
+            offsets = self['%s_offsets' % key].tolist()
+            res[key] = {
+                name: items[offsets[i]:offsets[i + 1]]
+                for i, name in enumerate(self.node_names(key))}
+        for key in JSON_KEYS:
+            d = json.loads(str(self['%s_json' % key]))
+            res[key] = {name: [jsondict_to_node(i) for i in items]
+                        for name, items in d.iteritems()}
+        return res
+
+
+def load_npz(source):
+    '''
+    :param source: Path or file object of a file written by process_flight_to_npz.
+    :type source: str or file
+    :returns: Results within the file or None if the file's version does not match VERSION.
+    :rtype: ColumnarResults or None
+    '''
+    results = ColumnarResults(np.load(source))
+    if 'version' not in results._arrays or results.version != VERSION:
+        return None
+    return results
+
+
+def npz_to_process_flight(source):
+    '''
+    Convert a .npz file to a data structure as returned by `process_flight`.
+
+    :param source: Path or file object of a file written by process_flight_to_npz.
+    :type source: str or file
+    :returns: Results or an empty dict if the file's version does not match VERSION.
+    :rtype: dict
+    '''
+    results = load_npz(source)
+    return results.to_process_flight() if results else {}
+
+
+def npz_to_nodes(source, derived_nodes=None):
+    '''
+    Load process flight results within a .npz file into Node objects.
+
+    :param source: Path or file object of a file written by process_flight_to_npz.
+    :type source: str or file
+    :param derived_nodes: Node classes keyed by name, see json_tools.process_flight_to_nodes.
+    :type derived_nodes: dict or None
+    :rtype: dict
+    '''
+    return process_flight_to_nodes(npz_to_process_flight(source),
+                                   derived_nodes=derived_nodes)
@@ -0,0 +1,162 @@
+'''
+Sidecar store of parameters in uncompressed, contiguous files which are
+memory-mapped when read.
+
+derive_parameters reads each parameter from the HDF file, where it is
+compressed, at most once per flight. With a store, the parameter is then
+written to the store and every node which depends upon it receives a
+copy-on-write memory map of the stored file rather than a copy of the whole
+array. Nodes which only access a few phases of an array only read the pages
+of the file they access, and modifying an array does not modify the file or
+the arrays received by other nodes.
+
+Each array is stored as a .npy file for its data and another for its mask if
+any values are masked. Stores last for the flight they are created for and
+are removed once closed.
+'''
+import numpy as np
+import os
+import shutil
+import tempfile
+
+from hdfaccess.parameter import MappedArray
+
+from analysis_engine.node import (DerivedParameterNode,
+                                  MultistateDerivedParameterNode)
+
+
+class ParameterStore(object):
+    '''
+    Parameters stored within a directory of memory-mappable files, keyed by
+    parameter name.
+    '''
+    def __init__(self, dir=None):
+        '''
+        :param dir: Directory within which the store's directory is created. The system's temporary directory is used if None.
+        :type dir: str or None
+        '''
+        self.path = tempfile.mkdtemp(prefix='parameters_', dir=dir)
+        # Metadata of each parameter keyed by name.
+        self._params = {}
+        # Number of parameters written, used to name files as parameter
+        # names are not valid file names.
+        self._count = 0
+
+    def __contains__(self, name):
+        return name in self._params
+
+    def __len__(self):
+        return len(self._params)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, array):
+        '''
+        :type array: np.ndarray
+        :returns: Path of the file the array is written to.
+        :rtype: str
+        '''
+        path = os.path.join(self.path, '%d.npy' % self._count)
+        self._count += 1
+        np.save(path, np.ascontiguousarray(array))
+        return path
+
+    @staticmethod
+    def _read(path):
+        '''
+        :type path: str
+        :returns: Copy-on-write memory map of the array within the file.
+        :rtype: np.memmap or np.ndarray
+        '''
+        return np.load(path, mmap_mode='c')
+
+    def set(self, param):
+        '''
+        Write a parameter to the store, replacing a stored parameter of the
+        same name.
+
+        :param param: Parameter node or parameter read from an HDF file.
+        :type param: DerivedParameterNode or Parameter
+        :raises ValueError: If the parameter's array contains objects which cannot be memory-mapped.
+        '''
+        array = param.array
+        data = np.ma.getdata(array)
+        if data.dtype.hasobject:
+            raise ValueError("Array of parameter '%s' cannot be stored as it "
+                             "contains objects." % param.name)
+        mask = np.ma.getmask(array)
+        if isinstance(array, MappedArray):
+            values_mapping = array.values_mapping
+        else:
+            values_mapping = None
+        self.remove(param.name)
+        self._params[param.name] = {
+            'data': self._write(data),
+            # Masks without masked values are not stored.
+            'mask': self._write(mask) if np.any(mask) else None,
+            'size': data.size,
+            'frequency': param.frequency,
+            'offset': param.offset,
+            'data_type': getattr(param, 'data_type', None),
+            'values_mapping': values_mapping,
+        }
+
+    def get(self, name):
+        '''
+        :param name: Name of a stored parameter.
+        :type name: str
+        :raises KeyError: If the parameter is not stored.
+        :returns: Parameter whose array is backed by the files within the store. Changes to the array are not written to the files.
+        :rtype: DerivedParameterNode or MultistateDerivedParameterNode
+        '''
+        meta = self._params[name]
+        # Empty arrays cannot be memory-mapped.
+        if meta['size']:
+            data = self._read(meta['data'])
+            mask = self._read(meta['mask']) if meta['mask'] else False
+        else:
+            data = np.load(meta['data'])
+            mask = False
+        if meta['values_mapping'] is None:
+            array = np.ma.array(data, mask=mask, copy=False)
+            node_class = DerivedParameterNode
+            kwargs = {}
+        else:
+            array = MappedArray(data, mask=mask, copy=False,
+                                values_mapping=meta['values_mapping'])
+            node_class = MultistateDerivedParameterNode
+            kwargs = {'values_mapping': meta['values_mapping']}
+        return node_class(name=name, array=array,
+                          frequency=meta['frequency'], offset=meta['offset'],
+                          data_type=meta['data_type'], **kwargs)
+
+    def remove(self, name):
+        '''
+        Remove a parameter from the store. Arrays already returned by get
+        remain valid.
+
+        :type name: str
+        '''
+        meta = self._params.pop(name, None)
+        if meta is None:
+            return
+        for key in ('data', 'mask'):
+            if not meta[key]:
+                continue
+            try:
+                os.remove(meta[key])
+            except OSError:
+                # Files which are mapped cannot be removed on Windows. They
+                # are removed along with the store.
+                pass
+
+    def close(self):
+        '''
+        Remove the store and all of its files.
+        '''
+        self._params.clear()
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,212 @@
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+
+from analysis_engine import settings
+from analysis_engine.api_handler import get_api_handler
+from analysis_engine.process_flight import process_flight
+from analysis_engine.utils import get_derived_nodes
+
+
+logger = logging.getLogger(__name__)
+
+# Matches segment files created by split_hdf_to_segments, e.g. 'name.001.hdf5'
+# or 'name.001-SEGMENT-START_AND_STOP.hdf5' when renamed by
+# FlightDataSplitter.
+SEGMENT_FILENAME_RE = re.compile(
+    r'\.\d{3}(?:-SEGMENT-(?P<segment_type>[A-Z_]+))?\.hdf5$')
+
+# State which is created once per worker and reused for every flight it
+# processes.
+_worker_state = {}
+
+
+def find_segments(path, segment_type=None):
+    '''
+    Find split segment files within a directory ordered by filename.
+
+    :param path: Directory containing segment files.
+    :type path: str
+    :param segment_type: Segment type used when it cannot be determined from the filename.
+    :type segment_type: str or None
+    :returns: segment_info dictionaries for each segment file.
+    :rtype: [dict]
+    '''
+    segment_infos = []
+    for filename in sorted(os.listdir(path)):
+        match = SEGMENT_FILENAME_RE.search(filename)
+        if not match:
+            continue
+        segment_info = {'File': os.path.join(path, filename)}
+        file_segment_type = match.group('segment_type') or segment_type
+        if file_segment_type:
+            segment_info['Segment Type'] = file_segment_type
+        segment_infos.append(segment_info)
+    return segment_infos
+
+
+def _init_worker(additional_modules):
+    '''
+    Import node modules, find node classes and create the API handler once
+    for all flights processed by this worker.
+
+    :param additional_modules: List of module paths to import.
+    :type additional_modules: [str]
+    '''
+    _worker_state['derived_nodes'] = get_derived_nodes(
+        additional_modules + settings.NODE_MODULES)
+    # The handler is memoised by get_api_handler.
+    get_api_handler(settings.API_HANDLER)
+
+
+def _process_segment(args):
+    '''
+    Process a single segment within a worker.
+
+    :param args: segment_info, tail_number and process_flight keyword arguments.
+    :type args: (dict, str, dict)
+    :returns: segment_info, process_flight results or None and the formatted traceback if processing failed.
+    :rtype: (dict, dict or None, str or None)
+    '''
+    segment_info, tail_number, kwargs = args
+    kwargs = dict(kwargs)
+    # process_flight modifies aircraft_info.
+    kwargs['aircraft_info'] = dict(kwargs.get('aircraft_info') or {})
+    tail_number = segment_info.get('Tail Number', tail_number)
+    try:
+        res = process_flight(segment_info, tail_number,
+                             derived_nodes=_worker_state['derived_nodes'],
+                             **kwargs)
+    except Exception:
+        logger.exception("Failed to process '%s'.", segment_info['File'])
+        return segment_info, None, traceback.format_exc()
+    return segment_info, res, None
+
+
+def process_flights(segment_infos, tail_number, processes=None,
+                    additional_modules=[], **kwargs):
+    '''
+    Process many segments reusing node registries, API handlers and their
+    lookup tables across flights. Segments are distributed across a pool of
+    long-lived worker processes, each of which prepares this state once.
+
+    A failure to process one segment is logged and does not stop the batch.
+
+    :param segment_infos: segment_info dictionaries as accepted by process_flight. An optional 'Tail Number' key overrides tail_number for the segment.
+    :type segment_infos: iterable of dict
+    :param tail_number: Aircraft tail number.
+    :type tail_number: str
+    :param processes: Number of worker processes. Segments are processed within the current process if 0. Defaults to settings.BATCH_PROCESSES or the number of CPUs if that is None.
+    :type processes: int or None
+    :param additional_modules: List of module paths to import.
+    :type additional_modules: [str]
+    :param kwargs: Keyword arguments passed to process_flight.
+    :returns: Yields segment_info, process_flight results (None if processing failed) and the formatted traceback (None if processing succeeded) in the order segments complete.
+    :rtype: generator of (dict, dict or None, str or None)
+    '''
+    if processes is None:
+        processes = settings.BATCH_PROCESSES
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    kwargs['additional_modules'] = additional_modules
+    tasks = ((segment_info, tail_number, kwargs)
+             for segment_info in segment_infos)
+
+    if not processes:
+        _init_worker(additional_modules)
+        for task in tasks:
+            yield _process_segment(task)
+        return
+
+    pool = multiprocessing.Pool(
+        processes, initializer=_init_worker, initargs=(additional_modules,),
+        maxtasksperchild=settings.BATCH_MAX_FLIGHTS_PER_WORKER)
+    try:
+        for result in pool.imap_unordered(_process_segment, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    print 'FlightDataAnalyzer (c) Copyright 2013 Flight Data Services, Ltd.'
+    print '  - Powered by POLARIS'
+    print '  - http://www.flightdatacommunity.com'
+    print ''
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+    parser = argparse.ArgumentParser(
+        description="Process many flights. HDF files are processed in place.")
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Paths of segment files or directories '
+                        'containing split segment files.')
+    parser.add_argument('-tail', '--tail', dest='tail_number',
+                        default='G-FDSL',  # as per flightdatacommunity file
+                        help='Aircraft tail number.')
+    parser.add_argument('-segment-type', dest='segment_type',
+                        default='START_AND_STOP',
+                        help='Type of segment if not within the filename.')
+    parser.add_argument('-r', '--requested', type=str, nargs='+',
+                        dest='requested', default=[], help='Requested nodes.')
+    parser.add_argument('-R', '--required', type=str, nargs='+',
+                        dest='required', default=[], help='Required nodes.')
+    parser.add_argument('-j', '--processes', dest='processes', type=int,
+                        default=None,
+                        help='Number of worker processes, 0 to process '
+                        'within this process.')
+    help = 'Disable writing a CSV of the processing results.'
+    parser.add_argument('-disable-csv', dest='disable_csv',
+                        action='store_true', help=help)
+    parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                        help='Verbose logging')
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    segment_infos = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            segment_infos.extend(find_segments(path, args.segment_type))
+        elif os.path.exists(path):
+            segment_infos.append({'File': path,
+                                  'Segment Type': args.segment_type})
+        else:
+            parser.error('Path not found: %s' % path)
+
+    from analysis_engine.plot_flight import csv_flight_details
+    start = time.time()
+    failed = []
+    for segment_info, res, error in process_flights(
+            segment_infos, args.tail_number, processes=args.processes,
+            requested=args.requested, required=args.required):
+        if res is None:
+            failed.append(segment_info['File'])
+            continue
+        logger.info("Derived parameters stored in hdf: %s",
+                    segment_info['File'])
+        if not args.disable_csv:
+            # Flatten results.
+            res = {k: list(itertools.chain.from_iterable(v.itervalues()))
+                   for k, v in res.iteritems()}
+            csv_dest = os.path.splitext(segment_info['File'])[0] + '.csv'
+            csv_flight_details(segment_info['File'], res['kti'], res['kpv'],
+                               res['phases'], dest_path=csv_dest)
+
+    logger.info("Processed %d flights in %.1f seconds, %d failed.",
+                len(segment_infos), time.time() - start, len(failed))
+    for path in failed:
+        logger.warning("Failed: %s", path)
+
+
+if __name__ == '__main__':
+    main()
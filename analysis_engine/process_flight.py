@@ -1,10 +1,18 @@
 import argparse
+import heapq
 import itertools
 import logging
+import multiprocessing
+import numpy as np
 import os
+import Queue
 import sys
+import time
+import traceback
 
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from networkx.readwrite import json_graph
 
 from flightdatautilities.filesystem_tools import copy_file
@@ -12,18 +20,27 @@ from flightdatautilities.filesystem_tools import copy_file
 from hdfaccess.file import hdf_file
 
 from analysis_engine import hooks, settings, __version__
-from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.dependency_graph import (cached_dependency_order,
+                                              dependency_order,
+                                              node_fingerprints)
 from analysis_engine.json_tools import json_to_process_flight, process_flight_to_nodes
-from analysis_engine.library import np_ma_masked_zeros, repair_mask
-from analysis_engine.node import (ApproachNode, Attribute,
+from analysis_engine.library import (np_ma_masked_zeros, repair_mask,
+                                     values_at_time)
+from analysis_engine.node import (AlignedParameterCache,
+                                  ApproachNode, Attribute,
                                   derived_param_from_hdf,
                                   DerivedParameterNode,
                                   FlightAttributeNode,
                                   FlightPhaseNode,
                                   KeyPointValueNode,
                                   KeyTimeInstanceNode,
+                                  MultiOutputParameterNode,
                                   NodeManager, P, Section, SectionNode,
                                   NODE_SUBCLASSES)
+from analysis_engine.npz_tools import npz_to_process_flight
+from analysis_engine.parameter_store import ParameterStore
+from analysis_engine.profiling import (active, NodeProfiler, record_nbytes,
+                                       timer)
 from analysis_engine.utils import get_aircraft_info, get_derived_nodes
 
 
@@ -31,15 +48,48 @@ logger = logging.getLogger(__name__)
 
 
 
-def geo_locate(hdf, items):
+def _chain_items(items):
+    '''
+    :param items: Dictionaries of lists of items keyed by node name.
+    :type items: tuple of dict
+    :returns: Every item within the dictionaries.
+    :rtype: list
+    '''
+    return list(itertools.chain.from_iterable(
+        itertools.chain.from_iterable(i.itervalues() for i in items)))
+
+
+def _item_indices(item_list):
+    '''
+    :type item_list: list
+    :returns: Index of each item, NaN where the index is None.
+    :rtype: np.array
+    '''
+    return np.array([np.nan if item.index is None else item.index
+                     for item in item_list], dtype=np.float64)
+
+
+def geo_locate(hdf, *items):
     '''
     Translate KeyTimeInstance into GeoKeyTimeInstance namedtuples
+
+    The position of every item is interpolated at once, so KTIs and KPVs
+    should be passed together.
+
+    :param hdf: Data file containing 'Latitude Smoothed' and 'Longitude Smoothed'.
+    :type hdf: hdf_file
+    :param items: Dictionaries of lists of items keyed by node name, which are updated in place.
+    :type items: dict
+    :returns: items, or the only dictionary if one was passed.
+    :rtype: tuple of dict or dict
     '''
-    if 'Latitude Smoothed' not in hdf.valid_param_names() \
-       or 'Longitude Smoothed' not in hdf.valid_param_names():
+    result = items[0] if len(items) == 1 else items
+    valid_param_names = hdf.valid_param_names()
+    if 'Latitude Smoothed' not in valid_param_names \
+       or 'Longitude Smoothed' not in valid_param_names:
         logger.warning("Could not geo-locate as either 'Latitude Smoothed' or "
                        "'Longitude Smoothed' were not found within the hdf.")
-        return items
+        return result
     
     lat_hdf = hdf['Latitude Smoothed']
     lon_hdf = hdf['Longitude Smoothed']
@@ -47,36 +97,51 @@ def geo_locate(hdf, items):
     if (not lat_hdf.array.count()) or (not lon_hdf.array.count()):
         logger.warning("Could not geo-locate as either 'Latitude Smoothed' or "
                        "'Longitude Smoothed' have no unmasked values.")
-        return items
+        return result
     
-    lat_pos = derived_param_from_hdf(lat_hdf)
-    lon_pos = derived_param_from_hdf(lon_hdf)
+    item_list = _chain_items(items)
+    if not item_list:
+        return result
     
     # We want to place start of flight and end of flight markers at the ends
     # of the data which may extend more than REPAIR_DURATION seconds beyond
     # the end of the valid data. Hence by setting this to None and
     # extrapolate=True we achieve this goal.
-    lat_pos.array = repair_mask(lat_pos.array, repair_duration=None, extrapolate=True)
-    lon_pos.array = repair_mask(lon_pos.array, repair_duration=None, extrapolate=True)
+    lat_array = repair_mask(lat_hdf.array, repair_duration=None,
+                            extrapolate=True, copy=True)
+    lon_array = repair_mask(lon_hdf.array, repair_duration=None,
+                            extrapolate=True, copy=True)
     
-    for item in itertools.chain.from_iterable(items.itervalues()):
-        item.latitude = lat_pos.at(item.index) or None
-        item.longitude = lon_pos.at(item.index) or None
-    return items
-
-
-def _timestamp(start_datetime, items):
+    indices = _item_indices(item_list)
+    # Masked values are converted to None.
+    latitudes = values_at_time(lat_array, lat_hdf.frequency, lat_hdf.offset,
+                               indices).tolist()
+    longitudes = values_at_time(lon_array, lon_hdf.frequency, lon_hdf.offset,
+                                indices).tolist()
+    for item, latitude, longitude in zip(item_list, latitudes, longitudes):
+        item.latitude = latitude or None
+        item.longitude = longitude or None
+    return result
+
+
+def _timestamp(start_datetime, *items):
     '''
     Adds item.datetime (from timedelta of item.index + start_datetime)
 
     :param start_datetime: Origin timestamp used as a base to the index
     :type start_datetime: datetime
-    :param item_list: list of objects with a .index attribute
-    :type item_list: list
+    :param items: Dictionaries of lists of objects with a .index attribute keyed by node name, which are updated in place.
+    :type items: dict
+    :returns: items, or the only dictionary if one was passed.
+    :rtype: tuple of dict or dict
     '''
-    for item in itertools.chain.from_iterable(items.itervalues()):
-        item.datetime = start_datetime + timedelta(seconds=float(item.index))
-    return items
+    item_list = _chain_items(items)
+    # Convert every index to a timedelta rounded to microseconds at once.
+    microseconds = np.round(_item_indices(item_list) * 1e6)
+    timedeltas = microseconds.astype('timedelta64[us]').tolist()
+    for item, delta in zip(item_list, timedeltas):
+        item.datetime = start_datetime + delta
+    return items[0] if len(items) == 1 else items
 
 
 def get_node_type(node, node_subclasses):
@@ -90,11 +155,423 @@ def get_node_type(node, node_subclasses):
     return node.__class__.__name__
 
 
-def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
+class ParameterResidency(object):
+    '''
+    Keeps parameters in memory from when they are first read from (or
+    written to) the HDF file until the last node within the derive order
+    which depends upon them has been derived, after which they are evicted.
+    Each parameter is therefore read from the HDF file at most once per
+    flight.
+
+    Derive methods may modify the arrays of their dependencies, so a copy of
+    the resident parameter is returned each time. With a ParameterStore,
+    parameters are kept within the store instead and each node receives a
+    copy-on-write memory map of the stored array.
+    '''
+    def __init__(self, hdf, derive_order, derived_nodes, store=None):
+        '''
+        :param hdf: Data file accessor used to get parameter data.
+        :type hdf: hdf_file
+        :param derive_order: Names of the nodes to derive in dependency order.
+        :type derive_order: [str]
+        :param derived_nodes: Node classes keyed by name.
+        :type derived_nodes: dict
+        :param store: Store of memory-mapped parameters. Parameters are kept in memory if None.
+        :type store: ParameterStore or None
+        '''
+        self.hdf = hdf
+        self.store = store
+        self.reads = 0
+        self.evictions = 0
+        self._params = {}
+        # Number of nodes yet to be derived which depend upon each name.
+        self._consumers = defaultdict(int)
+        for name in derive_order:
+            for dep_name in set(derived_nodes[name].get_dependency_names()):
+                self._consumers[dep_name] += 1
+
+    def __contains__(self, name):
+        return name in self._params or \
+            (self.store is not None and name in self.store)
+
+    def __len__(self):
+        return len(self._params) + (len(self.store) if self.store else 0)
+
+    @staticmethod
+    def _copy(param):
+        '''
+        :type param: DerivedParameterNode or None
+        :rtype: DerivedParameterNode or None
+        '''
+        if param is None:
+            return None
+        param_copy = derived_param_from_hdf(param)
+        param_copy.array = param.array.copy()
+        return param_copy
+
+    def _store(self, param):
+        '''
+        Write a parameter to the store.
+
+        :type param: DerivedParameterNode
+        :returns: Whether the parameter was stored. Parameters which cannot be stored, e.g. arrays of objects, are kept in memory instead.
+        :rtype: bool
+        '''
+        try:
+            with timer('write'):
+                self.store.set(param)
+        except ValueError as err:
+            logger.debug("Keeping parameter in memory: %s", err)
+            self.store.remove(param.name)
+            return False
+        return True
+
+    def get(self, name):
+        '''
+        :param name: Name of parameter within the HDF file.
+        :type name: str
+        :returns: A copy of the parameter or None if it is invalid.
+        :rtype: DerivedParameterNode or None
+        '''
+        if name in self._params:
+            return self._copy(self._params[name])
+        if self.store is not None and name in self.store:
+            return self.store.get(name)
+        try:
+            with timer('read'):
+                param = derived_param_from_hdf(self.hdf.get_param(
+                    name, valid_only=True))
+        except KeyError:
+            # Parameter is invalid.
+            param = None
+        self.reads += 1
+        if not self._consumers[name]:
+            return param
+        if param is not None and self.store is not None and \
+           self._store(param):
+            return self.store.get(name)
+        self._params[name] = param
+        return self._copy(param)
+
+    def add(self, param):
+        '''
+        Keep a parameter which has been derived and written to the HDF file
+        if there are nodes which depend upon it.
+
+        :type param: DerivedParameterNode
+        '''
+        if not self._consumers[param.name]:
+            return
+        if self.store is not None and self._store(param):
+            return
+        self._params[param.name] = derived_param_from_hdf(param)
+
+    def release(self, node_class):
+        '''
+        Evict the dependencies of node_class which are not required by any
+        other node which is yet to be derived.
+
+        :param node_class: Node class which has been derived.
+        :type node_class: Node subclass
+        '''
+        for dep_name in set(node_class.get_dependency_names()):
+            self._consumers[dep_name] -= 1
+            if self._consumers[dep_name] > 0 or dep_name not in self:
+                continue
+            self._params.pop(dep_name, None)
+            if self.store is not None:
+                self.store.remove(dep_name)
+            self.evictions += 1
+
+
+def _get_dependencies(node_class, residency, node_mgr, params):
+    '''
+    Build the ordered list of dependencies for node_class' derive method.
+    Dependencies which are not available are represented by None.
+
+    :param node_class: Node class to build dependencies for.
+    :type node_class: Node subclass
+    :param residency: Source of parameters within the HDF file.
+    :type residency: ParameterResidency
+    :param node_mgr: Used to look up attributes and HDF parameter names.
+    :type node_mgr: NodeManager
+    :param params: Nodes derived so far which are not stored within the HDF.
+    :type params: dict
+    :raises RuntimeError: If none of the dependencies are available.
+    :returns: Dependencies in the order of the derive method's arguments.
+    :rtype: list
+    '''
+    deps = []
+    node_deps = node_class.get_dependency_names()
+    for dep_name in node_deps:
+        if dep_name in params:  # already calculated KPV/KTI/Phase
+            deps.append(params[dep_name])
+        elif node_mgr.get_attribute(dep_name) is not None:
+            deps.append(node_mgr.get_attribute(dep_name))
+        elif dep_name in node_mgr.hdf_keys:
+            # LFL/Derived parameter
+            # all parameters (LFL or other) need get_aligned which is
+            # available on DerivedParameterNode
+            deps.append(residency.get(dep_name))
+        else:  # dependency not available
+            deps.append(None)
+    if all([d is None for d in deps]):
+        raise RuntimeError(
+            "No dependencies available - Nodes cannot "
+            "operate without ANY dependencies available! "
+            "Node: %s" % node_class.__name__)
+    return deps
+
+
+def _derive_node(node, deps, force=False, aligned_cache=None, profile=None):
+    '''
+    Derive a node from its dependencies. Defined at module level so that it
+    can be dispatched to a worker pool.
+
+    Exceptions are returned rather than raised so that the scheduler can
+    raise them with their original traceback.
+
+    :param node: Node instance to derive.
+    :type node: Node
+    :param deps: Dependencies in the order of the derive method's arguments.
+    :type deps: list
+    :param force: Ignore errors raised while deriving the node.
+    :type force: bool
+    :param aligned_cache: Cache of aligned parameters shared between nodes.
+    :type aligned_cache: AlignedParameterCache or None
+    :param profile: Profile which records deriving the node.
+    :type profile: NodeProfile or None
+    :returns: The derived node, the exception raised, if any, as returned by sys.exc_info and the profile which is returned as process workers update a copy.
+    :rtype: (Node, tuple or None, NodeProfile or None)
+    '''
+    with active(profile):
+        try:
+            node = node.get_derived(deps, aligned_cache=aligned_cache)
+        except Exception:
+            if not force:
+                return node, sys.exc_info(), profile
+        record_nbytes(node)
+    return node, None, profile
+
+
+def _derive_node_in_process(*args):
+    '''
+    _derive_node for process workers. Tracebacks cannot be pickled,
+    therefore the traceback of an exception raised is returned formatted.
+
+    :returns: See _derive_node.
+    :rtype: (Node, tuple or None, NodeProfile or None)
+    '''
+    node, exc_info, profile = _derive_node(*args)
+    if exc_info is not None:
+        exc_info = exc_info[:2] + (''.join(traceback.format_exception(
+            *exc_info)),)
+    return node, exc_info, profile
+
+
+def _check_in_flight(in_flight, timeout=None):
+    '''
+    Raise errors of tasks dispatched to a worker pool which will never
+    report back to the scheduler. The pool's callback is only called for
+    tasks which succeed, therefore tasks fail unreported if a node or its
+    dependencies cannot be pickled. Tasks of worker processes which die are
+    never completed.
+
+    :param in_flight: AsyncResult of each dispatched task and the time it was dispatched, keyed by node name.
+    :type in_flight: dict
+    :param timeout: Seconds after which a dispatched task has failed, or None to wait indefinitely.
+    :type timeout: float or None
+    :raises multiprocessing.TimeoutError: If a task has not completed within timeout.
+    '''
+    now = time.time()
+    for name, (result, dispatched) in in_flight.iteritems():
+        if result.ready() and not result.successful():
+            logger.error("Deriving `%s` failed within the worker pool.", name)
+            # Raises the pool's exception.
+            result.get()
+        if timeout is not None and now - dispatched > timeout:
+            raise multiprocessing.TimeoutError(
+                "Deriving `%s` did not complete within %s seconds." %
+                (name, timeout))
+
+
+def _store_node(node, param_name, hdf, node_mgr, params, results, force=False,
+                residency=None):
+    '''
+    Validate a derived node and store it either within the HDF file (derived
+    parameters) or within params and the results dictionaries (all other
+    node types). Each output of a multi-output node is stored as a derived
+    parameter.
+
+    :param node: Derived node.
+    :type node: Node
+    :param param_name: Name of the derived node.
+    :type param_name: str
+    :param hdf: Data file accessor used to save parameters.
+    :type hdf: hdf_file
+    :param node_mgr: Node manager whose hdf_keys are kept up to date.
+    :type node_mgr: NodeManager
+    :param params: Nodes derived so far which are not stored within the HDF.
+    :type params: dict
+    :param results: ktis, kpvs, sections, approaches and flight_attrs
+        dictionaries as returned by derive_parameters.
+    :type results: tuple of dict
+    :param force: Ignore errors raised while deriving nodes.
+    :type force: bool
+    :param residency: Keeps derived parameters in memory for nodes which depend upon them.
+    :type residency: ParameterResidency or None
+    '''
+    ktis, kpvs, sections, approaches, flight_attrs = results
+    duration = hdf.duration
+
+    if isinstance(node, MultiOutputParameterNode):
+        for output in node.get_outputs():
+            # Outputs recorded within the HDF file are not replaced.
+            if output.name in node_mgr.hdf_keys:
+                continue
+            _store_node(output, output.name, hdf, node_mgr, params, results,
+                        force=force, residency=residency)
+        return
+
+    if node.node_type is KeyPointValueNode:
+        params[param_name] = node
+        
+        aligned_kpvs = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KPV '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_kpvs.append(one_hz)
+        kpvs[param_name] = aligned_kpvs
+    elif node.node_type is KeyTimeInstanceNode:
+        params[param_name] = node
+        
+        aligned_ktis = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KTI '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_ktis.append(one_hz)
+        ktis[param_name] = aligned_ktis
+    elif node.node_type is FlightAttributeNode:
+        params[param_name] = node
+        try:
+            # only has one Attribute node, store as a list for consistency
+            flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        except:
+            logger.warning("Flight Attribute Node '%s' returned empty "
+                           "handed.", param_name)
+    elif issubclass(node.node_type, SectionNode):
+        aligned_section = node.get_aligned(P(frequency=1, offset=0))
+        for index, one_hz in enumerate(aligned_section):
+            # SectionNodes allow slice starts and stops being None which
+            # signifies the beginning and end of the data. To avoid
+            # TypeErrors in subsequent derive methods which perform
+            # arithmetic on section slice start and stops, replace with 0
+            # or hdf.duration.
+            fallback = lambda x, y: x if x is not None else y
+
+            duration = fallback(duration, 0)
+
+            start = fallback(one_hz.slice.start, 0)
+            stop = fallback(one_hz.slice.stop, duration)
+            start_edge = fallback(one_hz.start_edge, 0)
+            stop_edge = fallback(one_hz.stop_edge, duration)
+
+            slice_ = slice(start, stop)
+            one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
+            aligned_section[index] = one_hz
+
+            if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
+                raise IndexError(
+                    msg % (one_hz.name, start, stop, duration))
+            if not 0 <= start_edge <= duration:
+                msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start_edge, duration))
+            if not 0 <= stop_edge <= duration + 4:
+                msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, stop_edge, duration))
+            #section_list.append(one_hz)
+        params[param_name] = aligned_section
+        sections[param_name] = list(aligned_section)
+    elif isinstance(node, DerivedParameterNode):
+        if duration:
+            # check that the right number of nodes were returned Allow a
+            # small tolerance. For example if duration in seconds is 2822,
+            # then there will be an array length of  1411 at 0.5Hz and 706
+            # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
+            # parameters then we will have an array length of 1412.
+            expected_length = duration * node.frequency
+            if node.array is None or (force and len(node.array) == 0):
+                logger.warning("No array set; creating a fully masked "
+                               "array for %s", param_name)
+                array_length = expected_length
+                # Where a parameter is wholly masked, we fill the HDF
+                # file with masked zeros to maintain structure.
+                node.array = \
+                    np_ma_masked_zeros(expected_length)
+            else:
+                array_length = len(node.array)
+            length_diff = array_length - expected_length
+            if length_diff == 0:
+                pass
+            elif 0 < length_diff < 5:
+                logger.warning("Cutting excess data for parameter '%s'. "
+                               "Expected length was '%s' while resulting "
+                               "array length was '%s'.", param_name,
+                               expected_length, len(node.array))
+                node.array = node.array[:expected_length]
+            else:
+                raise ValueError("Array length mismatch for parameter "
+                                 "'%s'. Expected '%s', resulting array "
+                                 "length '%s'." % (param_name,
+                                                   expected_length,
+                                                   array_length))
+
+        with timer('write'):
+            hdf.set_param(node)
+        # Keep hdf_keys up to date.
+        node_mgr.hdf_keys.append(param_name)
+        if residency is not None:
+            residency.add(node)
+    elif issubclass(node.node_type, ApproachNode):
+        aligned_approach = node.get_aligned(P(frequency=1, offset=0))
+        for approach in aligned_approach:
+            # Does not allow slice start or stops to be None.
+            valid_turnoff = (not approach.turnoff or
+                             (0 <= approach.turnoff <= duration))
+            valid_slice = ((0 <= approach.slice.start <= duration) and
+                           (0 <= approach.slice.stop <= duration))
+            valid_gs_est = (not approach.gs_est or
+                            ((0 <= approach.gs_est.start <= duration) and
+                             (0 <= approach.gs_est.stop <= duration)))
+            valid_loc_est = (not approach.loc_est or
+                             ((0 <= approach.loc_est.start <= duration) and
+                              (0 <= approach.loc_est.stop <= duration)))
+            if not all([valid_turnoff, valid_slice, valid_gs_est,
+                        valid_loc_est]):
+                raise ValueError('ApproachItem contains index outside of '
+                                 'flight data: %s' % approach)
+        params[param_name] = aligned_approach
+        approaches[param_name] = list(aligned_approach)
+    else:
+        raise NotImplementedError("Unknown Type %s" % node.__class__)
+
+
+def derive_parameters(hdf, node_mgr, process_order, params=None, force=False,
+                      workers=0, worker_type='thread', aligned_cache=None,
+                      profiler=None, store=None):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
 
+    If workers is set, nodes are derived concurrently by a pool of workers
+    as soon as all of their dependencies have been derived. Reading and
+    writing of the HDF file always happens within the calling thread.
+
     :param hdf: Data file accessor used to get and save parameter data and
         attributes
     :type hdf: hdf_file
@@ -103,6 +580,16 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     :param process_order: Parameter / Node class names in the required order to
         be processed
     :type process_order: list of strings
+    :param workers: Number of workers used to derive nodes concurrently. Nodes are derived sequentially if 0 or None.
+    :type workers: int or None
+    :param worker_type: Type of worker pool, either 'thread' or 'process'.
+    :type worker_type: str
+    :param aligned_cache: Cache of dependencies aligned to each node's frequency and offset. Not used by process workers.
+    :type aligned_cache: AlignedParameterCache or None
+    :param profiler: Records the time and memory spent deriving each node.
+    :type profiler: NodeProfiler or None
+    :param store: Store of memory-mapped parameters which dependencies are read from after being read from the HDF file once. Dependencies are kept in memory if None.
+    :type store: ParameterStore or None
     '''
     if not params:
         params = {}
@@ -117,8 +604,11 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     # 'Node Name' : node()  pass in node.get_accessor()
     sections = {}
     flight_attrs = {}
-    duration = hdf.duration
+    results = (ktis, kpvs, sections, approaches, flight_attrs)
 
+    derive_order = []
+    # Multi-output nodes are derived once, for the first of their outputs.
+    multi_output_nodes = set()
     for param_name in process_order:
         if param_name in node_mgr.hdf_keys:
             continue
@@ -143,180 +633,194 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
             #TODO: optimise with only one call to get_attribute
             continue
 
+        node_class = node_mgr.derived_nodes.get(param_name)
+        if node_class is not None and \
+           issubclass(node_class, MultiOutputParameterNode):
+            if node_class in multi_output_nodes:
+                continue
+            multi_output_nodes.add(node_class)
+
+        derive_order.append(param_name)
+
+    residency = ParameterResidency(hdf, derive_order, node_mgr.derived_nodes,
+                                   store=store)
+
+    if workers:
+        _derive_concurrently(hdf, node_mgr, derive_order, params, results,
+                             residency, force=force, workers=workers,
+                             worker_type=worker_type,
+                             aligned_cache=aligned_cache, profiler=profiler)
+        logger.info("Read %d parameters from the HDF file.", residency.reads)
+        return results
+
+    for param_name in derive_order:
         #NB raises KeyError if Node is "unknown"
         node_class = node_mgr.derived_nodes[param_name]
 
-        # build ordered dependencies
-        deps = []
-        node_deps = node_class.get_dependency_names()
-        for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
-                deps.append(params[dep_name])
-            elif node_mgr.get_attribute(dep_name) is not None:
-                deps.append(node_mgr.get_attribute(dep_name))
-            elif dep_name in node_mgr.hdf_keys:
-                # LFL/Derived parameter
-                # all parameters (LFL or other) need get_aligned which is
-                # available on DerivedParameterNode
-                try:
-                    dp = derived_param_from_hdf(hdf.get_param(
-                        dep_name, valid_only=True))
-                except KeyError:
-                    # Parameter is invalid.
-                    dp = None
-                deps.append(dp)
-            else:  # dependency not available
-                deps.append(None)
-        if all([d is None for d in deps]):
-            raise RuntimeError(
-                "No dependencies available - Nodes cannot "
-                "operate without ANY dependencies available! "
-                "Node: %s" % node_class.__name__)
-
         # initialise node
         node = node_class()
-        # shhh, secret accessors for developing nodes in debug mode
-        node._p = params
-        node._h = hdf
-        node._n = node_mgr
-        logger.info("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
-        # Derive the resulting value
-        
-        try:
-            node = node.get_derived(deps)
-        except:
-            if not force:
-                raise
-        
-        del node._p
-        del node._h
-        del node._n
-
-        if node.node_type is KeyPointValueNode:
-            params[param_name] = node
-            
-            aligned_kpvs = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KPV '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_kpvs.append(one_hz)
-            kpvs[param_name] = aligned_kpvs
-        elif node.node_type is KeyTimeInstanceNode:
-            params[param_name] = node
-            
-            aligned_ktis = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KTI '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_ktis.append(one_hz)
-            ktis[param_name] = aligned_ktis
-        elif node.node_type is FlightAttributeNode:
-            params[param_name] = node
+        node_type = get_node_type(node, node_subclasses)
+        if profiler is None:
+            profile = None
+        else:
+            profile = profiler.profile(param_name, node_type)
+
+        with active(profile):
+            # build ordered dependencies
+            deps = _get_dependencies(node_class, residency, node_mgr, params)
+
+            # shhh, secret accessors for developing nodes in debug mode
+            node._p = params
+            node._h = hdf
+            node._n = node_mgr
+            logger.info("Processing %s `%s`", node_type, param_name)
+            # Derive the resulting value
+
             try:
-                # only has one Attribute node, store as a list for consistency
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
+                node = node.get_derived(deps, aligned_cache=aligned_cache)
             except:
-                logger.warning("Flight Attribute Node '%s' returned empty "
-                               "handed.", param_name)
-        elif issubclass(node.node_type, SectionNode):
-            aligned_section = node.get_aligned(P(frequency=1, offset=0))
-            for index, one_hz in enumerate(aligned_section):
-                # SectionNodes allow slice starts and stops being None which
-                # signifies the beginning and end of the data. To avoid
-                # TypeErrors in subsequent derive methods which perform
-                # arithmetic on section slice start and stops, replace with 0
-                # or hdf.duration.
-                fallback = lambda x, y: x if x is not None else y
-
-                duration = fallback(duration, 0)
-
-                start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
-                start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
-
-                slice_ = slice(start, stop)
-                one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
-                aligned_section[index] = one_hz
-
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
-                    msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
-                    raise IndexError(
-                        msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
-                    msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
-                    msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
-                #section_list.append(one_hz)
-            params[param_name] = aligned_section
-            sections[param_name] = list(aligned_section)
-        elif issubclass(node.node_type, DerivedParameterNode):
-            if duration:
-                # check that the right number of nodes were returned Allow a
-                # small tolerance. For example if duration in seconds is 2822,
-                # then there will be an array length of  1411 at 0.5Hz and 706
-                # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
-                # parameters then we will have an array length of 1412.
-                expected_length = duration * node.frequency
-                if node.array is None or (force and len(node.array) == 0):
-                    logger.warning("No array set; creating a fully masked "
-                                   "array for %s", param_name)
-                    array_length = expected_length
-                    # Where a parameter is wholly masked, we fill the HDF
-                    # file with masked zeros to maintain structure.
-                    node.array = \
-                        np_ma_masked_zeros(expected_length)
+                if not force:
+                    raise
+            record_nbytes(node)
+
+            del node._p
+            del node._h
+            del node._n
+
+            _store_node(node, param_name, hdf, node_mgr, params, results,
+                        force=force, residency=residency)
+        residency.release(node_class)
+    logger.info("Read %d parameters from the HDF file.", residency.reads)
+    return results
+
+
+def _derive_concurrently(hdf, node_mgr, derive_order, params, results,
+                         residency, force=False, workers=1, worker_type='thread',
+                         aligned_cache=None, profiler=None):
+    '''
+    Derives nodes concurrently using a pool of workers. A node is
+    dispatched to the pool once all of its dependencies within derive_order
+    have been stored. Nodes which are ready at the same time are dispatched
+    in the order of derive_order.
+
+    Dependencies are read from and derived parameters are written to the HDF
+    file within the calling thread, therefore the HDF file is never accessed
+    concurrently.
+
+    :param derive_order: Names of the nodes to derive in dependency order.
+    :type derive_order: [str]
+    :param residency: Source of parameters within the HDF file.
+    :type residency: ParameterResidency
+    :param workers: Number of workers within the pool.
+    :type workers: int
+    :param worker_type: Type of worker pool, either 'thread' or 'process'.
+    :type worker_type: str
+    :raises ValueError: If worker_type is not recognised.
+    :raises multiprocessing.TimeoutError: If a node is not derived within settings.DERIVE_WORKER_TIMEOUT.
+
+    See derive_parameters for the remaining arguments.
+    '''
+    if worker_type == 'thread':
+        pool = ThreadPool(workers)
+        derive_node = _derive_node
+    elif worker_type == 'process':
+        # Nodes and their dependencies are pickled to and from the worker
+        # processes, therefore the aligned cache cannot be shared.
+        pool = multiprocessing.Pool(workers)
+        derive_node = _derive_node_in_process
+        aligned_cache = None
+    else:
+        raise ValueError("Unknown worker type '%s'." % worker_type)
+
+    node_subclasses = NODE_SUBCLASSES
+    positions = {name: index for index, name in enumerate(derive_order)}
+    # Outputs of multi-output nodes are stored along with the output the
+    # node is derived for.
+    stored_with = {}
+    for name in derive_order:
+        node_class = node_mgr.derived_nodes[name]
+        if issubclass(node_class, MultiOutputParameterNode):
+            for output_name in node_class.names():
+                stored_with.setdefault(output_name, name)
+    # Dependencies which have to be stored before each node can be derived.
+    waiting_on = {}
+    dependents = defaultdict(list)
+    for name in derive_order:
+        deps = set(stored_with.get(d, d) for d in
+                   node_mgr.derived_nodes[name].get_dependency_names())
+        deps.intersection_update(positions)
+        waiting_on[name] = len(deps)
+        for dep_name in deps:
+            dependents[dep_name].append(name)
+
+    ready = [positions[name] for name, count in waiting_on.iteritems()
+             if not count]
+    heapq.heapify(ready)
+    finished = Queue.Queue()
+    # AsyncResult and dispatch time of each node within the pool.
+    in_flight = {}
+    # Limit the number of dispatched nodes to avoid loading the dependencies
+    # of every ready node into memory at once.
+    max_in_flight = workers * 2
+    stored = 0
+    try:
+        while stored < len(derive_order):
+            while ready and len(in_flight) < max_in_flight:
+                param_name = derive_order[heapq.heappop(ready)]
+                node_class = node_mgr.derived_nodes[param_name]
+                node = node_class()
+                node_type = get_node_type(node, node_subclasses)
+                if profiler is None:
+                    profile = None
                 else:
-                    array_length = len(node.array)
-                length_diff = array_length - expected_length
-                if length_diff == 0:
-                    pass
-                elif 0 < length_diff < 5:
-                    logger.warning("Cutting excess data for parameter '%s'. "
-                                   "Expected length was '%s' while resulting "
-                                   "array length was '%s'.", param_name,
-                                   expected_length, len(node.array))
-                    node.array = node.array[:expected_length]
+                    profile = profiler.profile(param_name, node_type)
+                with active(profile):
+                    deps = _get_dependencies(node_class, residency, node_mgr,
+                                             params)
+                logger.info("Processing %s `%s`", node_type, param_name)
+                result = pool.apply_async(
+                    derive_node, (node, deps, force, aligned_cache, profile),
+                    callback=lambda res, name=param_name: finished.put(
+                        (name, res)))
+                in_flight[param_name] = (result, time.time())
+
+            if not in_flight:
+                raise RuntimeError(
+                    "Unable to schedule nodes with unresolved dependencies: "
+                    "%s" % [n for n, c in waiting_on.iteritems() if c])
+
+            while True:
+                try:
+                    param_name, (node, exc_info, profile) = \
+                        finished.get(timeout=0.1)
+                except Queue.Empty:
+                    _check_in_flight(in_flight,
+                                     timeout=settings.DERIVE_WORKER_TIMEOUT)
                 else:
-                    raise ValueError("Array length mismatch for parameter "
-                                     "'%s'. Expected '%s', resulting array "
-                                     "length '%s'." % (param_name,
-                                                       expected_length,
-                                                       array_length))
-
-            hdf.set_param(node)
-            # Keep hdf_keys up to date.
-            node_mgr.hdf_keys.append(param_name)
-        elif issubclass(node.node_type, ApproachNode):
-            aligned_approach = node.get_aligned(P(frequency=1, offset=0))
-            for approach in aligned_approach:
-                # Does not allow slice start or stops to be None.
-                valid_turnoff = (not approach.turnoff or
-                                 (0 <= approach.turnoff <= duration))
-                valid_slice = ((0 <= approach.slice.start <= duration) and
-                               (0 <= approach.slice.stop <= duration))
-                valid_gs_est = (not approach.gs_est or
-                                ((0 <= approach.gs_est.start <= duration) and
-                                 (0 <= approach.gs_est.stop <= duration)))
-                valid_loc_est = (not approach.loc_est or
-                                 ((0 <= approach.loc_est.start <= duration) and
-                                  (0 <= approach.loc_est.stop <= duration)))
-                if not all([valid_turnoff, valid_slice, valid_gs_est,
-                            valid_loc_est]):
-                    raise ValueError('ApproachItem contains index outside of '
-                                     'flight data: %s' % approach)
-            params[param_name] = aligned_approach
-            approaches[param_name] = list(aligned_approach)
-        else:
-            raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
-    return ktis, kpvs, sections, approaches, flight_attrs
+                    break
+            del in_flight[param_name]
+            if exc_info:
+                exc_type, exc_value, exc_traceback = exc_info
+                if isinstance(exc_traceback, basestring):
+                    logger.error("Deriving `%s` failed within a worker "
+                                 "process:\n%s", param_name, exc_traceback)
+                    exc_traceback = None
+                raise exc_type, exc_value, exc_traceback
+            if profile is not None:
+                # Process workers return an updated copy of the profile.
+                profiler.profiles[param_name] = profile
+            with active(profile):
+                _store_node(node, param_name, hdf, node_mgr, params, results,
+                            force=force, residency=residency)
+            residency.release(node_mgr.derived_nodes[param_name])
+            stored += 1
+            for dependent in dependents[param_name]:
+                waiting_on[dependent] -= 1
+                if not waiting_on[dependent]:
+                    heapq.heappush(ready, positions[dependent])
+    finally:
+        pool.terminate()
+        pool.join()
 
 
 def parse_analyser_profiles(analyser_profiles, filter_modules=None):
@@ -352,7 +856,9 @@ def parse_analyser_profiles(analyser_profiles, filter_modules=None):
 def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
                    additional_modules=[], pre_flight_kwargs={}, force=False,
-                   initial={}, reprocess=False):
+                   initial={}, reprocess=False, workers=None,
+                   worker_type=None, derived_nodes=None, incremental=False,
+                   profile=False):
     '''
     Processes the HDF file (segment_info['File']) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -383,6 +889,16 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     :param initial: Initial content for nodes to avoid reprocessing (excluding parameter nodes which are saved to the hdf).
     :type initial: dict
     :param reprocess: Force reprocessing of all Nodes (including derived Nodes already saved to the HDF file).
+    :param workers: Number of workers used to derive independent nodes concurrently. Defaults to settings.DERIVE_WORKERS.
+    :type workers: int or None
+    :param worker_type: Type of worker pool, either 'thread' or 'process'. Defaults to settings.DERIVE_WORKER_TYPE.
+    :type worker_type: str or None
+    :param derived_nodes: Node classes keyed by name as returned by get_derived_nodes, allowing them to be reused across flights. Found within additional_modules and settings.NODE_MODULES if not provided.
+    :type derived_nodes: dict or None
+    :param incremental: Only derive nodes whose fingerprint (see dependency_graph.node_fingerprints) has changed since the HDF file was last processed. Derived parameters which are unchanged are kept within the HDF file and other unchanged nodes are taken from initial, which should contain the previous results for the flight.
+    :type incremental: bool
+    :param profile: Record the time and memory spent deriving each node. The NodeProfiler is returned within the 'profile' key of the results.
+    :type profile: bool
 
     :returns: See below:
     :rtype: Dict
@@ -554,9 +1070,15 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
 
     aircraft_info['Tail Number'] = tail_number
 
-    # go through modules to get derived nodes
-    node_modules = additional_modules + settings.NODE_MODULES
-    derived_nodes = get_derived_nodes(node_modules)
+    if workers is None:
+        workers = settings.DERIVE_WORKERS
+    if worker_type is None:
+        worker_type = settings.DERIVE_WORKER_TYPE
+
+    if derived_nodes is None:
+        # go through modules to get derived nodes
+        node_modules = additional_modules + settings.NODE_MODULES
+        derived_nodes = get_derived_nodes(node_modules)
 
     if requested:
         requested = \
@@ -572,9 +1094,10 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             requested + get_derived_nodes(
                 ['analysis_engine.flight_attribute']).keys()))
     
-    initial = process_flight_to_nodes(initial)
-    for node_name in requested:
-        initial.pop(node_name, None)
+    initial = process_flight_to_nodes(initial, derived_nodes=derived_nodes)
+    if not incremental:
+        for node_name in requested:
+            initial.pop(node_name, None)
 
     # open HDF for reading
     with hdf_file(hdf_path) as hdf:
@@ -586,35 +1109,85 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         else:
             logger.info("No PRE_FLIGHT_ANALYSIS actions to perform")
         # Track nodes.
-        param_names = hdf.valid_lfl_param_names() if reprocess else hdf.valid_param_names()
+        lfl_param_names = hdf.valid_lfl_param_names()
+        if reprocess or incremental:
+            param_names = list(lfl_param_names)
+        else:
+            param_names = hdf.valid_param_names()
         node_mgr = NodeManager(
             segment_info, hdf.duration, param_names,
             requested, required, derived_nodes, aircraft_info,
             achieved_flight_record)
+        fingerprints = node_fingerprints(node_mgr, lfl_param_names)
+        previous_fingerprints = hdf.get_attr('node_fingerprints', {}) or {}
+        if incremental:
+            unchanged = set(name for name, fingerprint in
+                            fingerprints.iteritems()
+                            if previous_fingerprints.get(name) == fingerprint)
+            # Derived parameters stored within the HDF file by a previous
+            # run are reused if unchanged.
+            reused_param_names = unchanged.intersection(
+                hdf.valid_param_names()).difference(lfl_param_names)
+            node_mgr.hdf_keys.extend(reused_param_names)
+            for node_name in initial.keys():
+                if node_name not in unchanged:
+                    initial.pop(node_name)
+            logger.info("Reusing %d unchanged parameters and %d unchanged "
+                        "nodes.", len(reused_param_names), len(initial))
+        # Nodes which will not be derived.
+        available = set(node_mgr.hdf_keys) | set(initial)
+        if settings.ALIGNED_PARAMETER_CACHE_SIZE:
+            aligned_cache = AlignedParameterCache(
+                settings.ALIGNED_PARAMETER_CACHE_SIZE)
+        else:
+            aligned_cache = None
         # calculate dependency tree
-        process_order, gr_st = dependency_order(node_mgr, draw=False)
-        if settings.CACHE_PARAMETER_MIN_USAGE:
-            # find params used more than
-            for node in gr_st.nodes():
-                if node in node_mgr.derived_nodes:
-                    # this includes KPV/KTIs but they'll be ignored by HDF
-                    qty = len(gr_st.predecessors(node))
-                    if qty > settings.CACHE_PARAMETER_MIN_USAGE:
-                        hdf.cache_param_list.append(node)
-            logging.info("HDF set to cache parameters: %s",
-                         hdf.cache_param_list)
-
-        # derive parameters
-        ktis, kpvs, sections, approaches, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force)
+        if settings.DEPENDENCY_ORDER_CACHE_SIZE or \
+           settings.DEPENDENCY_ORDER_CACHE_DIR:
+            process_order, gr_st = cached_dependency_order(node_mgr)
+        else:
+            process_order, gr_st = dependency_order(node_mgr, draw=False)
 
-        # geo locate KTIs
-        ktis = geo_locate(hdf, ktis)
-        ktis = _timestamp(segment_info['Start Datetime'], ktis)
+        profiler = NodeProfiler(gr_st) if profile else None
 
-        # geo locate KPVs
-        kpvs = geo_locate(hdf, kpvs)
-        kpvs = _timestamp(segment_info['Start Datetime'], kpvs)
+        if settings.PARAMETER_STORE_DIR:
+            store = ParameterStore(dir=settings.PARAMETER_STORE_DIR)
+        else:
+            store = None
+        # derive parameters
+        try:
+            ktis, kpvs, sections, approaches, flight_attrs = \
+                derive_parameters(hdf, node_mgr, process_order,
+                                  params=initial, force=force,
+                                  workers=workers, worker_type=worker_type,
+                                  aligned_cache=aligned_cache,
+                                  profiler=profiler, store=store)
+        finally:
+            if store is not None:
+                store.close()
+        if profiler is not None:
+            critical_path, critical_wall = profiler.critical_path()
+            logger.info("Critical path of %.3f seconds: %s", critical_wall,
+                        ' -> '.join(reversed(critical_path)))
+        if aligned_cache is not None:
+            logger.info("Aligned parameter cache: %d hits, %d misses, %d "
+                        "evictions.", aligned_cache.hits,
+                        aligned_cache.misses, aligned_cache.evictions)
+            aligned_cache.clear()
+
+        # geo locate KTIs and KPVs
+        geo_locate(hdf, ktis, kpvs)
+        _timestamp(segment_info['Start Datetime'], ktis, kpvs)
+
+        # Store fingerprints of derived nodes. Nodes which were not derived
+        # keep the fingerprint they were previously derived with.
+        stored_fingerprints = dict(previous_fingerprints)
+        for name in process_order:
+            if name not in fingerprints:
+                continue
+            if name not in available:
+                stored_fingerprints[name] = fingerprints[name]
+        hdf.set_attr('node_fingerprints', stored_fingerprints)
 
         # Store version of FlightDataAnalyser
         hdf.analysis_version = __version__
@@ -624,13 +1197,16 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         hdf.set_attr('aircraft_info', aircraft_info)
         hdf.set_attr('achieved_flight_record', achieved_flight_record)
 
-    return {
+    res = {
         'flight': flight_attrs,
         'kti': ktis,
         'kpv': kpvs,
         'approach': approaches,
         'phases': sections,
     }
+    if profiler is not None:
+        res['profile'] = profiler
+    return res
 
 
 def main():
@@ -665,6 +1241,13 @@ def main():
                         help='Strip the HDF5 file to only the LFL parameters')
     parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
                         help='Verbose logging')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        default=None,
+                        help='Number of workers used to derive nodes '
+                        'concurrently.')
+    parser.add_argument('--worker-type', dest='worker_type',
+                        choices=('thread', 'process'), default=None,
+                        help='Type of worker pool.')
 
     # Aircraft info
     parser.add_argument('-aircraft-family', dest='aircraft_family', type=str,
@@ -712,7 +1295,19 @@ def main():
                         help='Engine type.')
     
     parser.add_argument('-initial', dest='initial', type=str,
-                        help='Path to initial nodes in json format.')
+                        help='Path to initial nodes in json or npz '
+                        'format.')
+    parser.add_argument('--incremental', dest='incremental',
+                        action='store_true',
+                        help='Only derive nodes which have changed since the '
+                        'file was last processed. Unchanged nodes other '
+                        'than parameters are taken from -initial.')
+    parser.add_argument('--profile-json', dest='profile_json', type=str,
+                        help='Path to write the time and memory spent '
+                        'deriving each node to in json format.')
+    parser.add_argument('--profile-folded', dest='profile_folded', type=str,
+                        help='Path to write the time spent deriving each '
+                        'node to as folded stacks for flame graphs.')
     
 
     args = parser.parse_args()
@@ -769,8 +1364,11 @@ def main():
     
     if args.initial:
         if not os.path.exists(args.initial):
-            parser.error('Path for initial json data not found: %s' % args.initial)
-        initial = json_to_process_flight(open(args.initial, 'rb').read())
+            parser.error('Path for initial data not found: %s' % args.initial)
+        if args.initial.endswith('.npz'):
+            initial = npz_to_process_flight(args.initial)
+        else:
+            initial = json_to_process_flight(open(args.initial, 'rb').read())
     else:
         initial = {}
 
@@ -783,7 +1381,19 @@ def main():
         requested=args.requested, required=args.required,
         additional_modules=['flightdataprofiles.fcp.kpvs'],
         initial=initial,
+        workers=args.workers,
+        worker_type=args.worker_type,
+        incremental=args.incremental,
+        profile=bool(args.profile_json or args.profile_folded),
     )
+    profiler = res.pop('profile', None)
+    if args.profile_json:
+        profiler.to_json(args.profile_json)
+        logger.info("Node profile written to json: %s", args.profile_json)
+    if args.profile_folded:
+        profiler.to_folded(args.profile_folded)
+        logger.info("Node profile written as folded stacks: %s",
+                    args.profile_folded)
     # Flatten results.
     res = {k: list(itertools.chain.from_iterable(v.itervalues()))
            for k, v in res.iteritems()}
@@ -0,0 +1,271 @@
+'''
+Opt-in profiling of the time and memory spent deriving each node.
+
+Timers within node alignment and HDF file access add to the NodeProfile
+which is active within the current thread, and do nothing while no profile
+is active.
+'''
+import simplejson
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+_local = threading.local()
+
+
+def max_rss():
+    '''
+    :returns: Peak resident memory of the process in bytes or 0 if unknown.
+    :rtype: int
+    '''
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class NodeProfile(object):
+    '''
+    Time in seconds and memory in bytes spent deriving a single node.
+
+    wall and cpu include all other timings. CPU time is of the whole process
+    so includes other threads when nodes are derived concurrently. Python 2
+    cannot trace allocations, so memory is recorded as the size of the
+    arrays created by the node (nbytes) and how much the node raised the
+    peak memory of the process (peak_memory).
+    '''
+    TIMINGS = ('align', 'read', 'write')
+
+    def __init__(self, name, node_type):
+        self.name = name
+        self.node_type = node_type
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.align = 0.0
+        self.read = 0.0
+        self.write = 0.0
+        self.nbytes = 0
+        self.peak_memory = 0
+
+    def __repr__(self):
+        return '%s(%r, wall=%.4f)' % (self.__class__.__name__, self.name,
+                                      self.wall)
+
+    def to_dict(self):
+        '''
+        :rtype: dict
+        '''
+        return OrderedDict([
+            ('name', self.name),
+            ('node_type', self.node_type),
+            ('wall', self.wall),
+            ('cpu', self.cpu),
+            ('align', self.align),
+            ('read', self.read),
+            ('write', self.write),
+            ('nbytes', self.nbytes),
+            ('peak_memory', self.peak_memory),
+        ])
+
+
+@contextmanager
+def active(profile):
+    '''
+    Activate profile within the current thread while recording the wall
+    time, CPU time and growth of peak memory of the block.
+
+    :param profile: Profile to activate. Nothing is recorded if None.
+    :type profile: NodeProfile or None
+    '''
+    if profile is None:
+        yield
+        return
+    previous = getattr(_local, 'profile', None)
+    _local.profile = profile
+    start_rss = max_rss()
+    wall = time.time()
+    cpu = time.clock()
+    try:
+        yield
+    finally:
+        profile.wall += time.time() - wall
+        profile.cpu += time.clock() - cpu
+        profile.peak_memory += max_rss() - start_rss
+        _local.profile = previous
+
+
+@contextmanager
+def timer(timing):
+    '''
+    Add the duration of the block to a timing of the profile active within
+    the current thread, if any.
+
+    :param timing: One of NodeProfile.TIMINGS.
+    :type timing: str
+    '''
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        setattr(profile, timing,
+                getattr(profile, timing) + time.time() - start)
+
+
+def record_nbytes(node):
+    '''
+    Record the size of a derived node's array within the active profile.
+
+    :type node: Node
+    '''
+    profile = getattr(_local, 'profile', None)
+    array = getattr(node, 'array', None)
+    if profile is None or array is None:
+        return
+    profile.nbytes += array.nbytes
+    mask = getattr(array, 'mask', None)
+    if mask is not None and mask.shape:
+        profile.nbytes += mask.nbytes
+
+
+class NodeProfiler(object):
+    '''
+    Collects a NodeProfile for every node derived within a flight.
+    '''
+    def __init__(self, graph=None):
+        '''
+        :param graph: Spanning tree of active nodes as returned by dependency_order, used to find the critical path.
+        :type graph: nx.DiGraph or None
+        '''
+        self.profiles = OrderedDict()
+        self.graph = graph
+
+    def __getitem__(self, name):
+        return self.profiles[name]
+
+    def __iter__(self):
+        return iter(self.profiles.values())
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def profile(self, name, node_type):
+        '''
+        Create the profile of a node.
+
+        :param name: Name of the node.
+        :type name: str
+        :param node_type: Name of the type of node, e.g. 'KeyPointValueNode'.
+        :type node_type: str
+        :rtype: NodeProfile
+        '''
+        profile = self.profiles[name] = NodeProfile(name, node_type)
+        return profile
+
+    def critical_path(self, graph=None):
+        '''
+        Find the chain of dependencies with the greatest total wall time,
+        which bounds how quickly a flight can be processed however many
+        workers derive nodes concurrently.
+
+        :param graph: Dependency graph with edges from each node to its dependencies. Defaults to the graph the profiler was created with.
+        :type graph: nx.DiGraph or None
+        :returns: Names of nodes within the critical path starting with the node which depends upon the others and its total wall time.
+        :rtype: ([str], float)
+        '''
+        # import locally to avoid importing networkx with node.py
+        import networkx as nx
+        graph = self.graph if graph is None else graph
+        if graph is None:
+            raise ValueError('A dependency graph is required to find the '
+                             'critical path.')
+        costs = {}
+        following = {}
+        # Dependencies are visited before the nodes which depend upon them.
+        for name in reversed(nx.topological_sort(graph)):
+            best = None
+            for dep_name in graph.successors(name):
+                if best is None or costs[dep_name] > costs[best]:
+                    best = dep_name
+            profile = self.profiles.get(name)
+            costs[name] = (profile.wall if profile else 0.0) + \
+                (costs[best] if best is not None else 0.0)
+            following[name] = best
+        if not costs:
+            return [], 0.0
+        name = max(costs, key=costs.get)
+        total = costs[name]
+        path = []
+        while name is not None:
+            if name != 'root':
+                path.append(name)
+            name = following[name]
+        return path, total
+
+    def to_dict(self):
+        '''
+        :returns: Profiles of each node in the order derived along with the critical path if a graph is available.
+        :rtype: dict
+        '''
+        result = OrderedDict([
+            ('nodes', [p.to_dict() for p in self.profiles.itervalues()]),
+        ])
+        if self.graph is not None:
+            path, total = self.critical_path()
+            result['critical_path'] = OrderedDict([('nodes', path),
+                                                   ('wall', total)])
+        return result
+
+    def to_json(self, path=None):
+        '''
+        :param path: Path of file to write to.
+        :type path: str or None
+        :returns: JSON representation of to_dict if path is None.
+        :rtype: str or None
+        '''
+        json = simplejson.dumps(self.to_dict(), indent=2)
+        if path is None:
+            return json
+        with open(path, 'w') as fh:
+            fh.write(json)
+
+    def to_folded(self, path=None):
+        '''
+        Folded stacks compatible with flamegraph.pl and speedscope where
+        each stack is the node type, node name and part of deriving the node
+        weighted by microseconds.
+
+        :param path: Path of file to write to.
+        :type path: str or None
+        :returns: Folded stacks if path is None.
+        :rtype: str or None
+        '''
+        lines = []
+        for profile in self.profiles.itervalues():
+            timings = [(t, getattr(profile, t)) for t in NodeProfile.TIMINGS]
+            # Time not spent aligning, reading or writing.
+            timings.append(
+                ('derive', profile.wall - sum(v for t, v in timings)))
+            for timing, value in timings:
+                micros = int(round(value * 1e6))
+                if micros > 0:
+                    lines.append('%s;%s;%s %d' % (
+                        profile.node_type, profile.name.replace(';', ','),
+                        timing, micros))
+        folded = '\n'.join(lines) + '\n' if lines else ''
+        if path is None:
+            return folded
+        with open(path, 'w') as fh:
+            fh.write(folded)
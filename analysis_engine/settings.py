@@ -57,8 +57,57 @@ WORKING_DIR = os.path.expanduser('~')
 # Note: This is the system-wide default location on Ubuntu.
 CA_CERTIFICATE_FILE = '/etc/ssl/certs/ca-certificates.crt'
 
-# Cache parameters which are used more than n times in HDF
-CACHE_PARAMETER_MIN_USAGE = 0
+# Maximum size in bytes of the parameters aligned to another frequency or
+# offset which are cached while processing a flight. Disabled if 0.
+ALIGNED_PARAMETER_CACHE_SIZE = 256 * 1024 * 1024
+
+# Number of dependency orders, keyed by the available parameters, requested
+# and required nodes, node modules and attribute values, which are kept in
+# memory and reused by flights with the same key. Disabled if 0.
+DEPENDENCY_ORDER_CACHE_SIZE = 64
+
+# Directory where dependency orders are stored to be reused across
+# processes. Not stored on disk if None.
+DEPENDENCY_ORDER_CACHE_DIR = None
+
+# Directory where the registry of node classes within NODE_MODULES and
+# their dependencies is stored to be reused across processes until a node
+# module changes. Not stored on disk if None.
+NODE_REGISTRY_CACHE_DIR = None
+
+# Modules shared by all nodes whose source is included within every node's
+# fingerprint. Changing them causes all nodes to be derived again when
+# processing incrementally.
+NODE_FINGERPRINT_MODULES = ('analysis_engine.library', 'analysis_engine.node',
+                            'analysis_engine.settings')
+
+# Directory within which parameters read while processing a flight are
+# stored uncompressed and memory-mapped by the nodes which depend upon them,
+# so that nodes only read the parts of arrays they access. Parameters are
+# kept in memory if None.
+PARAMETER_STORE_DIR = None
+
+# Number of workers used to derive nodes concurrently once their
+# dependencies are available. Nodes are derived sequentially if 0.
+DERIVE_WORKERS = 0
+
+# Type of worker pool used when DERIVE_WORKERS is set, either 'thread' or
+# 'process'. Process workers avoid contention for the GIL at the cost of
+# pickling each node's dependencies and results.
+DERIVE_WORKER_TYPE = 'thread'
+
+# Seconds after which a node dispatched to a worker pool which has not been
+# derived fails processing of the flight, e.g. if its worker process was
+# killed. Waits indefinitely if None.
+DERIVE_WORKER_TIMEOUT = 3600
+
+# Number of worker processes used by process_batch.process_flights. The
+# number of CPUs is used if None.
+BATCH_PROCESSES = None
+
+# Number of flights processed by each batch worker process before it is
+# replaced to release memory. Workers live for the whole batch if None.
+BATCH_MAX_FLIGHTS_PER_WORKER = None
 
 
 ##############################################################################
@@ -80,6 +129,11 @@ MINIMUM_SPLIT_PARAM_VALUE = 0.175
 # when the aircraft is not considered to be turning.
 HEADING_RATE_SPLITTING_THRESHOLD = 0.1
 
+# Duration in seconds of the windows in which parameters are read when
+# splitting in streaming mode. Only a window of each parameter is held in
+# memory at once.
+SPLIT_WINDOW = 3600
+
 # Parameter names to be normalised for splitting flights.
 SPLIT_PARAMETERS = ('Eng (1) N1', 'Eng (2) N1', 'Eng (3) N1', 'Eng (4) N1',
                     'Eng (1) N2', 'Eng (2) N2', 'Eng (3) N2', 'Eng (4) N2',
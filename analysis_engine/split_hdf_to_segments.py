@@ -8,7 +8,8 @@ import numpy as np
 
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from math import floor
+from hashlib import sha256
+from math import ceil, floor
 
 from analysis_engine import hooks, settings
 from analysis_engine.datastructures import Segment
@@ -114,7 +115,30 @@ def _segment_type_and_slice(airspeed_array, airspeed_frequency, heading_array,
 
     heading_change = hdiff > settings.HEADING_CHANGE_TAXI_THRESHOLD
 
-    if not heading_change or (not fast_for_long and eng_arrays is None):
+    return _segment_type(start, stop, slow_start, slow_stop, fast_for_long,
+                         heading_change, eng_arrays is not None)
+
+
+def _segment_type(start, stop, slow_start, slow_stop, fast_for_long,
+                  heading_change, eng_available):
+    """
+    Determine the segment type from a summary of its Airspeed and Heading.
+    See _segment_type_and_slice for a description of each type.
+
+    :param slow_start: Whether the first unmasked Airspeed sample was below AIRSPEED_THRESHOLD or None if Airspeed is entirely masked.
+    :type slow_start: bool or None
+    :param slow_stop: Whether the last unmasked Airspeed sample was below AIRSPEED_THRESHOLD or None if Airspeed is entirely masked.
+    :type slow_stop: bool or None
+    :param fast_for_long: Whether Airspeed was above AIRSPEED_THRESHOLD for longer than AIRSPEED_THRESHOLD_TIME.
+    :type fast_for_long: bool or None
+    :param heading_change: Whether the Heading changed by more than HEADING_CHANGE_TAXI_THRESHOLD.
+    :type heading_change: bool
+    :param eng_available: Whether engine parameters were available.
+    :type eng_available: bool
+    :returns: Segment type and slice.
+    :rtype: (str, slice)
+    """
+    if not heading_change or (not fast_for_long and not eng_available):
         # added check for not fast for long and no engine params to avoid
         # lots of Herc ground runs
         logger.debug("Heading did not change, aircraft did not move.")
@@ -294,7 +318,7 @@ def _split_on_dfc(slice_start_secs, slice_stop_secs, dfc_frequency,
     if unmasked_edges is None:
         return None
     unmasked_edges /= dfc_frequency
-    if eng_split_index:
+    if eng_split_index is not None:
         # Split on the jump closest to the engine parameter minimums.
         dfc_jump = unmasked_edges[np.ma.argmin(np.ma.abs(
             (eng_split_index - slice_start_secs) - unmasked_edges))]
@@ -344,6 +368,136 @@ def _split_on_rot(slice_start_secs, slice_stop_secs, heading_frequency,
     return split_index
 
 
+def _get_heading(hdf):
+    '''
+    Get Heading from hdf, falling back to Heading True.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :raises KeyError: If neither Heading nor Heading True are available.
+    :rtype: Parameter
+    '''
+    try:
+        # Fetch Heading if available
+        return hdf.get_param('Heading', valid_only=True)
+    except KeyError:
+        # try Heading True, otherwise fail loudly with a KeyError
+        return hdf.get_param('Heading True', valid_only=True)
+
+
+def _dfc_diff(dfc):
+    '''
+    Create the diff of 'Frame Counter' with regular increments masked.
+
+    :param dfc: 'Frame Counter' parameter.
+    :type dfc: Parameter
+    :returns: Diff of 'Frame Counter' where only jumps are unmasked along with
+        the gap between difference values.
+    :rtype: (np.ma.MaskedArray, float)
+    '''
+    dfc_diff = np.ma.diff(dfc.array)
+    # Mask 'Frame Counter' incrementing by 1.
+    dfc_diff = np.ma.masked_equal(dfc_diff, 1)
+    # Mask 'Frame Counter' overflow where the Frame Counter transitions
+    # from 4095 to 0.
+    # Q: This used to be 4094, are there some Frame Counters which
+    # increment from 1 rather than 0 or something else?
+    dfc_diff = np.ma.masked_equal(dfc_diff, -4095)
+    # Gap between difference values.
+    dfc_half_period = (1 / dfc.frequency) / 2
+    return dfc_diff, dfc_half_period
+
+
+def _split_slow_slice(slice_start_secs, slice_stop_secs, slow_slice,
+                      split_params_min, split_params_frequency, dfc,
+                      dfc_half_period, dfc_diff, heading_frequency,
+                      rate_of_turn, offset=0):
+    '''
+    Find where to split within a slow slice using 'Frame Counter' jumps,
+    the minimum of engine parameters and then rate of turn.
+
+    :param slice_start_secs: Start of slow slice in seconds.
+    :type slice_start_secs: int or float
+    :param slice_stop_secs: Stop of slow slice in seconds.
+    :type slice_stop_secs: int or float
+    :param slow_slice: Slow slice used within log messages.
+    :type slow_slice: slice
+    :param offset: Time in seconds of the first sample of the arrays, if they only cover part of the data.
+    :type offset: int
+    :returns: Split index in seconds or None if the splitting methods failed.
+    :rtype: int or float or None
+    '''
+    local_start_secs = slice_start_secs - offset
+    local_stop_secs = slice_stop_secs - offset
+
+    # Find split based on minimum of engine parameters.
+    if split_params_min is not None:
+        eng_split_index, eng_split_value = _split_on_eng_params(
+            local_start_secs, local_stop_secs, split_params_min,
+            split_params_frequency)
+        if eng_split_index is not None:
+            eng_split_index += offset
+    else:
+        eng_split_index, eng_split_value = None, None
+
+    # Split using 'Frame Counter'.
+    if dfc is not None:
+        dfc_split_index = _split_on_dfc(
+            local_start_secs, local_stop_secs, dfc.frequency,
+            dfc_half_period, dfc_diff,
+            eng_split_index=None if eng_split_index is None
+            else eng_split_index - offset)
+        if dfc_split_index is not None:
+            dfc_split_index += offset
+        if dfc_split_index:
+            logger.info("'Frame Counter' jumped within slow_slice '%s' "
+                        "at index '%d'.", slow_slice, dfc_split_index)
+            return dfc_split_index
+        else:
+            logger.info("'Frame Counter' did not jump within slow_slice "
+                        "'%s'.", slow_slice)
+
+    # Split using minimum of engine parameters.
+    if eng_split_value is not None and \
+       eng_split_value < settings.MINIMUM_SPLIT_PARAM_VALUE:
+        logger.info("Minimum of normalised split parameters ('%s') was "
+                    "below MINIMUM_SPLIT_PARAM_VALUE ('%s') within "
+                    "slow_slice '%s' at index '%d'.",
+                    eng_split_value, settings.MINIMUM_SPLIT_PARAM_VALUE,
+                    slow_slice, eng_split_index)
+        return eng_split_index
+    else:
+        logger.info("Minimum of normalised split parameters ('%s') was "
+                    "not below MINIMUM_SPLIT_PARAM_VALUE ('%s') within "
+                    "slow_slice '%s' at index '%s'.",
+                    eng_split_value, settings.MINIMUM_SPLIT_PARAM_VALUE,
+                    slow_slice, eng_split_index)
+
+    # Split using rate of turn. Q: Should this be considered in other
+    # splitting methods.
+    if rate_of_turn is None:
+        return None
+
+    rot_split_index = _split_on_rot(local_start_secs, local_stop_secs,
+                                    heading_frequency, rate_of_turn)
+    if rot_split_index is not None:
+        rot_split_index += offset
+    if rot_split_index:
+        logger.info("Splitting at index '%s' where rate of turn was below "
+                    "'%s'.", rot_split_index,
+                    settings.HEADING_RATE_SPLITTING_THRESHOLD)
+        return rot_split_index
+    else:
+        logger.info(
+            "Aircraft did not stop turning during slow_slice "
+            "('%s'). Therefore a split will not be made.", slow_slice)
+
+    #Q: Raise error here?
+    logger.warning("Splitting methods failed to split within slow_slice "
+                   "'%s'.", slow_slice)
+    return None
+
+
 def split_segments(hdf):
     '''
     TODO: DJ suggested not to use decaying engine oil temperature.
@@ -360,13 +514,7 @@ def split_segments(hdf):
     '''
     airspeed = hdf['Airspeed']
 
-    # Look for heading first
-    try:
-        # Fetch Heading if available
-        heading = hdf.get_param('Heading', valid_only=True)
-    except KeyError:
-        # try Heading True, otherwise fail loudly with a KeyError
-        heading = hdf.get_param('Heading True', valid_only=True)
+    heading = _get_heading(hdf)
 
     eng_arrays, _ = _get_eng_params(hdf, align_param=heading)
 
@@ -408,20 +556,11 @@ def split_segments(hdf):
 
     if hdf.reliable_frame_counter:
         dfc = hdf['Frame Counter']
-        dfc_diff = np.ma.diff(dfc.array)
-        # Mask 'Frame Counter' incrementing by 1.
-        dfc_diff = np.ma.masked_equal(dfc_diff, 1)
-        # Mask 'Frame Counter' overflow where the Frame Counter transitions
-        # from 4095 to 0.
-        # Q: This used to be 4094, are there some Frame Counters which
-        # increment from 1 rather than 0 or something else?
-        dfc_diff = np.ma.masked_equal(dfc_diff, -4095)
-        # Gap between difference values.
-        dfc_half_period = (1 / dfc.frequency) / 2
+        dfc_diff, dfc_half_period = _dfc_diff(dfc)
     else:
         logger.info("'Frame Counter' will not be used for splitting since "
                     "'reliable_frame_counter' is False.")
-        dfc = None
+        dfc = dfc_diff = dfc_half_period = None
 
     segments = []
     start = 0
@@ -458,75 +597,15 @@ def split_segments(hdf):
 
         last_fast_index = slow_slice.stop
 
-        # Find split based on minimum of engine parameters.
-        if split_params_min is not None:
-            eng_split_index, eng_split_value = _split_on_eng_params(
-                slice_start_secs, slice_stop_secs, split_params_min,
-                split_params_frequency)
-        else:
-            eng_split_index, eng_split_value = None, None
-
-        # Split using 'Frame Counter'.
-        if dfc is not None:
-            dfc_split_index = _split_on_dfc(
-                slice_start_secs, slice_stop_secs, dfc.frequency,
-                dfc_half_period, dfc_diff, eng_split_index=eng_split_index)
-            if dfc_split_index:
-                segments.append(_segment_type_and_slice(
-                    airspeed_array, airspeed.frequency, heading.array,
-                    heading.frequency, start, dfc_split_index, eng_arrays))
-                start = dfc_split_index
-                logger.info("'Frame Counter' jumped within slow_slice '%s' "
-                            "at index '%d'.", slow_slice, dfc_split_index)
-                continue
-            else:
-                logger.info("'Frame Counter' did not jump within slow_slice "
-                            "'%s'.", slow_slice)
-
-        # Split using minimum of engine parameters.
-        if eng_split_value is not None and \
-           eng_split_value < settings.MINIMUM_SPLIT_PARAM_VALUE:
-            logger.info("Minimum of normalised split parameters ('%s') was "
-                        "below MINIMUM_SPLIT_PARAM_VALUE ('%s') within "
-                        "slow_slice '%s' at index '%d'.",
-                        eng_split_value, settings.MINIMUM_SPLIT_PARAM_VALUE,
-                        slow_slice, eng_split_index)
-            segments.append(_segment_type_and_slice(
-                airspeed_array, airspeed.frequency, heading.array,
-                heading.frequency, start, eng_split_index, eng_arrays))
-            start = eng_split_index
-            continue
-        else:
-            logger.info("Minimum of normalised split parameters ('%s') was "
-                        "not below MINIMUM_SPLIT_PARAM_VALUE ('%s') within "
-                        "slow_slice '%s' at index '%s'.",
-                        eng_split_value, settings.MINIMUM_SPLIT_PARAM_VALUE,
-                        slow_slice, eng_split_index)
-
-        # Split using rate of turn. Q: Should this be considered in other
-        # splitting methods.
-        if rate_of_turn is None:
-            continue
-
-        rot_split_index = _split_on_rot(slice_start_secs, slice_stop_secs,
-                                        heading.frequency, rate_of_turn)
-        if rot_split_index:
+        split_index = _split_slow_slice(
+            slice_start_secs, slice_stop_secs, slow_slice, split_params_min,
+            split_params_frequency, dfc, dfc_half_period, dfc_diff,
+            heading.frequency, rate_of_turn)
+        if split_index is not None:
             segments.append(_segment_type_and_slice(
                 airspeed_array, airspeed.frequency, heading.array,
-                heading.frequency, start, rot_split_index, eng_arrays))
-            start = rot_split_index
-            logger.info("Splitting at index '%s' where rate of turn was below "
-                        "'%s'.", rot_split_index,
-                        settings.HEADING_RATE_SPLITTING_THRESHOLD)
-            continue
-        else:
-            logger.info(
-                "Aircraft did not stop turning during slow_slice "
-                "('%s'). Therefore a split will not be made.", slow_slice)
-
-        #Q: Raise error here?
-        logger.warning("Splitting methods failed to split within slow_slice "
-                       "'%s'.", slow_slice)
+                heading.frequency, start, split_index, eng_arrays))
+            start = split_index
 
     # Add remaining data to a segment.
     segments.append(_segment_type_and_slice(
@@ -535,6 +614,346 @@ def split_segments(hdf):
     return segments
 
 
+class _HDFWindow(object):
+    '''
+    Provides parameters within a window of an hdf_file so that the splitting
+    helpers which accept an hdf_file only load the window into memory.
+    '''
+    def __init__(self, hdf, start_secs, stop_secs):
+        self.hdf = hdf
+        self.slice = slice(start_secs, stop_secs)
+
+    def __getitem__(self, name):
+        return self.get_param(name)
+
+    def get_param(self, name, valid_only=False):
+        return self.hdf.get_param(name, valid_only=valid_only,
+                                  _slice=self.slice)
+
+
+class _AirspeedHash(object):
+    '''
+    Creates the same hash as hash_array(array, runs_of_ones(array > threshold),
+    min_samples) when given consecutive parts of the array.
+    '''
+    def __init__(self, threshold, min_samples):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.checksum = sha256()
+        # Parts of the current run above the threshold which have not been
+        # hashed since the run is not yet min_samples long.
+        self.run = []
+        self.run_length = 0
+
+    def update(self, array):
+        above = array > self.threshold
+        bounds = np.concatenate(
+            ([0], np.flatnonzero(np.diff(above)) + 1, [len(array)]))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if not above[start]:
+                self.run = []
+                self.run_length = 0
+                continue
+            self.run.append(array[start:stop])
+            self.run_length += stop - start
+            if self.run_length >= self.min_samples:
+                for part in self.run:
+                    self.checksum.update(part.tostring())
+                self.run = []
+
+    def hexdigest(self):
+        return self.checksum.hexdigest()
+
+
+def _iter_slow_slices(hdf, window):
+    '''
+    Scan Airspeed in windows for slices below AIRSPEED_THRESHOLD without
+    loading the entire parameter. As within split_segments, masked Airspeed
+    is only fast if the unmasked samples either side are above the threshold.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :param window: Duration of each window in seconds.
+    :type window: int
+    :returns: Yields the start and stop of each slow slice in seconds and
+        whether it continues until the end of the data.
+    :rtype: generator of (float, float, bool)
+    '''
+    threshold = settings.AIRSPEED_THRESHOLD
+    frequency = None
+    # Number of samples before the current window which have been resolved
+    # as slow or fast and the start of the current slow slice (None if fast).
+    position = 0
+    slow_start = 0
+    # Whether the last unmasked sample was fast and the number of masked
+    # samples after it which depend upon the next unmasked sample.
+    last_fast = False
+    pending = 0
+
+    for window_start in xrange(0, int(ceil(hdf.duration)), window):
+        airspeed = hdf.get_param(
+            'Airspeed', _slice=slice(window_start, window_start + window))
+        frequency = airspeed.frequency
+        mask = np.ma.getmaskarray(airspeed.array)
+        fast = airspeed.array.data > threshold
+        unmasked = np.flatnonzero(~mask)
+        if not len(unmasked):
+            pending += len(mask)
+            continue
+        last = unmasked[-1]
+        indices = np.arange(last + 1)
+        mask = mask[:last + 1]
+        previous = np.maximum.accumulate(np.where(mask, -1, indices))
+        following = np.minimum.accumulate(
+            np.where(mask, last, indices)[::-1])[::-1]
+        previous_fast = np.where(previous >= 0, fast[previous], last_fast)
+        resolved = np.where(mask, previous_fast & fast[following],
+                            fast[:last + 1])
+
+        run_starts = np.concatenate(
+            ([0], np.flatnonzero(np.diff(resolved)) + 1))
+        run_fast = resolved[run_starts].tolist()
+        run_starts = (run_starts + position + pending).tolist()
+        if pending:
+            run_starts.insert(0, position)
+            run_fast.insert(0, last_fast and fast[unmasked[0]])
+        for run_start, is_fast in zip(run_starts, run_fast):
+            if is_fast and slow_start is not None:
+                if run_start > slow_start:
+                    yield (slow_start / frequency, run_start / frequency,
+                           False)
+                slow_start = None
+            elif not is_fast and slow_start is None:
+                slow_start = run_start
+
+        position += pending + last + 1
+        pending = len(airspeed.array) - last - 1
+        last_fast = fast[last]
+
+    # Masked samples at the end of the data are slow.
+    if pending and slow_start is None:
+        slow_start = position
+    position += pending
+    if slow_start is not None and frequency:
+        yield slow_start / frequency, position / frequency, True
+
+
+def _split_slow_slice_window(hdf, slice_start_secs, slice_stop_secs,
+                             reliable_frame_counter):
+    '''
+    Find where to split within a slow slice, loading parameters only within
+    the slow slice.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :param slice_start_secs: Start of slow slice in seconds.
+    :type slice_start_secs: int or float
+    :param slice_stop_secs: Stop of slow slice in seconds.
+    :type slice_stop_secs: int or float
+    :param reliable_frame_counter: Whether to split using 'Frame Counter'.
+    :type reliable_frame_counter: bool
+    :returns: Split index in seconds or None if the splitting methods failed.
+    :rtype: int or float or None
+    '''
+    offset = int(floor(slice_start_secs))
+    # 'Frame Counter' jumps are found from its diff and require the sample
+    # following the slow slice.
+    window = _HDFWindow(hdf, offset, int(ceil(slice_stop_secs)) + 1)
+
+    heading = _get_heading(window)
+    rate_of_turn = _rate_of_turn(heading)
+
+    split_params_min, split_params_frequency \
+        = _get_normalised_split_params(window)
+
+    if reliable_frame_counter:
+        dfc = window['Frame Counter']
+        dfc_diff, dfc_half_period = _dfc_diff(dfc)
+    else:
+        dfc = dfc_diff = dfc_half_period = None
+
+    return _split_slow_slice(
+        slice_start_secs, slice_stop_secs,
+        slice(slice_start_secs, slice_stop_secs), split_params_min,
+        split_params_frequency, dfc, dfc_half_period, dfc_diff,
+        heading.frequency, rate_of_turn, offset=offset)
+
+
+def _scan_segment(hdf, start, stop, boundary, window):
+    '''
+    Determine the type of a segment along with the go fast index and hash of
+    its Airspeed in a single pass over windows of the segment.
+
+    The go fast index and hash are created from Airspeed within the segment
+    padded to boundary, as written by write_segment, so that they match those
+    created by append_segment_info from the segment file.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :param start: Start of the segment in seconds.
+    :type start: int or float
+    :param stop: Stop of the segment in seconds.
+    :type stop: int or float
+    :param boundary: Boundary in seconds which the segment is padded to.
+    :type boundary: int
+    :param window: Duration of each window in seconds.
+    :type window: int
+    :returns: Segment type, slice, go fast index in seconds from the start of
+        the written segment and Airspeed hash. The go fast index and hash are
+        None if the segment did not go fast.
+    :rtype: (str, slice, float or None, str or None)
+    '''
+    threshold = settings.AIRSPEED_THRESHOLD
+    padded_start = int(start) // boundary * boundary
+    padded_stop = min(int(ceil(stop / float(boundary))) * boundary,
+                      int(ceil(hdf.duration)))
+
+    airspeed_hash = _AirspeedHash(threshold,
+                                  settings.AIRSPEED_HASH_MIN_SAMPLES)
+    go_fast_index = None
+    position = 0
+    first_airspeed = last_airspeed = None
+    threshold_exceedance = 0
+    hdiff = 0
+    last_heading = None
+    eng_available = False
+
+    for window_start in xrange(padded_start, padded_stop, window):
+        window_stop = min(window_start + window, padded_stop)
+        airspeed = hdf.get_param('Airspeed',
+                                 _slice=slice(window_start, window_stop))
+        frequency = airspeed.frequency
+        array = airspeed.array
+
+        if go_fast_index is None:
+            fast = np.flatnonzero(np.ma.filled(array > threshold, False))
+            if len(fast):
+                go_fast_index = (position + fast[0]) / frequency
+        airspeed_hash.update(array.data)
+        position += len(array)
+
+        # Samples within the padding do not contribute to the segment type.
+        segment_start = max(start, window_start)
+        segment_stop = min(stop, window_stop)
+        if segment_start >= segment_stop:
+            continue
+        array = repair_mask(
+            array[int((segment_start - window_start) * frequency):
+                  int((segment_stop - window_start) * frequency)],
+            repair_duration=None, copy=True, repair_above=threshold,
+            raise_entirely_masked=False)
+        unmasked = np.flatnonzero(~np.ma.getmaskarray(array))
+        if len(unmasked):
+            if first_airspeed is None:
+                first_airspeed = array[unmasked[0]]
+            last_airspeed = array[unmasked[-1]]
+            threshold_exceedance += \
+                np.ma.sum(array > threshold) / frequency
+
+        segment_window = _HDFWindow(hdf, segment_start, segment_stop)
+        heading = _get_heading(segment_window)
+        eng_array, _ = _get_eng_params(segment_window, align_param=heading)
+        heading_array = heading.array
+        if eng_array is not None:
+            eng_available = True
+            heading_array = np.ma.masked_where(
+                eng_array < settings.MIN_FAN_RUNNING, heading_array)
+        if last_heading is not None:
+            # Include the change of heading between windows.
+            heading_array = np.ma.concatenate([last_heading, heading_array])
+        heading_diff = np.ma.abs(np.ma.diff(
+            straighten_headings(heading_array))).sum()
+        if heading_diff is not np.ma.masked:
+            hdiff += heading_diff
+        last_heading = heading_array[-1:]
+
+    if first_airspeed is None:
+        slow_start = slow_stop = fast_for_long = None
+    else:
+        slow_start = first_airspeed < threshold
+        slow_stop = last_airspeed < threshold
+        fast_for_long = \
+            threshold_exceedance > settings.AIRSPEED_THRESHOLD_TIME
+    heading_change = hdiff > settings.HEADING_CHANGE_TAXI_THRESHOLD
+
+    segment_type, segment_slice = _segment_type(
+        start, stop, slow_start, slow_stop, fast_for_long, heading_change,
+        eng_available)
+    if segment_type in ('START_AND_STOP', 'START_ONLY', 'STOP_ONLY'):
+        return (segment_type, segment_slice, go_fast_index,
+                airspeed_hash.hexdigest())
+    return segment_type, segment_slice, None, None
+
+
+def split_segments_streaming(hdf, boundary=4, window=None):
+    '''
+    Split segments in the same way as split_segments while only reading
+    windows of parameters so that memory usage does not grow with the
+    duration of the data.
+
+    Airspeed is scanned for slow slices a window at a time and other
+    parameters are only read within the slow slices where splits are made.
+    Each segment is then scanned once to determine its type, go fast index
+    and Airspeed hash, so that append_segment_info need not read Airspeed
+    from the segment file.
+
+    Heading is straightened for the heading change of all segments, which
+    split_segments only does when there are multiple fast slices.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :param boundary: Boundary in seconds which segments will be padded to when written.
+    :type boundary: int
+    :param window: Duration of each window in seconds. Defaults to settings.SPLIT_WINDOW.
+    :type window: int or None
+    :returns: Segment type, slice, go fast index and Airspeed hash of each segment.
+    :rtype: [(str, slice, float or None, str or None)]
+    '''
+    window = window or settings.SPLIT_WINDOW
+    reliable_frame_counter = hdf.reliable_frame_counter
+    if not reliable_frame_counter:
+        logger.info("'Frame Counter' will not be used for splitting since "
+                    "'reliable_frame_counter' is False.")
+
+    split_indices = []
+    last_fast_secs = None
+    for slice_start_secs, slice_stop_secs, final in \
+            _iter_slow_slices(hdf, window):
+        if slice_start_secs == 0:
+            # Do not split if slow slice is at the beginning of the data.
+            continue
+        if final:
+            # The remaining data is added to the last segment.
+            break
+
+        if last_fast_secs is not None:
+            fast_duration = slice_start_secs - last_fast_secs
+            if fast_duration < settings.MINIMUM_FAST_DURATION:
+                logger.info("Disregarding short period of fast airspeed %s",
+                            fast_duration)
+                continue
+
+        slow_duration = slice_stop_secs - slice_start_secs
+        if slow_duration < settings.MINIMUM_SPLIT_DURATION:
+            logger.info("Disregarding period of airspeed below '%s' "
+                        "since '%s' is shorter than MINIMUM_SPLIT_DURATION "
+                        "('%s').", settings.AIRSPEED_THRESHOLD, slow_duration,
+                        settings.MINIMUM_SPLIT_DURATION)
+            continue
+
+        last_fast_secs = slice_stop_secs
+
+        split_index = _split_slow_slice_window(
+            hdf, slice_start_secs, slice_stop_secs, reliable_frame_counter)
+        if split_index is not None:
+            split_indices.append(split_index)
+
+    starts = [0] + split_indices
+    stops = split_indices + [hdf.duration]
+    return [_scan_segment(hdf, start, stop, boundary, window)
+            for start, stop in zip(starts, stops)]
+
+
 def _mask_invalid_years(array, latest_year):
     '''
     Mask years which are in the future, not 2 or 4 digits or were made before
@@ -736,7 +1155,8 @@ def _calculate_start_datetime(hdf, fallback_dt):
 
 
 def append_segment_info(hdf_segment_path, segment_type, segment_slice, part,
-                        fallback_dt=None):
+                        fallback_dt=None, go_fast_index=None,
+                        airspeed_hash=None):
     """
     Get information about a segment such as type, hash, etc. and return a
     named tuple.
@@ -755,12 +1175,17 @@ def append_segment_info(hdf_segment_path, segment_type, segment_slice, part,
     :param fallback_dt: Used to replace elements of datetimes which are not
         available in the hdf file (e.g. YEAR not being recorded)
     :type fallback_dt: datetime
+    :param go_fast_index: Seconds from the start of the segment at which Airspeed first exceeded AIRSPEED_THRESHOLD, if already known.
+    :type go_fast_index: float or None
+    :param airspeed_hash: Hash of the segment's Airspeed, if already known. Airspeed is not read from the segment when provided along with go_fast_index.
+    :type airspeed_hash: str or None
     :returns: Segment named tuple
     :rtype: Segment
     """
     # build information about a slice
     with hdf_file(hdf_segment_path) as hdf:
-        airspeed = hdf['Airspeed']
+        if airspeed_hash is None:
+            airspeed = hdf['Airspeed']
         duration = hdf.duration
         try:
             start_datetime = _calculate_start_datetime(hdf, fallback_dt)
@@ -774,17 +1199,19 @@ def append_segment_info(hdf_segment_path, segment_type, segment_slice, part,
         hdf.start_datetime = start_datetime
 
     if segment_type in ('START_AND_STOP', 'START_ONLY', 'STOP_ONLY'):
-        # we went fast, so get the index
-        spd_above_threshold = \
-            np.ma.where(airspeed.array > settings.AIRSPEED_THRESHOLD)
-        go_fast_index = spd_above_threshold[0][0] / airspeed.frequency
+        if airspeed_hash is None:
+            # we went fast, so get the index
+            spd_above_threshold = \
+                np.ma.where(airspeed.array > settings.AIRSPEED_THRESHOLD)
+            go_fast_index = spd_above_threshold[0][0] / airspeed.frequency
+            # Identification of raw data airspeed hash
+            airspeed_hash_sections = runs_of_ones(
+                airspeed.array.data > settings.AIRSPEED_THRESHOLD)
+            airspeed_hash = hash_array(airspeed.array.data,
+                                       airspeed_hash_sections,
+                                       settings.AIRSPEED_HASH_MIN_SAMPLES)
         go_fast_datetime = \
             start_datetime + timedelta(seconds=int(go_fast_index))
-        # Identification of raw data airspeed hash
-        airspeed_hash_sections = runs_of_ones(airspeed.array.data >
-                                              settings.AIRSPEED_THRESHOLD)
-        airspeed_hash = hash_array(airspeed.array.data, airspeed_hash_sections,
-                                   settings.AIRSPEED_HASH_MIN_SAMPLES)
     #elif segment_type == 'GROUND_ONLY':
         ##Q: Create a groundspeed hash?
         #pass
@@ -808,7 +1235,7 @@ def append_segment_info(hdf_segment_path, segment_type, segment_slice, part,
 
 def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None, 
                           fallback_relative_to_start=True,
-                          draw=False, dest_dir=None):
+                          draw=False, dest_dir=None, streaming=False):
     """
     Main method - analyses an HDF file for flight segments and splits each
     flight into a new segment appropriately.
@@ -827,6 +1254,10 @@ def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
     :param dest_dir: Destination directory, if None, the source file directory
         is used
     :type dest_dir: str
+    :param streaming: Split by reading windows of parameters rather than
+        loading them entirely, for files which are too large to hold in
+        memory. See split_segments_streaming.
+    :type streaming: bool
     :returns: List of Segments
     :rtype: List of Segment recordtypes ('slice type part duration path hash')
     """
@@ -856,27 +1287,34 @@ def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
 
 
         fallback_dt = calculate_fallback_dt(hdf, fallback_dt, fallback_relative_to_start)
-        segment_tuples = split_segments(hdf)
+
+        # ARINC 717 data has frames or superframes. ARINC 767 will be split
+        # on a minimum boundary of 4 seconds for the analyser.
+        boundary = 64 if superframe_present else 4
+
+        if streaming:
+            segment_tuples = split_segments_streaming(hdf, boundary=boundary)
+        else:
+            segment_tuples = [segment_tuple + (None, None) for segment_tuple
+                              in split_segments(hdf)]
 
     # process each segment (into a new file) having closed original hdf_path
     segments = []
     previous_stop_dt = None
-    for part, (segment_type, segment_slice) in enumerate(segment_tuples,
-                                                         start=1):
+    for part, (segment_type, segment_slice, go_fast_index,
+               airspeed_hash) in enumerate(segment_tuples, start=1):
         # write segment to new split file (.001)
         basename = os.path.basename(hdf_path)
         dest_basename = os.path.splitext(basename)[0] + '.%03d.hdf5' % part
         dest_path = os.path.join(dest_dir, dest_basename)
         logger.debug("Writing segment %d: %s", part, dest_path)
 
-        # ARINC 717 data has frames or superframes. ARINC 767 will be split
-        # on a minimum boundary of 4 seconds for the analyser.
-        boundary = 64 if superframe_present else 4
-
         write_segment(hdf_path, segment_slice, dest_path,
                       boundary=boundary)
         segment = append_segment_info(dest_path, segment_type, segment_slice,
-                                      part, fallback_dt=fallback_dt)
+                                      part, fallback_dt=fallback_dt,
+                                      go_fast_index=go_fast_index,
+                                      airspeed_hash=airspeed_hash)
 
         if previous_stop_dt and segment.start_dt < previous_stop_dt:
             # In theory, this should not happen - but be warned of superframe
@@ -917,6 +1355,9 @@ def parse_cmdline():
         'used in case the data does not contain reliable time parameters. '
         'Format YYY-MM-DD hh:mm'
     )
+    parser.add_argument('-s', '--streaming', action='store_true',
+                        help='Read parameters in windows rather than '
+                        'loading them entirely, for very large files.')
     parser.add_argument('-L', '--log-level', default=None, help='Log level')
     parser.add_argument('-q', '--quiet', action='store_true',
                         help="Don't output messages")
@@ -968,7 +1409,8 @@ def main():
         hdf_copy,
         ac_info,
         fallback_dt=args.fallback_datetime,
-        draw=False)
+        draw=False,
+        streaming=args.streaming)
 
     # Rename the segment filenames to be able to use glob()
     for segment in segments:
@@ -7,7 +7,7 @@ import zipfile
 
 from collections import defaultdict
 from datetime import datetime
-from inspect import getargspec, isclass
+from inspect import getargspec
 
 from hdfaccess.file import hdf_file
 from hdfaccess.utils import strip_hdf
@@ -18,13 +18,14 @@ from analysis_engine.dependency_graph import dependencies3, graph_nodes
 from analysis_engine.node import (
     loads, save, Node, NodeManager,
     DerivedParameterNode,
+    MultiOutputParameterNode,
     KeyPointValueNode,
     KeyTimeInstanceNode,
     FlightPhaseNode,
     FlightAttributeNode,
     ApproachNode,
-    NODE_SUBCLASSES,
 )
+from analysis_engine.node_registry import get_registry
 from analysis_engine import settings
 
 
@@ -152,7 +153,9 @@ def get_aircraft_info(tail_number):
 def get_derived_nodes(module_names):
     '''
     Create a key:value pair of each node_name to Node class for all Nodes
-    within modules provided.
+    within modules provided. Nodes are found once per process (or once
+    across processes if settings.NODE_REGISTRY_CACHE_DIR is set), see
+    node_registry.get_registry.
     
     sample module_names = ['path_to.module', 'analysis_engine.flight_phase',..]
     
@@ -161,51 +164,7 @@ def get_derived_nodes(module_names):
     :returns: Module name to Classes
     :rtype: Dict
     '''
-    # OPT: local variable to avoid module-level lookup.
-    node_subclasses = NODE_SUBCLASSES
-    
-    def isclassandsubclass(value, classes, superclass):
-        if not isclass(value):
-            return False
-        
-        # OPT: Lookup from set instead of issubclass (200x speedup).
-        for base_class in value.__bases__:
-            if base_class in classes:
-                return True
-        return issubclass(value, superclass)
-    
-    if isinstance(module_names, basestring):
-        # This has been done too often!
-        module_names = [module_names]
-    nodes = {}
-    for name in module_names:
-        #Ref:
-        #http://code.activestate.com/recipes/223972-import-package-modules-at-runtime/
-        # You may notice something odd about the call to __import__(): why is
-        # the last parameter a list whose only member is an empty string? This
-        # hack stems from a quirk about __import__(): if the last parameter is
-        # empty, loading class "A.B.C.D" actually only loads "A". If the last
-        # parameter is defined, regardless of what its value is, we end up
-        # loading "A.B.C"
-        ##abstract_nodes = ['Node', 'Derived Parameter Node', 'Key Point Value Node', 'Flight Phase Node'
-        ##print 'importing', name
-        module = __import__(name, globals(), locals(), [''])
-        for c in vars(module).values():
-            if isclassandsubclass(c, node_subclasses, Node) \
-                    and c.__module__ != 'analysis_engine.node':
-                try:
-                    #TODO: Alert when dupe node_name found which overrides previous
-                    ##name = c.get_name()
-                    ##if name in nodes:
-                        ### alert about overide happening or raise out?
-                    ##nodes[name] = c
-                    nodes[c.get_name()] = c
-                except TypeError:
-                    #TODO: Handle the expected error of top level classes
-                    # Can't instantiate abstract class DerivedParameterNode
-                    # - but don't know how to detect if we're at that level without resorting to 'if c.get_name() in 'derived parameter node',..
-                    logger.exception('Failed to import class: %s' % c.get_name())
-    return nodes
+    return get_registry(module_names).derived_nodes()
 
 
 def derived_trimmer(hdf_path, node_names, dest):
@@ -253,7 +212,10 @@ def _get_names(module_locations, fetch_names=True, fetch_dependencies=False,
         if filter_nodes and name not in filter_nodes:
             continue
         if fetch_names:
-            if hasattr(node, 'names'):
+            if issubclass(node, MultiOutputParameterNode):
+                # Registered once for each of its outputs.
+                names.append(name)
+            elif hasattr(node, 'names'):
                 # FormattedNameNode (KPV/KTI) can have many names
                 names.extend(node.names())
             else:
@@ -0,0 +1,11 @@
+'''
+Reproducible benchmarks of the FlightDataAnalyzer using synthetic flights.
+
+Run the suite and store the results with:
+
+    python -m benchmarks.suite --output results.json
+
+and compare a later run against stored results with:
+
+    python -m benchmarks.suite --baseline results.json
+'''
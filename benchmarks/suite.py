@@ -0,0 +1,468 @@
+'''
+Times starting a worker, splitting, processing and the heaviest library
+primitives on synthetic flights and compares throughput and memory against
+stored results.
+'''
+import argparse
+import logging
+import multiprocessing
+import numpy as np
+import os
+import platform
+import shutil
+import simplejson
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+
+from analysis_engine import __version__, library
+from analysis_engine.node import P
+from analysis_engine.profiling import max_rss
+
+from benchmarks.synthetic import SyntheticFlight, write_flight
+
+
+logger = logging.getLogger(__name__)
+
+# Benchmarks keyed by name in the order they are run.
+BENCHMARKS = OrderedDict()
+
+# Increase in time or memory as a proportion of the baseline which is
+# reported as a regression.
+REGRESSION_THRESHOLD = 0.1
+
+# Aircraft which the synthetic flights are processed as.
+AIRCRAFT_INFO = {
+    'Engine Count': 2,
+    'Frame': 'Synthetic',
+    'Precise Positioning': True,
+}
+
+# Flight shared with benchmarks run within worker processes.
+_flight = {}
+
+
+class Benchmark(object):
+    '''
+    A timed operation upon a synthetic flight.
+    '''
+    def __init__(self, name, func, setup=None, hdf=False):
+        '''
+        :param name: Name of the benchmark, prefixed by the module timed.
+        :type name: str
+        :param func: Operation to time, called with the result of setup.
+        :type func: callable
+        :param setup: Prepares the arguments of func from the flight's parameters and the path of its HDF file without being timed. Called before every repetition.
+        :type setup: callable or None
+        :param hdf: Whether the benchmark requires the flight to be written to an HDF file.
+        :type hdf: bool
+        '''
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.hdf = hdf
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+    def run(self, params, hdf_path=None, repeat=3):
+        '''
+        :param params: Parameters of the flight keyed by name.
+        :type params: dict
+        :param hdf_path: Path of the flight's HDF file.
+        :type hdf_path: str or None
+        :param repeat: Number of times to run the benchmark.
+        :type repeat: int
+        :returns: Times of each repetition in seconds, the increase of the process' peak memory in bytes and the number of samples processed by each repetition.
+        :rtype: ([float], int, int)
+        '''
+        times = []
+        start_rss = max_rss()
+        for _ in range(repeat):
+            args = self.setup(params, hdf_path) if self.setup else ()
+            start = time.time()
+            self.func(*args)
+            times.append(time.time() - start)
+        if self.hdf:
+            samples = sum(len(p.array) for p in params.itervalues())
+        else:
+            samples = sum(len(a.array) for a in args)
+        return times, max_rss() - start_rss, samples
+
+
+def benchmark(name, setup=None, hdf=False):
+    '''
+    Register a benchmark. See Benchmark for arguments.
+    '''
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name, func, setup=setup, hdf=hdf)
+        return func
+    return decorator
+
+
+def _python(statement):
+    '''
+    Execute a statement within a new Python interpreter to time starting a
+    worker from cold, i.e. without modules already imported.
+    '''
+    subprocess.check_call([sys.executable, '-c', statement])
+
+
+def _copy_hdf(params, hdf_path):
+    # Processing modifies the HDF file so each repetition uses a copy.
+    copy_path = hdf_path + '.copy'
+    shutil.copy(hdf_path, copy_path)
+    return copy_path,
+
+
+def _param(name, repaired=False):
+    def setup(params, hdf_path):
+        param = params[name]
+        array = param.array.copy()
+        if repaired:
+            array = library.repair_mask(array, frequency=param.frequency,
+                                        repair_duration=None)
+        return P(name, array, frequency=param.frequency,
+                 offset=param.offset),
+    return setup
+
+
+def _params(*names):
+    def setup(params, hdf_path):
+        return tuple(P(n, params[n].array.copy(),
+                       frequency=params[n].frequency,
+                       offset=params[n].offset) for n in names)
+    return setup
+
+
+@benchmark('startup.process_flight')
+def startup_process_flight():
+    _python('import analysis_engine.process_flight')
+
+
+@benchmark('startup.node_modules')
+def startup_node_modules():
+    _python('from analysis_engine import settings; '
+            'from analysis_engine.utils import get_derived_nodes; '
+            'get_derived_nodes(settings.NODE_MODULES)')
+
+
+@benchmark('split_hdf_to_segments.split_hdf_to_segments', setup=_copy_hdf,
+           hdf=True)
+def split(hdf_path):
+    from analysis_engine.split_hdf_to_segments import split_hdf_to_segments
+    dest_dir = tempfile.mkdtemp()
+    try:
+        split_hdf_to_segments(hdf_path, {}, dest_dir=dest_dir)
+    finally:
+        shutil.rmtree(dest_dir)
+        os.remove(hdf_path)
+
+
+@benchmark('process_flight.process_flight', setup=_copy_hdf, hdf=True)
+def process(hdf_path):
+    from analysis_engine.process_flight import process_flight
+    try:
+        process_flight({'File': hdf_path,
+                        'Start Datetime': _flight['flight'].start_datetime,
+                        'Segment Type': 'START_AND_STOP'},
+                       'G-SYNT', aircraft_info=dict(AIRCRAFT_INFO))
+    finally:
+        os.remove(hdf_path)
+
+
+@benchmark('library.align', setup=_params('Airspeed', 'Acceleration Normal'))
+def align(slave, master):
+    library.align(slave, master)
+
+
+@benchmark('library.repair_mask', setup=_param('Altitude Radio'))
+def repair_mask(param):
+    library.repair_mask(param.array, frequency=param.frequency,
+                        repair_duration=None)
+
+
+@benchmark('library.hysteresis', setup=_param('Heading'))
+def hysteresis(param):
+    library.hysteresis(param.array, 2)
+
+
+@benchmark('library.index_at_value', setup=_param('Altitude STD',
+                                                  repaired=True))
+def index_at_value(param):
+    for threshold in range(1000, 10000, 1000):
+        library.index_at_value(param.array, threshold)
+        library.index_at_value(param.array, threshold,
+                               _slice=slice(None, None, -1))
+
+
+@benchmark('library.index_at_values', setup=_param('Altitude STD',
+                                                   repaired=True))
+def index_at_values(param):
+    thresholds = range(1000, 10000, 1000)
+    library.index_at_values(param.array, thresholds)
+    library.index_at_values(param.array, thresholds,
+                            _slice=slice(None, None, -1))
+
+
+@benchmark('library.slices_above', setup=_param('Airspeed'))
+def slices_above(param):
+    library.slices_above(param.array, 80)
+
+
+@benchmark('library.slices_between', setup=_param('Altitude STD'))
+def slices_between(param):
+    library.slices_between(param.array, 1000, 10000)
+
+
+@benchmark('library.slices_from_to', setup=_param('Altitude STD',
+                                                  repaired=True))
+def slices_from_to(param):
+    library.slices_from_to(param.array, 10000, 1000)
+
+
+@benchmark('parameter_store.ParameterStore',
+           setup=_param('Acceleration Normal'))
+def parameter_store(param):
+    from analysis_engine.parameter_store import ParameterStore
+    # Written once and read by each dependant, which only accesses a window
+    # of the array.
+    with ParameterStore() as store:
+        store.set(param)
+        for index in range(0, len(param.array), len(param.array) // 20 or 1):
+            np.ma.max(store.get(param.name).array[index:index + 160])
+
+
+def _run_benchmark(args):
+    '''
+    Run a benchmark within a worker process so that its peak memory is
+    measured independently of other benchmarks.
+
+    :param args: Name of the benchmark and number of repetitions.
+    :type args: (str, int)
+    :returns: See Benchmark.run.
+    :rtype: ([float], int, int)
+    '''
+    name, repeat = args
+    return BENCHMARKS[name].run(_flight['params'], _flight.get('hdf_path'),
+                                repeat=repeat)
+
+
+def _commit():
+    '''
+    :returns: Commit of the working tree if within a git repository.
+    :rtype: str or None
+    '''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, duration=3600, count=None, frequency=None,
+                   seed=0, repeat=3, isolate=True):
+    '''
+    Generate a synthetic flight and run benchmarks upon it.
+
+    :param names: Names of benchmarks to run. All benchmarks are run if None.
+    :type names: [str] or None
+    :param duration: Duration of the flight in seconds.
+    :type duration: int
+    :param count: Number of parameters, see SyntheticFlight.parameter_names.
+    :type count: int or None
+    :param frequency: Sample rate of every parameter, see SyntheticFlight.parameters.
+    :type frequency: float or None
+    :param seed: Seed of the synthetic flight.
+    :type seed: int
+    :param repeat: Number of times to run each benchmark. The fastest is used for comparison.
+    :type repeat: int
+    :param isolate: Run each benchmark within a new process so that peak memory is measured independently. Requires fork, therefore not supported on Windows.
+    :type isolate: bool
+    :raises KeyError: If a benchmark name is not recognised.
+    :returns: Configuration, environment and results of each benchmark.
+    :rtype: dict
+    '''
+    benchmarks = [BENCHMARKS[n] for n in names] if names else \
+        BENCHMARKS.values()
+    flight = SyntheticFlight(duration=duration, seed=seed)
+    params = flight.parameters(count=count, frequency=frequency)
+    _flight.update(flight=flight, params=params)
+    temp_dir = None
+    if any(b.hdf for b in benchmarks):
+        temp_dir = tempfile.mkdtemp()
+        _flight['hdf_path'] = write_flight(
+            os.path.join(temp_dir, 'synthetic.hdf5'), params)
+
+    results = OrderedDict()
+    try:
+        for bench in benchmarks:
+            logger.info("Running benchmark '%s'.", bench.name)
+            if isolate:
+                pool = multiprocessing.Pool(1)
+                try:
+                    times, memory, samples = pool.apply(
+                        _run_benchmark, ((bench.name, repeat),))
+                finally:
+                    pool.terminate()
+                    pool.join()
+            else:
+                times, memory, samples = _run_benchmark(
+                    (bench.name, repeat))
+            results[bench.name] = OrderedDict([
+                ('times', times),
+                ('best', min(times)),
+                ('mean', sum(times) / len(times)),
+                # Samples processed per second.
+                ('throughput', samples / min(times)
+                 if samples and min(times) else None),
+                ('peak_memory', memory),
+                ('samples', samples),
+            ])
+            logger.info("%s: %.4f seconds, %d bytes.", bench.name,
+                        min(times), memory)
+    finally:
+        _flight.clear()
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+
+    return OrderedDict([
+        ('config', OrderedDict([
+            ('duration', duration),
+            ('count', len(params)),
+            ('frequency', frequency),
+            ('seed', seed),
+            ('repeat', repeat),
+        ])),
+        ('environment', OrderedDict([
+            ('commit', _commit()),
+            ('version', __version__),
+            ('datetime', datetime.utcnow().isoformat()),
+            ('python', platform.python_version()),
+            ('numpy', np.__version__),
+            ('platform', platform.platform()),
+            ('processor', platform.processor()),
+        ])),
+        ('results', results),
+    ])
+
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    '''
+    Compare the fastest time and peak memory of each benchmark with a
+    baseline. Benchmarks which are not within both results are ignored.
+
+    :param results: Results as returned by run_benchmarks.
+    :type results: dict
+    :param baseline: Results to compare against.
+    :type baseline: dict
+    :param threshold: Increase as a proportion of the baseline which is a regression.
+    :type threshold: float
+    :returns: Name, time ratio, memory ratio (None if the baseline used no memory) and whether the benchmark regressed.
+    :rtype: [(str, float, float or None, bool)]
+    '''
+    for key, value in results['config'].iteritems():
+        if key != 'repeat' and baseline['config'].get(key) != value:
+            logger.warning("Benchmark %s of %s differs from the baseline "
+                           "(%s).", key, value, baseline['config'].get(key))
+    comparison = []
+    for name, result in results['results'].iteritems():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        time_ratio = result['best'] / base['best'] if base['best'] else 1.0
+        if base['peak_memory'] > 0:
+            memory_ratio = float(result['peak_memory']) / base['peak_memory']
+        else:
+            memory_ratio = None
+        regressed = time_ratio > 1 + threshold or \
+            (memory_ratio is not None and memory_ratio > 1 + threshold)
+        comparison.append((name, time_ratio, memory_ratio, regressed))
+    return comparison
+
+
+def save_results(results, path):
+    '''
+    :type results: dict
+    :param path: Path of json file to write.
+    :type path: str
+    '''
+    with open(path, 'w') as fh:
+        simplejson.dump(results, fh, indent=2)
+
+
+def load_results(path):
+    '''
+    :param path: Path of json file written by save_results.
+    :type path: str
+    :rtype: dict
+    '''
+    with open(path) as fh:
+        return simplejson.load(fh, object_pairs_hook=OrderedDict)
+
+
+def main():
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+    parser = argparse.ArgumentParser(
+        description='Benchmark the FlightDataAnalyzer with synthetic '
+        'flights.')
+    parser.add_argument('benchmarks', type=str, nargs='*',
+                        help='Names of benchmarks to run. Defaults to all: '
+                        '%s' % ', '.join(BENCHMARKS))
+    parser.add_argument('-d', '--duration', dest='duration', type=int,
+                        default=3600, help='Flight duration in seconds.')
+    parser.add_argument('-n', '--count', dest='count', type=int,
+                        default=None, help='Number of parameters.')
+    parser.add_argument('-f', '--frequency', dest='frequency', type=float,
+                        default=None,
+                        help='Sample rate of every parameter in Hz.')
+    parser.add_argument('--seed', dest='seed', type=int, default=0,
+                        help='Seed of the synthetic flight.')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3,
+                        help='Number of times to run each benchmark.')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help='Run benchmarks within this process.')
+    parser.add_argument('-o', '--output', dest='output', type=str,
+                        help='Path to write results to in json format.')
+    parser.add_argument('-b', '--baseline', dest='baseline', type=str,
+                        help='Path of results to compare against. The exit '
+                        'status is 1 if any benchmark regressed.')
+    parser.add_argument('-t', '--threshold', dest='threshold', type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help='Increase in time or memory as a proportion of '
+                        'the baseline which is a regression.')
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+    results = run_benchmarks(names=args.benchmarks, duration=args.duration,
+                             count=args.count, frequency=args.frequency,
+                             seed=args.seed, repeat=args.repeat,
+                             isolate=args.isolate)
+    if args.output:
+        save_results(results, args.output)
+        logger.info("Results written to '%s'.", args.output)
+    if not args.baseline:
+        return
+
+    regressions = 0
+    for name, time_ratio, memory_ratio, regressed in compare_results(
+            results, load_results(args.baseline), threshold=args.threshold):
+        logger.info("%-50s time x%.2f memory %s%s", name, time_ratio,
+                    'x%.2f' % memory_ratio if memory_ratio is not None
+                    else '-', '  REGRESSED' if regressed else '')
+        regressions += regressed
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
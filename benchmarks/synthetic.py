@@ -0,0 +1,360 @@
+'''
+Generates synthetic but physically plausible flights of configurable
+duration, parameter count and sample rates.
+
+A flight taxis out, takes off, climbs to a cruise altitude, descends, lands
+and taxis in. Recorded parameters follow this profile with sensor noise and
+occasional invalid samples. Flights are generated from a seed so that
+benchmarks are reproducible across runs and machines.
+'''
+import numpy as np
+
+from datetime import datetime, timedelta
+
+from hdfaccess.file import hdf_file
+from hdfaccess.parameter import MappedArray, Parameter
+
+
+# Sample rates of the parameters recorded by most aircraft.
+CORE_FREQUENCIES = {
+    'Acceleration Normal': 8,
+    'Airspeed': 1,
+    'Altitude Radio': 4,
+    'Altitude STD': 2,
+    'Day': 0.25,
+    'Eng (1) N1': 1,
+    'Eng (2) N1': 1,
+    'Flap': 1,
+    'Gear Down': 1,
+    'Groundspeed': 1,
+    'Heading': 1,
+    'Hour': 0.25,
+    'Latitude': 0.5,
+    'Longitude': 0.5,
+    'Minute': 0.25,
+    'Month': 0.25,
+    'Pitch': 4,
+    'Roll': 2,
+    'Second': 0.25,
+    'Year': 0.25,
+}
+
+# Sample rates of additional parameters are taken from this sequence in turn.
+ADDITIONAL_FREQUENCIES = (1, 2, 4, 8, 16)
+
+# Shortest flight which can be generated in seconds.
+MIN_DURATION = 1200
+
+# Proportion of samples which are invalid.
+MASKED_RATIO = 0.001
+
+# Standard deviation of sensor noise as a proportion of a parameter's range.
+NOISE_RATIO = 0.0002
+
+# Parameters which are never negative despite sensor noise.
+NON_NEGATIVE = ('Airspeed', 'Altitude Radio', 'Eng (1) N1', 'Eng (2) N1',
+                'Groundspeed')
+
+# Standard acceleration due to gravity in knots per second.
+GRAVITY_KTS = 19.06
+
+
+def _profile(times, keypoints):
+    '''
+    Interpolate linearly between values at keypoints.
+
+    :param times: Times to interpolate at in seconds.
+    :type times: np.ndarray
+    :param keypoints: Times in seconds and the value at each time.
+    :type keypoints: [(float, float)]
+    :rtype: np.ndarray
+    '''
+    key_times, key_values = zip(*keypoints)
+    return np.interp(times, key_times, key_values)
+
+
+class SyntheticFlight(object):
+    '''
+    The profile of a single synthetic flight, from which parameters are
+    sampled at any frequency and offset.
+    '''
+    def __init__(self, duration=3600, seed=0,
+                 start_datetime=datetime(2013, 6, 1, 12, 0, 0)):
+        '''
+        :param duration: Duration of the flight in seconds.
+        :type duration: int
+        :param seed: Seed for the noise and invalid samples of the flight.
+        :type seed: int
+        :param start_datetime: Datetime of the first sample.
+        :type start_datetime: datetime
+        :raises ValueError: If duration is shorter than MIN_DURATION.
+        '''
+        if duration < MIN_DURATION:
+            raise ValueError("Synthetic flights must be at least %d seconds."
+                             % MIN_DURATION)
+        self.duration = duration
+        self.seed = seed
+        self.start_datetime = start_datetime
+        # Times of each stage of the flight in seconds.
+        self.roll = 0.08 * duration
+        self.liftoff = self.roll + 40
+        self.top_of_climb = 0.3 * duration
+        self.top_of_descent = 0.65 * duration
+        self.touchdown = 0.9 * duration
+        self.turnoff = self.touchdown + 60
+        self.stop = 0.97 * duration
+        # Climb at up to 2500 fpm.
+        self.cruise_altitude = min(
+            35000, (self.top_of_climb - self.liftoff) * 2500 / 60.0 // 1000 *
+            1000)
+        self.elevation = 200
+        # Track the flight at 1Hz.
+        seconds = np.arange(duration + 1, dtype=np.float64)
+        heading = self._heading(seconds)
+        speed = self._groundspeed(seconds)
+        self._seconds = seconds
+        self._heading_unwrapped = heading
+        # Nautical miles travelled each second, converted to degrees.
+        radians = np.radians(heading)
+        self._latitude = 51.15 + np.cumsum(speed * np.cos(radians)) / \
+            3600.0 / 60.0
+        self._longitude = -0.19 + np.cumsum(
+            speed * np.sin(radians) /
+            np.cos(np.radians(self._latitude))) / 3600.0 / 60.0
+
+    def _airspeed(self, times):
+        return _profile(times, [
+            (0, 0), (self.roll * 0.2, 15), (self.roll, 15),
+            (self.liftoff, 150), (self.liftoff + 120, 250),
+            (self.top_of_climb, 280), (self.top_of_descent, 280),
+            (self.touchdown - 300, 180), (self.touchdown, 135),
+            (self.turnoff, 15), (self.stop, 10), (self.duration, 0)])
+
+    def _altitude_aal(self, times):
+        return _profile(times, [
+            (0, 0), (self.liftoff, 0), (self.top_of_climb,
+                                        self.cruise_altitude),
+            (self.top_of_descent, self.cruise_altitude),
+            (self.touchdown - 300, 1500), (self.touchdown, 0),
+            (self.duration, 0)])
+
+    def _heading(self, times):
+        # Unwrapped heading, turning from the departure runway (090) to the
+        # arrival runway (180) via a westerly cruise.
+        return _profile(times, [
+            (0, 0), (self.roll * 0.8, 90), (self.liftoff + 60, 90),
+            (self.liftoff + 180, 270), (self.top_of_descent, 270),
+            (self.touchdown - 240, 180), (self.turnoff, 180),
+            (self.turnoff + 60, 270), (self.duration, 270)])
+
+    def _groundspeed(self, times):
+        # No wind; true airspeed increases by 2% per 1000 ft.
+        return self._airspeed(times) * (
+            1 + self._altitude_aal(times) / 1000.0 * 0.02)
+
+    def _n1(self, times, engine):
+        return _profile(times, [
+            (0, 0), (self.roll * 0.1 + engine * 30, 22),
+            (self.roll, 22), (self.roll + 10, 95), (self.liftoff + 60, 92),
+            (self.liftoff + 61, 85), (self.top_of_climb, 85),
+            (self.top_of_climb + 60, 78), (self.top_of_descent, 78),
+            (self.top_of_descent + 60, 35), (self.touchdown - 300, 35),
+            (self.touchdown - 240, 60), (self.touchdown, 35),
+            (self.touchdown + 5, 70), (self.touchdown + 25, 22),
+            (self.stop, 22), (self.stop + 30, 0), (self.duration, 0)])
+
+    def _pitch(self, times):
+        return _profile(times, [
+            (0, 0), (self.liftoff - 5, 0), (self.liftoff, 10),
+            (self.liftoff + 20, 15), (self.top_of_climb - 60, 8),
+            (self.top_of_climb, 3), (self.top_of_descent, 3),
+            (self.top_of_descent + 60, -1), (self.touchdown - 300, 2),
+            (self.touchdown - 10, 3), (self.touchdown, 6),
+            (self.touchdown + 10, 0), (self.duration, 0)])
+
+    def _roll(self, times):
+        # Bank angle of a coordinated turn.
+        rate = np.radians(np.interp(times, self._seconds,
+                                    np.gradient(self._heading_unwrapped)))
+        airborne = self._altitude_aal(times) > 0
+        return np.degrees(np.arctan(
+            self._airspeed(times) * rate / GRAVITY_KTS)) * airborne
+
+    def _acceleration_normal(self, times):
+        return _profile(times, [
+            (0, 1), (self.touchdown - 0.5, 1), (self.touchdown, 1.3),
+            (self.touchdown + 0.5, 1), (self.duration, 1)])
+
+    def _flap(self, times):
+        return np.round(_profile(times, [
+            (0, 0), (self.roll * 0.5, 0), (self.roll * 0.5 + 10, 5),
+            (self.liftoff + 120, 5), (self.liftoff + 140, 0),
+            (self.touchdown - 400, 0), (self.touchdown - 380, 15),
+            (self.touchdown - 200, 15), (self.touchdown - 180, 30),
+            (self.turnoff, 30), (self.turnoff + 20, 0),
+            (self.duration, 0)]))
+
+    def _gear_down(self, times):
+        return (self._altitude_aal(times) < 1500).astype(np.int)
+
+    def _datetime(self, times, attribute):
+        seconds, indices = np.unique(np.floor(times), return_inverse=True)
+        values = np.array([
+            getattr(self.start_datetime + timedelta(seconds=t), attribute)
+            for t in seconds])
+        return values[indices]
+
+    def parameter_names(self, count=None):
+        '''
+        :param count: Total number of parameters. Additional parameters named 'Synthetic (N)' are added to the core parameters. Defaults to the core parameters only.
+        :type count: int or None
+        :rtype: [str]
+        '''
+        names = sorted(CORE_FREQUENCIES)
+        for index in range(len(names), count or 0):
+            names.append('Synthetic (%d)' % (index - len(CORE_FREQUENCIES) + 1))
+        return names
+
+    def values(self, name, times):
+        '''
+        Noiseless values of a parameter at times within the flight. Heading
+        is not wrapped to 360 degrees.
+
+        :param name: Name of parameter.
+        :type name: str
+        :param times: Times in seconds from the start of the flight.
+        :type times: np.ndarray
+        :rtype: np.ndarray
+        '''
+        if name == 'Acceleration Normal':
+            return self._acceleration_normal(times)
+        elif name == 'Airspeed':
+            return self._airspeed(times)
+        elif name == 'Altitude Radio':
+            return self._altitude_aal(times)
+        elif name == 'Altitude STD':
+            return self._altitude_aal(times) + self.elevation
+        elif name in ('Day', 'Hour', 'Minute', 'Month', 'Second', 'Year'):
+            return self._datetime(times, name.lower())
+        elif name == 'Eng (1) N1':
+            return self._n1(times, 0)
+        elif name == 'Eng (2) N1':
+            return self._n1(times, 1)
+        elif name == 'Flap':
+            return self._flap(times)
+        elif name == 'Gear Down':
+            return self._gear_down(times)
+        elif name == 'Groundspeed':
+            return self._groundspeed(times)
+        elif name == 'Heading':
+            return self._heading(times)
+        elif name == 'Latitude':
+            return np.interp(times, self._seconds, self._latitude)
+        elif name == 'Longitude':
+            return np.interp(times, self._seconds, self._longitude)
+        elif name == 'Pitch':
+            return self._pitch(times)
+        elif name == 'Roll':
+            return self._roll(times)
+        # Additional parameters follow the climb and descent of the flight.
+        return self._altitude_aal(times) / self.cruise_altitude * 100
+
+    def parameter(self, name, frequency, offset=0):
+        '''
+        Sample a parameter with sensor noise and invalid samples.
+
+        :param name: Name of parameter.
+        :type name: str
+        :param frequency: Sample rate in Hz.
+        :type frequency: float
+        :param offset: Offset of the first sample in seconds.
+        :type offset: float
+        :rtype: Parameter
+        '''
+        # Each parameter has its own reproducible noise.
+        random = np.random.RandomState(
+            [self.seed] + [ord(c) for c in name])
+        times = np.arange(int(self.duration * frequency)) / \
+            float(frequency) + offset
+        values = self.values(name, times)
+        values_mapping = None
+        if name == 'Gear Down':
+            values_mapping = {0: 'Up', 1: 'Down'}
+        elif name not in ('Day', 'Flap', 'Hour', 'Minute', 'Month', 'Second',
+                          'Year'):
+            values = values + random.normal(
+                0, max(np.ptp(values), 1) * NOISE_RATIO, len(values))
+            if name == 'Heading':
+                values %= 360
+            elif name in NON_NEGATIVE:
+                values = np.abs(values)
+        mask = random.random_sample(len(values)) < MASKED_RATIO
+        if name == 'Altitude Radio':
+            # Radio altimeters are only valid close to the ground.
+            mask |= values > 5000
+        if values_mapping:
+            array = MappedArray(values, mask=mask,
+                                values_mapping=values_mapping)
+        else:
+            array = np.ma.array(values, mask=mask)
+        param = Parameter(name, array, frequency=frequency, offset=offset)
+        param.lfl = True
+        return param
+
+    def parameters(self, count=None, frequency=None):
+        '''
+        :param count: Total number of parameters, see parameter_names.
+        :type count: int or None
+        :param frequency: Sample rate of every parameter in Hz. The core parameters are recorded at typical rates and additional parameters at ADDITIONAL_FREQUENCIES in turn if not provided.
+        :type frequency: float or None
+        :returns: Parameters keyed by name.
+        :rtype: dict
+        '''
+        random = np.random.RandomState(self.seed)
+        params = {}
+        for index, name in enumerate(self.parameter_names(count)):
+            if frequency:
+                param_frequency = frequency
+            elif name in CORE_FREQUENCIES:
+                param_frequency = CORE_FREQUENCIES[name]
+            else:
+                param_frequency = ADDITIONAL_FREQUENCIES[
+                    index % len(ADDITIONAL_FREQUENCIES)]
+            # Offsets are within the first sample period as when recorded.
+            offset = round(random.random_sample() / param_frequency, 4)
+            params[name] = self.parameter(name, param_frequency, offset)
+        return params
+
+
+def generate_flight(duration=3600, count=None, frequency=None, seed=0):
+    '''
+    :param duration: Duration of the flight in seconds.
+    :type duration: int
+    :param count: Total number of parameters, see SyntheticFlight.parameter_names.
+    :type count: int or None
+    :param frequency: Sample rate of every parameter, see SyntheticFlight.parameters.
+    :type frequency: float or None
+    :param seed: Seed for the noise and invalid samples of the flight.
+    :type seed: int
+    :returns: Parameters keyed by name.
+    :rtype: dict
+    '''
+    flight = SyntheticFlight(duration=duration, seed=seed)
+    return flight.parameters(count=count, frequency=frequency)
+
+
+def write_flight(path, params):
+    '''
+    Write the parameters of a synthetic flight to a new HDF file.
+
+    :param path: Path of the HDF file to create.
+    :type path: str
+    :param params: Parameters keyed by name.
+    :type params: dict
+    :returns: Path of the HDF file.
+    :rtype: str
+    '''
+    with hdf_file(path, create=True) as hdf:
+        for param in params.itervalues():
+            hdf.set_param(param)
+    return path
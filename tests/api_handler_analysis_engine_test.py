@@ -1,4 +1,5 @@
 import httplib2
+import numpy as np
 import simplejson
 import socket
 import unittest
@@ -9,6 +10,8 @@ from analysis_engine.api_handler import (
     APIConnectionError,
     APIError,
     APIHandlerHTTP,
+    clear_api_handlers,
+    get_api_handler,
     InvalidAPIInputError,
     NotFoundError,
     UnknownAPIError
@@ -16,12 +19,14 @@ from analysis_engine.api_handler import (
 from analysis_engine.api_handler_analysis_engine import (
     AnalysisEngineAPIHandlerHTTP,
     AnalysisEngineAPIHandlerLocal,
+    NearestLocationIndex,
 )
+from analysis_engine.library import bearing_and_distance
 
 
 class APIHandlerHTTPTest(unittest.TestCase):
     
-    @patch('analysis_engine.api_handler.httplib2.Http.request')
+    @patch('httplib2.Http.request')
     def test__request(self, http_request_patched):
         '''
         Test error handling.
@@ -130,6 +135,57 @@ class APIHandlerHTTPTest(unittest.TestCase):
         # TODO: Test GET parameters.
 
 
+class GetAPIHandlerTest(unittest.TestCase):
+    def tearDown(self):
+        clear_api_handlers()
+
+    def test_get_api_handler(self):
+        path = 'analysis_engine.api_handler_analysis_engine.' \
+            'AnalysisEngineAPIHandlerLocal'
+        handler = get_api_handler(path)
+        self.assertTrue(isinstance(handler, AnalysisEngineAPIHandlerLocal))
+        self.assertTrue(get_api_handler(path) is handler)
+        http_path = 'analysis_engine.api_handler_analysis_engine.' \
+            'AnalysisEngineAPIHandlerHTTP'
+        http_handler = get_api_handler(http_path, attempts=2)
+        self.assertTrue(get_api_handler(http_path, attempts=2) is http_handler)
+        self.assertFalse(get_api_handler(http_path, attempts=3) is
+                         http_handler)
+        clear_api_handlers()
+        self.assertFalse(get_api_handler(path) is handler)
+
+
+class NearestLocationIndexTest(unittest.TestCase):
+    def test_nearest(self):
+        np.random.seed(0)
+        records = [{'latitude': lat, 'longitude': lon} for lat, lon in
+                   zip(np.random.uniform(-90, 90, 500),
+                       np.random.uniform(-180, 180, 500))]
+        records.append({'name': 'No coordinates'})
+        index = NearestLocationIndex(
+            records, lambda r: (r['latitude'], r['longitude'])
+            if 'latitude' in r else None)
+        self.assertEqual(len(index), 500)
+        for lat, lon in zip(np.random.uniform(-90, 90, 50),
+                            np.random.uniform(-180, 180, 50)):
+            expected = min(records[:-1], key=lambda r: bearing_and_distance(
+                lat, lon, r['latitude'], r['longitude'])[1])
+            self.assertTrue(index.nearest(lat, lon) is expected)
+        # Across the antimeridian.
+        self.assertEqual(
+            NearestLocationIndex([{'latitude': 0, 'longitude': 179.9},
+                                  {'latitude': 0, 'longitude': 178}],
+                                 _coords).nearest(0, -179.9),
+            {'latitude': 0, 'longitude': 179.9})
+
+    def test_nearest_empty(self):
+        self.assertEqual(NearestLocationIndex([], _coords).nearest(0, 0), None)
+
+
+def _coords(record):
+    return record['latitude'], record['longitude']
+
+
 class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
     def setUp(self):
         self.handler = AnalysisEngineAPIHandlerLocal()
@@ -147,6 +203,24 @@ class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
                          self.handler.airports[1])
         self.assertEqual(self.handler.get_airport('ENGM'),
                          self.handler.airports[1])
+        # Changes to the airport returned are not kept by the handler.
+        airport = self.handler.get_airport('KRS')
+        airport['code']['iata'] = 'XXX'
+        self.assertEqual(self.handler.get_airport('KRS'),
+                         self.handler.airports[0])
+        self.assertEqual(self.handler.airports[0]['code']['iata'], 'KRS')
+
+    def test_get_aircraft(self):
+        self.handler.aircraft = {'G-ABCD': {'Model': 'B737-333',
+                                            'Precise Positioning': True}}
+        aircraft = self.handler.get_aircraft('G-ABCD')
+        self.assertEqual(aircraft, {'Model': 'B737-333',
+                                    'Precise Positioning': True})
+        # Changes to the aircraft returned are not kept by the handler.
+        aircraft['Tail Number'] = 'G-ABCD'
+        self.assertEqual(self.handler.get_aircraft('G-ABCD'),
+                         {'Model': 'B737-333', 'Precise Positioning': True})
+        self.assertRaises(NotFoundError, self.handler.get_aircraft, 'G-WXYZ')
     
     def test_get_nearest_airport(self):
         airport = self.handler.get_nearest_airport(58, 8)
@@ -157,6 +231,9 @@ class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
         self.assertEqual(airport['distance'], 22267.45203750386)
         del airport['distance']
         self.assertEqual(airport, self.handler.airports[1])
+        # Changes to the airport returned are not kept by the handler.
+        airport['code']['iata'] = 'XXX'
+        self.assertEqual(self.handler.airports[1]['code']['iata'], 'OSL')
     
     def test_get_nearest_runway(self):
         runway = self.handler.get_nearest_runway(None, None, latitude=58,
@@ -169,3 +246,6 @@ class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
         self.assertEqual(runway['distance'], 20972.761983734454)
         del runway['distance']
         self.assertEqual(runway, self.handler.runways[1])
+        # Changes to the runway returned are not kept by the handler.
+        runway['start']['latitude'] = 0
+        self.assertNotEqual(self.handler.runways[1]['start']['latitude'], 0)
@@ -0,0 +1,124 @@
+import numpy as np
+import subprocess
+import sys
+import unittest
+
+from benchmarks.suite import BENCHMARKS, compare_results, run_benchmarks
+from benchmarks.synthetic import (
+    ADDITIONAL_FREQUENCIES,
+    CORE_FREQUENCIES,
+    generate_flight,
+    SyntheticFlight,
+)
+
+
+class TestSyntheticFlight(unittest.TestCase):
+
+    def test_parameters(self):
+        params = generate_flight(duration=1800, count=30)
+        self.assertEqual(len(params), 30)
+        self.assertEqual(params['Airspeed'].frequency,
+                         CORE_FREQUENCIES['Airspeed'])
+        self.assertEqual(len(params['Acceleration Normal'].array),
+                         1800 * CORE_FREQUENCIES['Acceleration Normal'])
+        self.assertEqual(
+            set(params['Synthetic (%d)' % n].frequency for n in range(1, 11)),
+            set(ADDITIONAL_FREQUENCIES))
+        for param in params.itervalues():
+            self.assertTrue(0 <= param.offset < 1.0 / param.frequency)
+        # Reproducible from the seed.
+        np.testing.assert_array_equal(
+            params['Heading'].array,
+            generate_flight(duration=1800, count=30)['Heading'].array)
+        self.assertFalse(np.all(
+            params['Heading'].array ==
+            generate_flight(duration=1800, seed=1)['Heading'].array))
+
+    def test_frequency(self):
+        params = generate_flight(duration=1200, count=25, frequency=16)
+        for param in params.itervalues():
+            self.assertEqual(param.frequency, 16)
+            self.assertEqual(len(param.array), 1200 * 16)
+
+    def test_profile(self):
+        params = generate_flight(duration=3600)
+        airspeed = params['Airspeed'].array
+        altitude = params['Altitude STD'].array
+        # Stationary on the ground at the start and end of the flight.
+        self.assertTrue(airspeed[0] < 5)
+        self.assertTrue(airspeed[-1] < 5)
+        self.assertTrue(abs(altitude[0] - altitude[-1]) < 50)
+        self.assertTrue(250 < airspeed.max() < 300)
+        self.assertTrue(altitude.max() > 30000)
+        self.assertTrue(params['Heading'].array.min() >= 0)
+        self.assertTrue(params['Heading'].array.max() < 360)
+        # Radio altimeter is invalid at cruise altitude.
+        self.assertTrue(np.ma.count_masked(params['Altitude Radio'].array) >
+                        len(params['Altitude Radio'].array) / 2)
+        self.assertEqual(params['Hour'].array[0], 12)
+
+    def test_min_duration(self):
+        self.assertRaises(ValueError, SyntheticFlight, duration=600)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        names = [n for n in BENCHMARKS if n.startswith('library.')]
+        results = run_benchmarks(names, duration=1200, repeat=2,
+                                 isolate=False)
+        self.assertEqual(results['results'].keys(), names)
+        for result in results['results'].itervalues():
+            self.assertEqual(len(result['times']), 2)
+            self.assertEqual(result['best'], min(result['times']))
+            self.assertTrue(result['samples'] > 0)
+        self.assertEqual(results['config']['duration'], 1200)
+
+    def test_startup(self):
+        results = run_benchmarks(['startup.process_flight'], duration=1200,
+                                 repeat=1, isolate=False)
+        result = results['results']['startup.process_flight']
+        self.assertTrue(result['best'] > 0)
+        self.assertEqual(result['samples'], 0)
+        self.assertEqual(result['throughput'], None)
+
+    def test_compare_results(self):
+        config = {'duration': 1200, 'count': 20, 'frequency': None,
+                  'seed': 0, 'repeat': 3}
+        baseline = {'config': config, 'results': {
+            'a': {'best': 1.0, 'peak_memory': 100},
+            'b': {'best': 1.0, 'peak_memory': 100},
+            'c': {'best': 1.0, 'peak_memory': 0},
+        }}
+        results = {'config': config, 'results': {
+            'a': {'best': 1.05, 'peak_memory': 100},
+            'b': {'best': 0.5, 'peak_memory': 200},
+            'c': {'best': 2.0, 'peak_memory': 100},
+            'd': {'best': 1.0, 'peak_memory': 100},
+        }}
+        self.assertEqual(sorted(compare_results(results, baseline)), [
+            ('a', 1.05, 1.0, False),
+            ('b', 0.5, 2.0, True),
+            ('c', 2.0, None, True),
+        ])
+
+
+class TestStartup(unittest.TestCase):
+
+    def _imported(self, module_name, lazy):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys; import %s; print " ".join(sys.modules)'
+            % module_name])
+        return sorted(set(lazy) & set(output.split()))
+
+    def test_lazy_imports(self):
+        # Only imported once required by plotting, KML, HTTP requests,
+        # drawing graphs or the nodes which use them.
+        lazy = ['httplib2', 'matplotlib', 'pygraphviz', 'scipy.interpolate',
+                'scipy.ndimage', 'scipy.optimize', 'scipy.signal',
+                'scipy.spatial', 'simplekml', 'yaml']
+        self.assertEqual(
+            self._imported('analysis_engine.process_flight', lazy), [])
+        self.assertEqual(
+            self._imported('analysis_engine.node', lazy + ['networkx']), [])
@@ -1,16 +1,25 @@
 import collections
+import mock
+import os
+import shutil
+import tempfile
 import unittest
 import networkx as nx
 
 from datetime import datetime
 
-from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
+from analysis_engine.node import (A, DerivedParameterNode, Node, NodeManager,
+                                  P)
 from analysis_engine.dependency_graph import (
     any_predecessors_in_requested,
+    cached_dependency_order,
+    clear_dependency_order_cache,
+    dependency_order_key,
     dependency_order, 
     graph_nodes, 
     graph_adjacencies,
     indent_tree,
+    node_fingerprints,
     process_order,
 )
 from analysis_engine.utils import get_derived_nodes
@@ -365,6 +374,167 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         
 
 
+class Brakes(DerivedParameterNode):
+    @classmethod
+    def can_operate(cls, available, family=A('Family')):
+        return family and family.value == 'B737'
+
+    def derive(self, raw1=P('Raw1')):
+        pass
+
+
+class TestCachedDependencyOrder(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.derived_nodes = {
+            'P4': MockParam(dependencies=['Raw1', 'Raw2']),
+            'Brakes': Brakes,
+        }
+        clear_dependency_order_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        clear_dependency_order_cache()
+
+    def _node_mgr(self, lfl_params=['Raw1', 'Raw2'], aircraft_info={}):
+        return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params,
+                           ['P4', 'Brakes'], [], self.derived_nodes,
+                           aircraft_info, {})
+
+    def test_dependency_order_key(self):
+        key = dependency_order_key(self._node_mgr())
+        self.assertEqual(key, dependency_order_key(self._node_mgr()))
+        # Parameters within the HDF file.
+        self.assertNotEqual(key, dependency_order_key(
+            self._node_mgr(lfl_params=['Raw1'])))
+        # Attribute values inspected by can_operate.
+        self.assertNotEqual(
+            dependency_order_key(self._node_mgr(
+                aircraft_info={'Family': 'B737'})),
+            dependency_order_key(self._node_mgr(
+                aircraft_info={'Family': 'A320'})))
+        # Attribute values which are not inspected only change the key when
+        # they become available.
+        self.assertEqual(
+            dependency_order_key(self._node_mgr(
+                aircraft_info={'Model': 'B737-800'})),
+            dependency_order_key(self._node_mgr(
+                aircraft_info={'Model': 'B737-300'})))
+        # Tables within packages such as flightdatautilities.
+        with mock.patch('analysis_engine.dependency_graph._package_hash',
+                        return_value='changed'):
+            self.assertNotEqual(key, dependency_order_key(self._node_mgr()))
+
+    def test_cached_dependency_order(self):
+        node_mgr = self._node_mgr(aircraft_info={'Family': 'B737'})
+        order, gr_st = cached_dependency_order(node_mgr, cache_size=1,
+                                               cache_dir=self.cache_dir)
+        self.assertEqual(set(order), set(['Raw1', 'Raw2', 'P4', 'Brakes']))
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [dependency_order_key(node_mgr) + '.pkl'])
+        with mock.patch('analysis_engine.dependency_graph.dependency_order') \
+             as dependency_order:
+            # Loaded from memory.
+            self.assertEqual(cached_dependency_order(
+                node_mgr, cache_size=1, cache_dir=self.cache_dir)[0], order)
+            # Loaded from disk.
+            clear_dependency_order_cache()
+            cached_order, cached_gr_st = cached_dependency_order(
+                node_mgr, cache_size=1, cache_dir=self.cache_dir)
+            self.assertEqual(cached_order, order)
+            self.assertEqual(sorted(cached_gr_st.edges()),
+                             sorted(gr_st.edges()))
+            self.assertFalse(dependency_order.called)
+        order = cached_dependency_order(
+            self._node_mgr(aircraft_info={'Family': 'A320'}), cache_size=1)[0]
+        self.assertFalse('Brakes' in order)
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw1=P('Raw1'), family=A('Family')):
+        pass
+
+
+class Quadrupled(DerivedParameterNode):
+    def derive(self, doubled=P('Doubled')):
+        pass
+
+
+class TestNodeFingerprints(unittest.TestCase):
+
+    def setUp(self):
+        self.derived_nodes = {
+            'Brakes': Brakes,
+            'Doubled': Doubled,
+            'Quadrupled': Quadrupled,
+        }
+        clear_dependency_order_cache()
+
+    def tearDown(self):
+        clear_dependency_order_cache()
+
+    def _fingerprints(self, lfl_params=['Raw1'], aircraft_info={}):
+        node_mgr = NodeManager({}, 10, lfl_params, [], [],
+                               self.derived_nodes, aircraft_info, {})
+        return node_fingerprints(node_mgr, lfl_params)
+
+    def test_node_fingerprints(self):
+        fingerprints = self._fingerprints()
+        self.assertEqual(sorted(fingerprints),
+                         ['Brakes', 'Doubled', 'Quadrupled'])
+        self.assertEqual(fingerprints, self._fingerprints())
+        self.assertEqual(len(set(fingerprints.values())), 3)
+
+    def test_node_fingerprints_dependencies(self):
+        fingerprints = self._fingerprints()
+        # Attribute values change the fingerprints of dependants only.
+        changed = self._fingerprints(aircraft_info={'Family': 'B737'})
+        self.assertEqual(changed['Brakes'], fingerprints['Brakes'])
+        self.assertNotEqual(changed['Doubled'], fingerprints['Doubled'])
+        self.assertNotEqual(changed['Quadrupled'],
+                            fingerprints['Quadrupled'])
+        # Availability of LFL parameters.
+        changed = self._fingerprints(lfl_params=[])
+        self.assertNotEqual(changed['Brakes'], fingerprints['Brakes'])
+        # LFL parameters are not fingerprinted as derived nodes.
+        self.assertFalse('Doubled' in
+                         self._fingerprints(lfl_params=['Raw1', 'Doubled']))
+
+    def test_node_fingerprints_source(self):
+        fingerprints = self._fingerprints()
+        from analysis_engine import dependency_graph
+        class_hash = dependency_graph._class_hash
+        with mock.patch('analysis_engine.dependency_graph._class_hash') as \
+                _class_hash:
+            _class_hash.side_effect = lambda cls: \
+                'changed' if cls is Doubled else class_hash(cls)
+            changed = self._fingerprints()
+        self.assertEqual(changed['Brakes'], fingerprints['Brakes'])
+        self.assertNotEqual(changed['Doubled'], fingerprints['Doubled'])
+        self.assertNotEqual(changed['Quadrupled'],
+                            fingerprints['Quadrupled'])
+
+    def test_node_fingerprints_module_code(self):
+        from analysis_engine import dependency_graph
+        module_code_hash = dependency_graph._module_code_hash(__name__)
+        self.assertNotEqual(module_code_hash,
+                            dependency_graph._module_hash(__name__))
+        fingerprints = self._fingerprints()
+        # Helper functions and imports outside of the nodes' classes.
+        with mock.patch('analysis_engine.dependency_graph._module_code_hash',
+                        return_value='changed'):
+            changed = self._fingerprints()
+        for name in fingerprints:
+            self.assertNotEqual(changed[name], fingerprints[name])
+        # Packages such as flightdatautilities.
+        with mock.patch('analysis_engine.dependency_graph._package_hash',
+                        return_value='changed'):
+            changed = self._fingerprints()
+        for name in fingerprints:
+            self.assertNotEqual(changed[name], fingerprints[name])
+
+
 class TestGraphAdjacencies(unittest.TestCase):
     def test_graph_adjacencies(self):
         g = nx.DiGraph()
@@ -146,9 +146,7 @@ from analysis_engine.derived_parameters import (
     #ILSLocalizerRange,
     KineticEnergy,
     LatitudePrepared,
-    LatitudeSmoothed,
     LongitudePrepared,
-    LongitudeSmoothed,
     Mach,
     MagneticVariation,
     MagneticVariationFromRunway,
@@ -4356,16 +4354,6 @@ class TestLatitudePrepared(unittest.TestCase):
         self.assertTrue(False, msg='Test not implemented.')
 
 
-class TestLatitudeSmoothed(unittest.TestCase):
-    def test_can_operate(self):
-        combinations = LatitudeSmoothed.get_operational_combinations()
-        self.assertTrue(all('Latitude Prepared' in c for c in combinations))
-
-    @unittest.skip('Test Not Implemented')
-    def test_derive(self):
-        self.assertTrue(False, msg='Test not implemented.')
-
-
 class TestLongitudePrepared(unittest.TestCase):
     @unittest.skip('Test Not Implemented')
     def test_can_operate(self):
@@ -4376,16 +4364,6 @@ class TestLongitudePrepared(unittest.TestCase):
         self.assertTrue(False, msg='Test not implemented.')
 
 
-class TestLongitudeSmoothed(unittest.TestCase):
-    def test_can_operate(self):
-        combinations = LongitudeSmoothed.get_operational_combinations()
-        self.assertTrue(all('Longitude Prepared' in c for c in combinations))
-        
-    @unittest.skip('Test Not Implemented')
-    def test_derive(self):
-        self.assertTrue(False, msg='Test not implemented.')
-
-
 class TestMagneticVariation(unittest.TestCase):
     def test_can_operate(self):
         combinations = MagneticVariation.get_operational_combinations()
@@ -5114,6 +5092,31 @@ class TestCoordinatesSmoothed(TemporaryFileTest, unittest.TestCase):
             test_data_path, 'flight_with_go_around_and_landing.hdf5')
         super(TestCoordinatesSmoothed, self).setUp()
 
+    def test_can_operate(self):
+        combinations = CoordinatesSmoothed.get_operational_combinations()
+        self.assertTrue(all('Latitude Prepared' in c and
+                            'Longitude Prepared' in c for c in combinations))
+        self.assertEqual(CoordinatesSmoothed.names(),
+                         ['Latitude Smoothed', 'Longitude Smoothed'])
+
+    def test_derive(self):
+        lat = P('Latitude Prepared', np.ma.array([10.0, 10.1, 10.2, 10.3]))
+        lon = P('Longitude Prepared', np.ma.array([20.0, 20.1, 20.2, 20.3]))
+        lat_adj = np.ma.array([10.05, 10.15, 10.25, 10.35])
+        lon_adj = np.ma.array([20.05, 20.15, 20.25, 20.35])
+        node = CoordinatesSmoothed()
+        with patch.object(CoordinatesSmoothed, '_adjust_track',
+                          return_value=(lat_adj, lon_adj)) as adjust_track:
+            node.derive(lat, lon, None, None, None, None, None, None, None,
+                        None, None, None, None, None)
+        # The track is adjusted once for both outputs.
+        self.assertEqual(adjust_track.call_count, 1)
+        lat_smoothed, lon_smoothed = node.get_outputs()
+        self.assertEqual(lat_smoothed.name, 'Latitude Smoothed')
+        self.assertEqual(lon_smoothed.name, 'Longitude Smoothed')
+        ma_test.assert_masked_array_approx_equal(lat_smoothed.array, lat_adj)
+        ma_test.assert_masked_array_approx_equal(lon_smoothed.array, lon_adj)
+
     # Skipped by DJ's advice: too many changes withoud updating the test
     @unittest.skip('Test Out Of Date')
     def test__adjust_track_precise(self):
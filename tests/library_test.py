@@ -944,14 +944,73 @@ class TestAlign(unittest.TestCase):
         ma_test.assert_array_almost_equal(result, expected)
         
     def test_align_5_10_20_offset_master(self):
-        master = P('master', np.ma.arange(100.0), frequency=20.0, offset=0.1)
+        master = P('master', np.ma.arange(100.0), frequency=20.0, offset=0.025)
         slave = P('slave', array=[6,5,4,3,2], frequency=1.0, offset=0.0)
-        self.assertRaises(ValueError, align, slave, master)
-        
+        result = align(slave, master)
+        expected = 6.0 - (master.array / 20.0 + 0.025)
+        expected[80:] = np.ma.masked
+        np.testing.assert_array_equal(result.mask, expected.mask)
+        np.testing.assert_array_almost_equal(result.compressed(),
+                                             expected.compressed())
+
     def test_align_5_10_20_offset_slave(self):
         master = P('master', np.ma.arange(10.0), frequency=2.0, offset=0.0)
-        slave = P('slave', array=[6,5,4,3,2], frequency=5.0, offset=0.3)
-        self.assertRaises(ValueError, align, slave, master)
+        slave = P('slave', np.ma.arange(25.0), frequency=5.0, offset=0.1)
+        result = align(slave, master)
+        # Slave value at time t is (t - 0.1) * 5.
+        expected = np.ma.arange(10.0) * 2.5 - 0.5
+        expected[0] = np.ma.masked
+        np.testing.assert_array_equal(result.mask, expected.mask)
+        np.testing.assert_array_almost_equal(result.compressed(),
+                                             expected.compressed())
+
+    def test_align_5_10_20_offset_multi_state(self):
+        master = P('master', np.ma.arange(20.0), frequency=10.0, offset=0.05)
+        slave = M('slave', np.ma.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9]),
+                  values_mapping={x: str(x) for x in range(10)},
+                  frequency=5.0, offset=0.0)
+        result = align(slave, master)
+        # Closest slave sample in time to each master sample. The last two
+        # master samples are after the final slave sample.
+        np.testing.assert_array_equal(result.data[:-2],
+                                      [0, 1, 1, 2, 2, 3, 3, 4, 4, 5,
+                                       5, 6, 6, 7, 7, 8, 8, 9])
+        np.testing.assert_array_equal(result.mask, [False] * 18 + [True] * 2)
+
+    def test_align_kernel_matches_phase_loop(self):
+        def align_loop(slave_array, ws, wm, delta):
+            # Phase by phase implementation of the interpolation.
+            r = wm / float(ws)
+            aligned = np.ma.zeros(int(len(slave_array) * r))
+            for i in range(wm):
+                bracket = (i / r) + delta
+                h = int(floor(bracket))
+                b = bracket - h
+                for period in range(len(slave_array) // ws):
+                    lower = period * ws + h
+                    index = period * wm + i
+                    if lower < 0 or lower + 1 >= len(slave_array):
+                        aligned[index] = np.ma.masked
+                    else:
+                        aligned[index] = (1 - b) * slave_array[lower] + \
+                            b * slave_array[lower + 1]
+            return aligned
+
+        np.random.seed(2)
+        array = np.ma.array(np.random.normal(size=160))
+        array[np.random.randint(0, 160, 20)] = np.ma.masked
+        for slave_hz, slave_offset, master_hz, master_offset in (
+                (4, 0.1, 1, 0.7), (1, 0.5, 8, 0.0), (2, 0.0, 8, 0.1),
+                (8, 0.05, 2, 0.2), (5, 0.1, 10, 0.0), (20, 0.01, 4, 0.2)):
+            slave = P('slave', array, frequency=slave_hz,
+                      offset=slave_offset)
+            master = P('master', frequency=master_hz, offset=master_offset)
+            result = align(slave, master)
+            expected = align_loop(array, slave_hz, master_hz,
+                                  (master_offset - slave_offset) * slave_hz)
+            np.testing.assert_array_equal(result.mask, expected.mask)
+            np.testing.assert_array_almost_equal(result.compressed(),
+                                                 expected.compressed())
 
     def test_align_multi_state_5_10(self):
         first = P(frequency=10, offset=0.0,
@@ -2999,6 +3058,38 @@ class TestHysteresis(unittest.TestCase):
         np.testing.assert_array_equal(data.data, hysteresis(data,0).data)
         self.assertRaises(ValueError, hysteresis, data, -3)        
 
+    def test_hysteresis_matches_loop(self):
+        def hysteresis_loop(array, hysteresis):
+            # Element by element implementation of the two pass algorithm.
+            quarter_range = hysteresis / 4.0
+            notmasked = np.ma.where(array.mask == False)[0]
+            half_done = np.zeros(len(array))
+            result = np.zeros(len(array))
+            old = array[notmasked[0]]
+            for indices, source, dest in ((notmasked, array, half_done),
+                                          (notmasked[::-1], half_done, result)):
+                for index in indices:
+                    new = source[index]
+                    if new - old > quarter_range:
+                        old = new - quarter_range
+                    elif new - old < -quarter_range:
+                        old = new + quarter_range
+                    dest[index] = old
+            return np.ma.array(result, mask=array.mask)
+
+        np.random.seed(1)
+        data = np.ma.array(np.cumsum(np.random.normal(size=5000)))
+        data[np.random.randint(0, 5000, 500)] = np.ma.masked
+        for threshold in (0.5, 3, 50):
+            ma_test.assert_masked_array_equal(hysteresis(data, threshold),
+                                              hysteresis_loop(data, threshold))
+
+    def test_hysteresis_integer_array(self):
+        data = np.ma.array([0,1,2,1,0,-1,5,6,7,0])
+        result = hysteresis(data,1)
+        np.testing.assert_array_equal(result.data,[0.25,1.,1.5,1.,0.,
+                                                   -0.5,5.,6.,6.5,0.25])
+
     """
     Hysteresis may need to be speeded up, in which case this test can be
     reinstated.
@@ -3150,6 +3241,33 @@ class TestIndexAtValue(unittest.TestCase):
         self.assertEqual(index_at_value(array,2.5, slice(0,3), endpoint='closing'), None)
 
 
+class TestIndexAtValues(unittest.TestCase):
+    def test_index_at_values(self):
+        array = np.ma.array([0, 2, 4, 3, 5, 8, 6, 6, 1, 0], dtype=float)
+        array[6] = np.ma.masked
+        thresholds = [3, 0, 7, 4.5, 9, 6, 1.5]
+        for _slice in (slice(None), slice(1, 9), slice(None, None, -1),
+                       slice(8, 2, -1)):
+            for endpoint in ('exact', 'closing', 'nearest', 'first_closing'):
+                self.assertEqual(
+                    index_at_values(array, thresholds, _slice, endpoint),
+                    [index_at_value(array, t, _slice, endpoint)
+                     for t in thresholds])
+        self.assertEqual(index_at_values(array, [3, 7, 9]),
+                         [1.5, 4 + 2.0 / 3, None])
+        backwards = index_at_values(array, [3, 7], slice(None, None, -1))
+        self.assertAlmostEqual(backwards[0], 7.6)
+        self.assertAlmostEqual(backwards[1], 5 - 1.0 / 3)
+
+    def test_index_at_values_no_range(self):
+        array = np.ma.arange(10)
+        self.assertEqual(index_at_values(array, [5, 6], slice(4, 4)),
+                         [None, None])
+        self.assertEqual(index_at_values(array, []), [])
+        self.assertRaises(ValueError, index_at_values, array, [5],
+                          slice(None, None, 2))
+
+
 class TestIndexClosestValue(unittest.TestCase):
     def test_index_closest_value(self):
         array = np.ma.array([1, 2, 3, 4, 5, 4, 3])
@@ -3368,6 +3486,93 @@ class TestInterpolateParams(unittest.TestCase):
 """
 
 
+class TestIntervalSet(unittest.TestCase):
+    def test_init(self):
+        intervals = IntervalSet([20, 0, 5, 12, 40], [30, 6, 10, 12, 41])
+        # Overlapping and adjacent intervals are merged, empty are removed.
+        self.assertEqual(intervals.to_slices(),
+                         [slice(0, 10), slice(20, 30), slice(40, 41)])
+        self.assertRaises(ValueError, IntervalSet, [1, 2], [3])
+
+    def test_from_slices(self):
+        intervals = IntervalSet.from_slices([slice(None, 5), None,
+                                             slice(12, 7, -1),
+                                             slice(20.5, None)])
+        self.assertEqual(intervals.to_slices(),
+                         [slice(None, 5), slice(8, 13), slice(20.5, None)])
+        self.assertEqual(list(intervals), intervals.to_slices())
+        self.assertEqual(IntervalSet.from_slices([]), IntervalSet())
+        self.assertRaises(ValueError, IntervalSet.from_slices,
+                          [slice(0, 10, 2)])
+
+    def test_from_mask(self):
+        array = np.ma.array([0, 1, 1, 0, 1, 0, 1, 1],
+                            mask=[0, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(IntervalSet.from_mask(array == 1).to_slices(),
+                         runs_of_ones(array))
+        self.assertEqual(IntervalSet.from_unmasked(array).to_slices(),
+                         np.ma.clump_unmasked(array))
+        self.assertEqual(IntervalSet.from_mask(np.zeros(5, dtype=bool)),
+                         IntervalSet())
+
+    def test_union(self):
+        a = IntervalSet.from_slices([slice(10, 13), slice(16, 25)])
+        b = IntervalSet.from_slices([slice(20, 31)])
+        c = IntervalSet.from_slices([slice(None, 4)])
+        self.assertEqual((a | b).to_slices(), [slice(10, 13), slice(16, 31)])
+        self.assertEqual(a.union(b, c).to_slices(),
+                         [slice(None, 4), slice(10, 13), slice(16, 31)])
+
+    def test_intersection(self):
+        a = IntervalSet.from_slices([slice(2, 5), slice(7, None)])
+        b = IntervalSet.from_slices([slice(3, 9), slice(12, 14)])
+        self.assertEqual((a & b).to_slices(),
+                         [slice(3, 5), slice(7, 9), slice(12, 14)])
+        # Adjacent intervals do not intersect.
+        self.assertEqual(a & IntervalSet([5], [7]), IntervalSet())
+
+    def test_complement(self):
+        intervals = IntervalSet.from_slices([slice(10, 13), slice(16, 25)])
+        self.assertEqual(intervals.complement().to_slices(), [slice(13, 16)])
+        self.assertEqual(intervals.complement(begin=2, end=18).to_slices(),
+                         [slice(2, 10), slice(13, 16)])
+        self.assertEqual(IntervalSet().complement().to_slices(),
+                         [slice(None, None)])
+
+    def test_difference(self):
+        a = IntervalSet.from_slices([slice(0, 20), slice(30, 40)])
+        b = IntervalSet.from_slices([slice(5, 10), slice(35, None)])
+        self.assertEqual((a - b).to_slices(),
+                         [slice(0, 5), slice(10, 20), slice(30, 35)])
+        self.assertEqual(IntervalSet() - b, IntervalSet())
+
+    def test_remove_small(self):
+        intervals = IntervalSet.from_slices([slice(0, 10), slice(12, 13),
+                                             slice(20, 30)])
+        self.assertEqual(intervals.remove_small_gaps(count=3).to_slices(),
+                         [slice(0, 13), slice(20, 30)])
+        self.assertEqual(intervals.remove_small_gaps(time_limit=4, hz=2),
+                         IntervalSet([0], [30]))
+        self.assertEqual(intervals.remove_small_intervals(count=5).to_slices(),
+                         [slice(0, 10), slice(20, 30)])
+        self.assertEqual(intervals.durations(hz=2).tolist(), [5, 0.5, 5])
+
+    def test_shift(self):
+        intervals = IntervalSet.from_slices([slice(None, 5), slice(8, 10)])
+        self.assertEqual(intervals.shift(2.5).to_slices(),
+                         [slice(None, 7.5), slice(10.5, 12.5)])
+
+    def test_overlaps_contains(self):
+        a = IntervalSet.from_slices([slice(2, 5), slice(8, 10)])
+        self.assertTrue(a.overlaps(IntervalSet([4], [6])))
+        self.assertFalse(a.overlaps(IntervalSet([5], [8])))
+        self.assertEqual(a.contains(np.arange(11)).tolist(),
+                         [False, False, True, True, True, False, False,
+                          False, True, True, False])
+        self.assertTrue(a.contains(4.5))
+        self.assertFalse(IntervalSet().contains(4))
+
+
 class TestIsIndexWithinSlice(unittest.TestCase):
     def test_is_index_within_slice(self):
         self.assertTrue(is_index_within_slice(1, slice(0,2)))
@@ -4838,6 +5043,22 @@ class TestRepairMask(unittest.TestCase):
         self.assertFalse(np.ma.is_masked(res[8]))
         self.assertFalse(np.ma.is_masked(res[9]))
 
+    def test_repair_mask_many_sections(self):
+        array = np.ma.arange(20, dtype=float) ** 2
+        array[[0, 1, 4, 7, 8, 9, 15, 19]] = np.ma.masked
+        res = repair_mask(array.copy(), repair_duration=2)
+        np.testing.assert_array_equal(res.mask, [True, True] + [False] * 5 +
+                                      [True] * 3 + [False] * 9 + [True])
+        self.assertEqual(res[4], (9 + 25) / 2.0)
+        self.assertEqual(res[15], (196 + 256) / 2.0)
+        res = repair_mask(array.copy(), extrapolate=True, repair_duration=None)
+        self.assertFalse(np.ma.is_masked(res))
+        np.testing.assert_array_equal(res[:2], [4, 4])
+        np.testing.assert_array_equal(res[7:10], [52, 68, 84])
+        self.assertEqual(res[19], 324)
+        self.assertRaises(ValueError, repair_mask, array.copy(),
+                          repair_duration=2, raise_duration_exceedance=True)
+
 
 class TestResample(unittest.TestCase):
     def test_resample_upsample(self):
@@ -6734,6 +6955,29 @@ class TestValueAtTime(unittest.TestCase):
         self.assertEquals (value_at_time(array, 2.0, 0.2, 1.0), None)
 
 
+class TestValuesAtTime(unittest.TestCase):
+
+    def test_values_at_time_matches_value_at_time(self):
+        array = np.ma.arange(10) * 1.5 + 7.4
+        array[[1, 2, 5, 9]] = np.ma.masked
+        times = [-1.0, 0.0, 0.2, 0.45, 1.0, 1.2, 2.05, 3.3, 4.7, 5.2, 6.0,
+                 8.3, 9.9, 12.0]
+        for hz, offset in ((1.0, 0.0), (2.0, 0.2), (0.5, 1.3)):
+            values = values_at_time(array, hz, offset, times)
+            for time_index, value in zip(times, values):
+                expected = value_at_time(array, hz, offset, time_index)
+                if expected is None or expected is np.ma.masked:
+                    self.assertTrue(value is np.ma.masked)
+                else:
+                    self.assertEqual(value, expected)
+
+    def test_values_at_time_unknown(self):
+        values = values_at_time(np.ma.arange(4), 1, 0, [1.5, np.nan])
+        self.assertEqual(values.tolist(), [1.5, None])
+        self.assertEqual(values_at_time(np.ma.array([]), 1, 0, [1.0]).tolist(),
+                         [None])
+
+
 class TestValueAtDatetime(unittest.TestCase):
     @mock.patch('analysis_engine.library.value_at_time')
     def test_value_at_datetime(self, value_at_time):
@@ -0,0 +1,160 @@
+import mock
+import os
+import shutil
+import simplejson
+import sys
+import tempfile
+import types
+import unittest
+
+from analysis_engine import node_registry
+from analysis_engine.node import (
+    A, DerivedParameterNode, MultiOutputParameterNode, NodeManager, P,
+    can_operate_attribute_names, clear_node_metadata)
+from analysis_engine.node_registry import (
+    clear_registries, get_registry, manifest_path, NodeRegistry)
+
+try:
+    # for test cmd line runners
+    import tests.sample_derived_parameters
+    MODULE_NAMES = ['tests.sample_derived_parameters']
+except ImportError:
+    # for IDE test runners
+    MODULE_NAMES = ['sample_derived_parameters']
+
+
+class TestNodeMetadata(unittest.TestCase):
+
+    def test_get_dependency_names(self):
+        class Example(DerivedParameterNode):
+            def derive(self, a=P('A'), b=P('B')):
+                pass
+
+        names = Example.get_dependency_names()
+        self.assertEqual(names, ['A', 'B'])
+        # Modifying the result does not modify the cache.
+        names.append('C')
+        with mock.patch('analysis_engine.node.get_param_kwarg_names') as get:
+            self.assertEqual(Example.get_dependency_names(), ['A', 'B'])
+        self.assertFalse(get.called)
+
+    def test_can_operate_attribute_names(self):
+        class Example(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, family=A('Family'),
+                            series=A('Series')):
+                return True
+
+            def derive(self, a=P('A')):
+                pass
+
+        self.assertEqual(can_operate_attribute_names(Example),
+                         ['Family', 'Series'])
+
+        class Invalid(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, a=P('A')):
+                return True
+
+            def derive(self, a=P('A')):
+                pass
+
+        self.assertRaises(TypeError, can_operate_attribute_names, Invalid)
+
+        mgr = NodeManager({}, 10, ['A'], [], [], {'Example': Example},
+                          {'Family': 'B737'}, {})
+        with mock.patch.object(Example, 'can_operate') as can_operate:
+            mgr.operational('Example', ['A'])
+        can_operate.assert_called_once_with(['A'], A('Family', 'B737'), None)
+
+
+class TestNodeRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        clear_registries()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        clear_registries()
+
+    def test_build(self):
+        registry = NodeRegistry.build(MODULE_NAMES)
+        self.assertEqual(len(registry), 13)
+        self.assertTrue('SAT' in registry)
+        meta = registry.metadata['SAT']
+        self.assertEqual(meta.class_name, 'SAT')
+        self.assertEqual(meta.node_type, 'DerivedParameterNode')
+        self.assertEqual(meta.dependencies,
+                         ['TAT', 'Indicated Airspeed', 'Pressure Altitude'])
+        self.assertEqual(meta.attributes, [])
+        self.assertEqual(set(registry.module_hashes), set(MODULE_NAMES))
+        derived_nodes = registry.derived_nodes()
+        self.assertEqual(derived_nodes['SAT'], registry['SAT'])
+        derived_nodes.clear()
+        self.assertEqual(len(registry), 13)
+
+    def test_build_multi_output(self):
+        module = types.ModuleType('multi_output_nodes')
+
+        class Coordinates(MultiOutputParameterNode):
+            OUTPUTS = ('Latitude Example', 'Longitude Example')
+
+            def derive(self, lat=P('Latitude'), lon=P('Longitude')):
+                pass
+
+        Coordinates.__module__ = module.__name__
+        module.Coordinates = Coordinates
+        with mock.patch.dict(sys.modules, {module.__name__: module}):
+            registry = NodeRegistry.build([module.__name__])
+        # Registered as each of its outputs.
+        self.assertEqual(registry.derived_nodes(),
+                         {'Latitude Example': Coordinates,
+                          'Longitude Example': Coordinates})
+        self.assertEqual(registry.metadata['Longitude Example'].dependencies,
+                         ['Latitude', 'Longitude'])
+
+    def test_save_load(self):
+        registry = NodeRegistry.build(MODULE_NAMES)
+        path = os.path.join(self.cache_dir, 'registry.json')
+        registry.save(path)
+        clear_node_metadata()
+        with mock.patch('analysis_engine.node.get_param_kwarg_names') as get:
+            loaded = NodeRegistry.load(path, MODULE_NAMES)
+            self.assertEqual(loaded.nodes, registry.nodes)
+            self.assertEqual(loaded.metadata, registry.metadata)
+            # Metadata of each node is not inspected again.
+            self.assertEqual(loaded['SAT'].get_dependency_names(),
+                             ['TAT', 'Indicated Airspeed', 'Pressure Altitude'])
+        self.assertFalse(get.called)
+        # Different modules.
+        self.assertEqual(NodeRegistry.load(path, ['analysis_engine.flight_phase']),
+                         None)
+        # Module source has changed.
+        with open(path) as fh:
+            manifest = simplejson.load(fh)
+        manifest['module_hashes'][MODULE_NAMES[0]] = 'changed'
+        with open(path, 'w') as fh:
+            simplejson.dump(manifest, fh)
+        self.assertEqual(NodeRegistry.load(path, MODULE_NAMES), None)
+
+    def test_get_registry(self):
+        registry = get_registry(MODULE_NAMES, cache_dir=self.cache_dir)
+        self.assertTrue(os.path.exists(
+            manifest_path(MODULE_NAMES, self.cache_dir)))
+        # Kept in memory.
+        self.assertTrue(get_registry(MODULE_NAMES) is registry)
+        # Loaded from the manifest by other processes.
+        clear_registries()
+        with mock.patch.object(NodeRegistry, 'build') as build:
+            loaded = get_registry(MODULE_NAMES, cache_dir=self.cache_dir)
+        self.assertFalse(build.called)
+        self.assertEqual(loaded.nodes, registry.nodes)
+        # Built again once a module is reloaded.
+        with mock.patch.object(node_registry.NodeRegistry, 'is_current',
+                               return_value=False):
+            self.assertFalse(get_registry(MODULE_NAMES) is loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
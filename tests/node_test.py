@@ -1,3 +1,4 @@
+import copy
 import mock
 import numpy as np
 import os
@@ -7,8 +8,10 @@ from datetime import datetime
 from inspect import ArgSpec
 from random import shuffle
 
-from analysis_engine.library import min_value, max_value
+from analysis_engine.library import (find_edges_on_state_change,
+                                     min_value, max_value)
 from analysis_engine.node import (
+    AlignedParameterCache,
     ApproachItem,
     ApproachNode,
     Attribute,
@@ -19,10 +22,11 @@ from analysis_engine.node import (
     FormattedNameNode,
     Node, NodeManager,
     Parameter, P,
+    MultiOutputParameterNode,
     MultistateDerivedParameterNode, M,
     load,
     powerset,
-    SectionNode,
+    S, SectionNode,
     Section,
     _calculate_offset,
 )
@@ -49,6 +53,89 @@ def _get_mock_params():
     param2.get_aligned.return_value = 2
     return param1, param2
 
+class TestAlignedParameterCache(unittest.TestCase):
+    def test_get_aligned(self):
+        cache = AlignedParameterCache(1024 * 1024)
+        param = P('Altitude AAL', np.ma.arange(10), frequency=1, offset=0)
+        master = P('Master', frequency=2, offset=0)
+        aligned = cache.get_aligned(param, master)
+        self.assertEqual(aligned.frequency, 2)
+        self.assertEqual(aligned.offset, 0)
+        self.assertEqual(aligned.array.tolist(),
+                         param.get_aligned(master).array.tolist())
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(len(cache), 1)
+        # Modifying the returned array does not affect the cache.
+        aligned.array[:] = 0
+        aligned = cache.get_aligned(param, master)
+        self.assertEqual(aligned.array.tolist()[:4], [0, 0.5, 1, 1.5])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_get_aligned_not_cached(self):
+        cache = AlignedParameterCache(1024 * 1024)
+        param = P('Altitude AAL', np.ma.arange(10), frequency=2, offset=0.1)
+        # Already aligned.
+        aligned = cache.get_aligned(param, P('Master', frequency=2,
+                                             offset=0.1))
+        self.assertEqual(aligned.array.tolist(), range(10))
+        self.assertEqual(len(cache), 0)
+        # Not a parameter.
+        attribute = Attribute('Attribute', 1)
+        self.assertEqual(cache.get_aligned(attribute, param), attribute)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_get_aligned_multistate(self):
+        cache = AlignedParameterCache(1024 * 1024)
+        mapping = {0: 'Up', 1: 'Down'}
+        param = M('Gear Down', np.ma.array([0, 1, 1, 0]),
+                  values_mapping=mapping)
+        master = P('Master', frequency=2, offset=0)
+        cache.get_aligned(param, master)
+        aligned = cache.get_aligned(param, master)
+        self.assertIsInstance(aligned, MultistateDerivedParameterNode)
+        self.assertEqual(aligned.values_mapping, mapping)
+        self.assertEqual(aligned.array.raw.tolist(),
+                         param.get_aligned(master).array.raw.tolist())
+        self.assertEqual(cache.hits, 1)
+
+    def test_eviction(self):
+        param1 = P('Param 1', np.ma.arange(10), frequency=1, offset=0)
+        param2 = P('Param 2', np.ma.arange(10), frequency=1, offset=0)
+        master = P('Master', frequency=2, offset=0)
+        array_bytes = AlignedParameterCache._array_bytes(
+            param1.get_aligned(master).array)
+        cache = AlignedParameterCache(array_bytes * 1.5)
+        cache.get_aligned(param1, master)
+        cache.get_aligned(param2, master)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size, array_bytes)
+        # Param 1 was evicted as it was least recently used.
+        cache.get_aligned(param2, master)
+        cache.get_aligned(param1, master)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        # Arrays larger than the cache are not stored.
+        cache = AlignedParameterCache(array_bytes / 2)
+        cache.get_aligned(param1, master)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_get_derived(self):
+        class Example(DerivedParameterNode):
+            def derive(self, a=P('a'), b=P('b')):
+                self.array = a.array + b.array
+        cache = AlignedParameterCache(1024 * 1024)
+        a = P('a', np.ma.arange(8), frequency=2, offset=0)
+        b = P('b', np.ma.arange(4), frequency=1, offset=0)
+        node = Example().get_derived([a, b], aligned_cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        node = Example().get_derived([a, b], aligned_cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(node.array.tolist()[:6],
+                         [0, 1.5, 3, 4.5, 6, 7.5])
+
+
 class TestCalculateOffset(unittest.TestCase):
     tests = (
         #(in freq, offset),(out freq, offset)
@@ -834,6 +921,41 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_longest(), node[1])
         self.assertEqual(node.get_longest(within_slice=slice(0, 8)), node[0])
 
+    def test_section_index(self):
+        node = SectionNode(items=[Section('A', slice(10, 20), 10, 20),
+                                  Section('B', slice(0, 50), 0, 50),
+                                  Section('A', slice(30, 40), 30, 40),
+                                  Section('B', slice(10, 15), 10, 15)])
+        self.assertEqual(node.get(containing_index=12),
+                         [node[0], node[1], node[3]])
+        self.assertEqual(node.get(containing_index=45), [node[1]])
+        self.assertEqual(node.get(within_slice=slice(25, 45), within_use='any'),
+                         [node[1], node[2]])
+        self.assertEqual(node.get(within_slice=slice(15, 5, -1),
+                                  within_use='stop'), [node[3]])
+        self.assertEqual(node.get(name='A', within_slice=slice(5, 25)),
+                         [node[0]])
+        self.assertEqual(node.get_surrounding(15), [node[0], node[1], node[3]])
+        # Sections with equal starts are ordered as within the list.
+        self.assertEqual(node.get_ordered_by_index(),
+                         [node[1], node[0], node[3], node[2]])
+        self.assertTrue(node.get_first(first_by='start', name='A') is node[0])
+        self.assertTrue(node.get_last(last_by='start') is node[2])
+        self.assertTrue(node.get_next(10) is node[2])
+        self.assertTrue(node.get_previous(30) is node[3])
+        self.assertTrue(node.get_previous(30, use='start') is node[3])
+        # Rebuilt once the list is modified.
+        node.create_section(slice(22, 25), name='C')
+        self.assertEqual(node.get_next(10), node[4])
+        node.pop()
+        self.assertEqual(node.get_next(10), node[2])
+        # Not copied.
+        self.assertEqual(copy.deepcopy(node)._item_index, None)
+        # Sections with None slice bounds are filtered without the index.
+        node.create_section(slice(None, 5), name='C')
+        self.assertEqual(node.get(containing_index=3), [node[1], node[4]])
+        self.assertEqual(node.get_surrounding(45), [node[1]])
+
 
 class TestFormattedNameNode(unittest.TestCase):
     def setUp(self):
@@ -1074,6 +1196,49 @@ class TestFormattedNameNode(unittest.TestCase):
         previous_kti = kti_node.get_previous(40, frequency=4)
         self.assertEqual(previous_kti, KeyTimeInstance(2, 'Slowest'))
 
+    def test_name_set(self):
+        self.assertEqual(self.speed_class.name_set(),
+                         frozenset(['Slowest', 'Fast', 'Warp 10']))
+        with mock.patch.object(self.speed_class, 'names') as names:
+            self.speed_class.name_set()
+        self.assertFalse(names.called)
+        # Recreated once NAME_VALUES change.
+        with mock.patch.dict(self.speed_class.NAME_VALUES,
+                             {'speed': ['Slow']}):
+            self.assertEqual(self.speed_class.name_set(), frozenset(['Slow']))
+            self.assertTrue(self.speed_class()._validate_name('Slow'))
+        self.assertFalse(self.speed_class()._validate_name('Slow'))
+
+    def test_item_index(self):
+        kti_node = self.speed_class(items=[KeyTimeInstance(12, 'Slowest'),
+                                           KeyTimeInstance(50, 'Fast'),
+                                           KeyTimeInstance(2, 'Slowest'),
+                                           KeyTimeInstance(50, 'Slowest')])
+        self.assertEqual(kti_node.get_next(35), kti_node[1])
+        # Items with equal indices are ordered as within the list.
+        self.assertTrue(kti_node.get_last() is kti_node[1])
+        self.assertTrue(kti_node.get_previous(60) is kti_node[3])
+        self.assertEqual(kti_node.get_ordered_by_index(),
+                         [kti_node[2], kti_node[0], kti_node[1], kti_node[3]])
+        self.assertEqual(kti_node.get(within_slice=slice(50, 12, -1)),
+                         [kti_node[1], kti_node[3]])
+        self.assertEqual(kti_node.get(within_slices=[slice(None, 3),
+                                                     slice(10, 20)]),
+                         [kti_node[0], kti_node[2]])
+        # Rebuilt once the list is modified.
+        kti_node.append(KeyTimeInstance(40, 'Fast'))
+        self.assertEqual(kti_node.get_next(35), kti_node[4])
+        del kti_node[4]
+        self.assertEqual(kti_node.get_next(35), kti_node[1])
+        kti_node[1:2] = []
+        self.assertEqual(kti_node.get_next(35, name='Fast'), None)
+        # Not copied.
+        self.assertEqual(copy.deepcopy(kti_node)._item_index, None)
+        # Items without valid indices are filtered without the index.
+        kti_node.append(KeyTimeInstance(float('nan'), 'Fast'))
+        self.assertEqual(kti_node.get_first(name='Slowest'), kti_node[1])
+        self.assertEqual(kti_node.get_next(35), kti_node[2])
+
     def test_initial_items_storage(self):
         node = FormattedNameNode(['a', 'b', 'c'])
         self.assertEqual(list(node), ['a', 'b', 'c'])
@@ -1421,6 +1586,50 @@ class TestKeyPointValueNode(unittest.TestCase):
                          [KeyPointValue(index=1.95, value=12.5, name='Speed at 1000ft'),
                           KeyPointValue(index=5.45, value=12.5, name='Speed at 1000ft')])
 
+    def test_get_derived_windows(self):
+        class AccelerationMax(KeyPointValueNode):
+            windows = ('Airborne',)
+            window_padding = 2
+
+            def derive(self, acc=P('Acceleration'), airborne=S('Airborne'),
+                       touchdowns=KTI('Touchdown')):
+                airborne = airborne or []
+                self.create_kpvs_within_slices(acc.array, airborne, max_value)
+                self.create_kpv_from_slices(acc.array, airborne, min_value)
+                for touchdown in touchdowns:
+                    self.create_kpv(touchdown.index,
+                                    acc.array[int(touchdown.index)])
+                # Dependencies are restricted to the windows.
+                derived_lengths.append(len(acc.array))
+
+        array = np.ma.arange(200, dtype=float) % 37
+        acc = P('Acceleration', array, frequency=4, offset=0.1)
+        airborne = S('Airborne', frequency=1)
+        airborne.create_sections([slice(5, 15), slice(30, 40)])
+        touchdowns = KTI('Touchdown', items=[KeyTimeInstance(14, 'Touchdown'),
+                                             KeyTimeInstance(25, 'Touchdown')])
+        derived_lengths = []
+        node = AccelerationMax()
+        node.get_derived([acc, airborne, touchdowns])
+        # Windows of 3-17 and 28-42 seconds are joined.
+        self.assertEqual(derived_lengths, [(14 + 14) * 4])
+        self.assertEqual(node.frequency, 4)
+        self.assertEqual(node.offset, 0.1)
+        self.assertEqual(len(node), 4)
+        # Equivalent to deriving over the whole flight apart from the
+        # touchdown outside of the windows.
+        AccelerationMax.windows = ()
+        whole = AccelerationMax()
+        whole.get_derived([acc, airborne, touchdowns])
+        self.assertEqual(derived_lengths[-1], 200)
+        self.assertEqual(node, whole[:4])
+        self.assertEqual(node[1].index, 147)
+        self.assertAlmostEqual(whole[4].index, 99.6)
+        # Not derived within windows if the phase is not available.
+        AccelerationMax.windows = ('Airborne',)
+        AccelerationMax().get_derived([acc, None, touchdowns])
+        self.assertEqual(derived_lengths[-1], 200)
+
     def test_get_min(self):
         # Test empty Node first.
         empty_kpv_node = KeyPointValueNode()
@@ -1933,6 +2142,42 @@ class TestDerivedParameterNode(unittest.TestCase):
 
 
 
+class TestMultiOutputParameterNode(unittest.TestCase):
+    def setUp(self):
+        class Coordinates(MultiOutputParameterNode):
+            OUTPUTS = ('Latitude Example', 'Longitude Example')
+            units = 'deg'
+
+            def derive(self, lat=P('Latitude'), lon=P('Longitude')):
+                self.set_output('Latitude Example', lat.array + 1)
+                self.set_output('Longitude Example', lon.array + 2,
+                                units='rad')
+        self.node_class = Coordinates
+
+    def test_names(self):
+        self.assertEqual(self.node_class.names(),
+                         ['Latitude Example', 'Longitude Example'])
+
+    def test_get_outputs(self):
+        node = self.node_class()
+        # Outputs which have not been set have no array.
+        self.assertEqual([o.array for o in node.get_outputs()], [None, None])
+        node.get_derived([P('Latitude', np.ma.arange(4), frequency=2,
+                            offset=0.25),
+                          P('Longitude', np.ma.arange(4), frequency=2,
+                            offset=0.25)])
+        lat, lon = node.get_outputs()
+        self.assertEqual(lat.name, 'Latitude Example')
+        self.assertEqual(lat.array.tolist(), [1, 2, 3, 4])
+        self.assertEqual((lat.frequency, lat.offset), (2, 0.25))
+        self.assertEqual(lat.units, 'deg')
+        self.assertEqual(lon.name, 'Longitude Example')
+        self.assertEqual(lon.array.tolist(), [2, 3, 4, 5])
+        self.assertEqual(lon.units, 'rad')
+        self.assertRaises(ValueError, node.set_output, 'Altitude',
+                          np.ma.arange(4))
+
+
 class TestMultistateDerivedParameterNode(unittest.TestCase):
     def setUp(self):
         self.hdf_path = os.path.join(test_data_path, 'test_node.hdf')
@@ -2062,7 +2307,72 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         expected = [np.ma.masked, 'two', 'one', 'two', 'one', 'two', 'one', 'two', 'one', np.ma.masked]
         self.assertEqual(list(res.array), expected)
         os.remove(dest)
-        
+
+    def test_state_queries(self):
+        mapping = {0: 'Up', 1: 'Mid', 2: 'Down'}
+        array = np.ma.array([0, 0, 1, 1, 1, 2, 2, 0, 0, 0, 1, 2],
+                            mask=[0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0])
+        node = M('Lever', array, values_mapping=mapping)
+        self.assertEqual(node.slices_of_state('Up'),
+                         [slice(0, 2), slice(7, 8), slice(9, 10)])
+        self.assertEqual(node.slices_of_state('Up', min_samples=1),
+                         [slice(0, 2)])
+        self.assertEqual(node.slices_of_state(['Mid', 'Down']),
+                         [slice(2, 7), slice(10, 12)])
+        self.assertEqual(node.slices_not_state('Up'),
+                         [slice(2, 7), slice(10, 12)])
+        self.assertEqual(list(node.slices_of_runs()),
+                         [('Up', [slice(0, 2), slice(7, 8), slice(9, 10)]),
+                          ('Mid', [slice(2, 5), slice(10, 11)]),
+                          ('Down', [slice(5, 7), slice(11, 12)])])
+        self.assertEqual(node.edges_on_state_change('Mid'), [1.5, 9.5])
+        self.assertEqual(
+            node.edges_on_state_change('Down', change='leaving'), [6.5])
+        self.assertEqual(node.edges_on_state_change(
+            'Mid', change='entering_and_leaving', phase=[slice(3, 11)]),
+            [4.5, 9.5])
+        self.assertEqual(node.transitions('Up', 'Mid'), [1.5, 9.5])
+        self.assertEqual(node.transitions('Down', 'Up'), [6.5])
+        self.assertRaises(KeyError, node.slices_of_state, 'Unknown')
+        # The index is built once and rebuilt for a new array.
+        runs = node.get_runs()
+        self.assertTrue(node.get_runs() is runs)
+        node.array = np.ma.array([2, 2, 0])
+        self.assertEqual(node.slices_of_state('Down'), [slice(0, 2)])
+        self.assertFalse(node.get_runs() is runs)
+        # The index is not pickled.
+        self.assertFalse('_state_runs' in node.__getstate__())
+
+    def test_edges_on_state_change_index(self):
+        mapping = {0: 'Up', 1: 'Mid', 2: 'Down'}
+        array = np.ma.array([0, 0, 1, 1, 1, 2, 2, 0, 0, 0, 1, 2],
+                            mask=[0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0])
+        node = M('Lever', array, values_mapping=mapping)
+        phases = [None, [slice(3, 11)], [slice(1.5, 10.7)],
+                  [Section('Approach', slice(2.2, None), 2.2, None)],
+                  [slice(-5, -1)]]
+        expected = [
+            [find_edges_on_state_change(state, node.array, change=change,
+                                        phase=phase)
+             for state in mapping.values()
+             for change in ('entering', 'leaving', 'entering_and_leaving')]
+            for phase in phases]
+        # Edges are found from the index of runs without scanning the array.
+        with mock.patch('analysis_engine.node.find_edges_on_state_change') \
+                as find_edges:
+            for phase, phase_expected in zip(phases, expected):
+                self.assertEqual(
+                    [node.edges_on_state_change(state, change=change,
+                                                phase=phase)
+                     for state in mapping.values()
+                     for change in ('entering', 'leaving',
+                                    'entering_and_leaving')],
+                    phase_expected)
+        self.assertFalse(find_edges.called)
+        self.assertEqual(node.edges_on_state_change('Mid',
+                                                    phase=[slice(1.5, 11.7)]),
+                         [2.0, 10.0])
+
 class TestNodeTypeAbbreviation(unittest.TestCase):
     def test_node_type_abbr_attribute(self):
         class NAME(DerivedParameterNode):
@@ -0,0 +1,142 @@
+import numpy as np
+import pytz
+import unittest
+
+from datetime import datetime
+from StringIO import StringIO
+
+from analysis_engine.node import (
+    ApproachItem,
+    Attribute,
+    KeyPointValue,
+    KeyTimeInstance,
+    KeyTimeInstanceNode,
+    Section,
+)
+from analysis_engine.npz_tools import (
+    load_npz,
+    npz_to_nodes,
+    npz_to_process_flight,
+    process_flight_to_npz,
+)
+
+
+START = datetime(2014, 4, 12, 14, 47, 56, 813991, tzinfo=pytz.utc)
+
+PROCESS_FLIGHT = {
+    'approach': {
+        'Approach Information': [ApproachItem(
+            'LANDING', slice(3, 10), airport={'id': 1}, runway={'id': 2},
+            gs_est=slice(4, 8), turnoff=9.5)],
+    },
+    'flight': {
+        'FDR Takeoff Airport': [Attribute('FDR Takeoff Airport',
+                                          {'id': 1, 'code': {'icao': 'EGKK'}})],
+    },
+    'kpv': {
+        'Airspeed Max': [KeyPointValue(12.5, 250.2, 'Airspeed Max',
+                                       slice(10, 20), START, 51.1, -0.2)],
+        'Altitude Max': [
+            KeyPointValue(3, 100, 'Altitude Max'),
+            KeyPointValue(7.25, 35000.5, 'Altitude Max During Cruise',
+                          slice(None, 9.5)),
+        ],
+        'Empty': [],
+    },
+    'kti': {
+        'Altitude When Climbing': [
+            KeyTimeInstance(419.813, '35 Ft Climbing', START, 16.13, -22.88),
+            KeyTimeInstance(450.0, '100 Ft Climbing'),
+        ],
+    },
+    'phases': {
+        'Airborne': [Section('Airborne', slice(10.5, 400.25), 10.5, 400.25),
+                     Section('Airborne', slice(500, None), 500, None)],
+    },
+}
+
+
+class TestNpzTools(unittest.TestCase):
+
+    def _write(self, **kwargs):
+        dest = StringIO()
+        process_flight_to_npz(PROCESS_FLIGHT, dest, **kwargs)
+        dest.seek(0)
+        return dest
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            res = npz_to_process_flight(self._write(compress=compress))
+            self.assertEqual(res, PROCESS_FLIGHT)
+
+    def test_datetime_timezone(self):
+        start = datetime(2014, 4, 12, 15, 47, 56,
+                         tzinfo=pytz.FixedOffset(60))
+        res = dict(PROCESS_FLIGHT, kti={'Start': [
+            KeyTimeInstance(0, 'Start', start)]})
+        dest = StringIO()
+        process_flight_to_npz(res, dest)
+        dest.seek(0)
+        kti = npz_to_process_flight(dest)['kti']['Start'][0]
+        self.assertEqual(kti.datetime, start)
+        self.assertEqual(kti.datetime.tzinfo, pytz.utc)
+
+    def test_round_trip_types(self):
+        res = npz_to_process_flight(self._write())
+        kpv = res['kpv']['Altitude Max'][0]
+        self.assertTrue(isinstance(kpv.index, int))
+        self.assertTrue(isinstance(kpv.value, int))
+        self.assertTrue(isinstance(res['kpv']['Altitude Max'][1].index,
+                                   float))
+        self.assertTrue(isinstance(res['kpv']['Airspeed Max'][0].slice.stop,
+                                   int))
+        phase = res['phases']['Airborne'][1]
+        self.assertTrue(isinstance(phase.slice.start, int))
+        self.assertTrue(isinstance(phase.start_edge, int))
+        self.assertTrue(isinstance(res['phases']['Airborne'][0].slice.start,
+                                   float))
+
+    def test_datetime_naive(self):
+        start = datetime(2014, 4, 12, 15, 47, 56, 813991)
+        res = dict(PROCESS_FLIGHT, kti={'Start': [
+            KeyTimeInstance(0, 'Start', start),
+            KeyTimeInstance(1, 'Start', START)]})
+        dest = StringIO()
+        process_flight_to_npz(res, dest)
+        dest.seek(0)
+        ktis = npz_to_process_flight(dest)['kti']['Start']
+        self.assertEqual(ktis[0].datetime, start)
+        self.assertEqual(ktis[0].datetime.tzinfo, None)
+        self.assertEqual(ktis[1].datetime, START)
+
+    def test_columns(self):
+        results = load_npz(self._write())
+        self.assertEqual(results.node_names('kpv'),
+                         ['Airspeed Max', 'Altitude Max', 'Empty'])
+        columns = results.columns('kpv', 'Altitude Max')
+        self.assertEqual(columns['value'].tolist(), [100, 35000.5])
+        self.assertEqual(
+            results.names('kpv')[columns['name']].tolist(),
+            ['Altitude Max', 'Altitude Max During Cruise'])
+        self.assertTrue(np.isnan(columns['slice_start']).all())
+        self.assertEqual(columns['slice_stop'][1], 9.5)
+        self.assertEqual(len(results.columns('kpv', 'Empty')['index']), 0)
+        self.assertEqual(len(results.columns('kpv')['index']), 3)
+        self.assertRaises(KeyError, results.columns, 'kpv', 'Unknown')
+
+    def test_version(self):
+        dest = StringIO()
+        np.savez(dest, version=np.array('0.0'))
+        dest.seek(0)
+        self.assertEqual(load_npz(dest), None)
+        dest.seek(0)
+        self.assertEqual(npz_to_process_flight(dest), {})
+
+    def test_npz_to_nodes(self):
+        nodes = npz_to_nodes(self._write(), derived_nodes={
+            'Altitude When Climbing': KeyTimeInstanceNode})
+        self.assertEqual(nodes.keys(), ['Altitude When Climbing'])
+        node = nodes['Altitude When Climbing']
+        self.assertTrue(isinstance(node, KeyTimeInstanceNode))
+        self.assertEqual(list(node),
+                         PROCESS_FLIGHT['kti']['Altitude When Climbing'])
@@ -0,0 +1,78 @@
+import numpy as np
+import os
+import unittest
+
+from hdfaccess.parameter import MappedArray
+
+from analysis_engine.node import (
+    DerivedParameterNode,
+    MultistateDerivedParameterNode,
+    P,
+)
+from analysis_engine.parameter_store import ParameterStore
+
+
+class TestParameterStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ParameterStore()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_set_get(self):
+        array = np.ma.arange(10, dtype=float)
+        array[3] = np.ma.masked
+        self.store.set(P('Airspeed', array, frequency=2, offset=0.25))
+        self.assertTrue('Airspeed' in self.store)
+        self.assertEqual(len(self.store), 1)
+        param = self.store.get('Airspeed')
+        self.assertTrue(isinstance(param, DerivedParameterNode))
+        self.assertEqual(param.name, 'Airspeed')
+        self.assertEqual(param.frequency, 2)
+        self.assertEqual(param.offset, 0.25)
+        self.assertTrue(isinstance(param.array.data, np.memmap))
+        self.assertEqual(param.array.tolist(),
+                         [0, 1, 2, None, 4, 5, 6, 7, 8, 9])
+        # Changes are not written to the store.
+        param.array[0] = 100
+        param.array[4] = np.ma.masked
+        self.assertEqual(self.store.get('Airspeed').array.tolist(),
+                         [0, 1, 2, None, 4, 5, 6, 7, 8, 9])
+        self.assertRaises(KeyError, self.store.get, 'Missing')
+
+    def test_set_multistate(self):
+        mapping = {0: 'Up', 1: 'Down'}
+        array = MappedArray([0, 1, 1, 0], mask=[0, 0, 1, 0],
+                            values_mapping=mapping)
+        self.store.set(MultistateDerivedParameterNode(
+            'Gear Down', array, values_mapping=mapping))
+        param = self.store.get('Gear Down')
+        self.assertTrue(isinstance(param, MultistateDerivedParameterNode))
+        self.assertEqual(param.values_mapping, mapping)
+        self.assertEqual(param.array.raw.tolist(), [0, 1, None, 0])
+
+    def test_set_empty(self):
+        self.store.set(P('Empty', np.ma.array([], dtype=float)))
+        self.assertEqual(len(self.store.get('Empty').array), 0)
+
+    def test_set_object(self):
+        self.assertRaises(ValueError, self.store.set,
+                          P('Strings', np.ma.array(['a'], dtype=object)))
+
+    def test_remove_close(self):
+        self.store.set(P('Airspeed', np.ma.arange(10)))
+        param = self.store.get('Airspeed')
+        self.store.set(P('Airspeed', np.ma.arange(5)))
+        self.assertEqual(len(os.listdir(self.store.path)), 1)
+        self.store.remove('Airspeed')
+        self.assertFalse('Airspeed' in self.store)
+        self.assertEqual(os.listdir(self.store.path), [])
+        # Arrays returned before removal remain valid.
+        self.assertEqual(param.array.tolist(), range(10))
+        self.store.close()
+        self.assertFalse(os.path.exists(self.store.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
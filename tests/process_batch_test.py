@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from analysis_engine.process_batch import find_segments, process_flights
+
+
+class TestFindSegments(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for filename in ('flight.001.hdf5',
+                         'flight.002-SEGMENT-GROUND_ONLY.hdf5',
+                         'flight.hdf5', 'flight.001.csv'):
+            open(os.path.join(self.path, filename), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_find_segments(self):
+        self.assertEqual(find_segments(self.path), [
+            {'File': os.path.join(self.path, 'flight.001.hdf5')},
+            {'File': os.path.join(self.path,
+                                  'flight.002-SEGMENT-GROUND_ONLY.hdf5'),
+             'Segment Type': 'GROUND_ONLY'},
+        ])
+        self.assertEqual(
+            find_segments(self.path, 'START_AND_STOP')[0]['Segment Type'],
+            'START_AND_STOP')
+
+
+class TestProcessFlights(unittest.TestCase):
+
+    @patch('analysis_engine.process_batch.get_api_handler')
+    @patch('analysis_engine.process_batch.get_derived_nodes')
+    @patch('analysis_engine.process_batch.process_flight')
+    def test_process_flights(self, process_flight, get_derived_nodes,
+                             get_api_handler):
+        derived_nodes = {'Node': object}
+        get_derived_nodes.return_value = derived_nodes
+
+        def side_effect(segment_info, tail_number, **kwargs):
+            if segment_info['File'] == 'broken.001.hdf5':
+                raise ValueError()
+            return {'flight': tail_number}
+        process_flight.side_effect = side_effect
+        segment_infos = [{'File': 'a.001.hdf5'}, {'File': 'broken.001.hdf5'},
+                         {'File': 'b.001.hdf5', 'Tail Number': 'G-ABCD'}]
+        results = list(process_flights(segment_infos, 'G-FDSL', processes=0,
+                                       requested=['Node']))
+        self.assertEqual([r[:2] for r in results], [
+            (segment_infos[0], {'flight': 'G-FDSL'}),
+            (segment_infos[1], None),
+            (segment_infos[2], {'flight': 'G-ABCD'}),
+        ])
+        self.assertTrue('ValueError' in results[1][2])
+        # Node classes are found once and shared between flights.
+        self.assertEqual(get_derived_nodes.call_count, 1)
+        for args, kwargs in process_flight.call_args_list:
+            self.assertTrue(kwargs['derived_nodes'] is derived_nodes)
+            self.assertEqual(kwargs['requested'], ['Node'])
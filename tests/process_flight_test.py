@@ -1,8 +1,423 @@
+import mock
+import multiprocessing
+import multiprocessing.pool
+import numpy as np
+import sys
+import threading
+import time
+import traceback
 import unittest
 
+from datetime import datetime
+
+from analysis_engine.node import (
+    DerivedParameterNode,
+    KeyPointValue,
+    KeyPointValueNode,
+    KeyTimeInstance,
+    MultiOutputParameterNode,
+    NodeManager,
+    P,
+)
+from analysis_engine.parameter_store import ParameterStore
+from analysis_engine.process_flight import (
+    _timestamp,
+    derive_parameters,
+    geo_locate,
+    ParameterResidency,
+    process_flight,
+)
+from analysis_engine.profiling import NodeProfiler
+
+
+class MockHDF(dict):
+    '''
+    Stores parameters within a dict in place of an HDF file.
+    '''
+    duration = 10
+
+    def __init__(self, *args, **kwargs):
+        super(MockHDF, self).__init__(*args, **kwargs)
+        self.reads = []
+        self.attrs = {}
+        self.lfl_param_names = list(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def get_attr(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def set_attr(self, name, value):
+        self.attrs[name] = value
+
+    def valid_lfl_param_names(self):
+        return self.lfl_param_names
+
+    def get_param(self, name, valid_only=False):
+        self.reads.append(name)
+        return self[name]
+
+    def set_param(self, param):
+        self[param.name] = param
+
+    def valid_param_names(self):
+        return self.keys()
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class Tripled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 3
+
+
+class Summed(DerivedParameterNode):
+    def derive(self, doubled=P('Doubled'), tripled=P('Tripled')):
+        self.array = doubled.array + tripled.array
+
+
+class Multiples(MultiOutputParameterNode):
+    OUTPUTS = ('Doubled', 'Tripled')
+    derived = 0
+
+    def derive(self, raw=P('Raw')):
+        Multiples.derived += 1
+        self.set_output('Doubled', raw.array * 2)
+        self.set_output('Tripled', raw.array * 3)
+
+
+class SummedMax(KeyPointValueNode):
+    def derive(self, summed=P('Summed')):
+        index = np.ma.argmax(summed.array)
+        self.create_kpv(index, summed.array[index])
+
+
+class Broken(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        raise ZeroDivisionError()
+
+
+class Unpicklable(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+        self.lock = threading.Lock()
+
+
+class Slow(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        time.sleep(0.5)
+        self.array = raw.array * 2
+
+
+class TestDeriveParameters(unittest.TestCase):
+
+    def setUp(self):
+        self.derived_nodes = {
+            'Doubled': Doubled,
+            'Tripled': Tripled,
+            'Summed': Summed,
+            'Summed Max': SummedMax,
+        }
+        self.process_order = ['Raw', 'Doubled', 'Tripled', 'Summed',
+                              'Summed Max']
+
+    def _derive(self, **kwargs):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))})
+        node_mgr = NodeManager({}, hdf.duration, ['Raw'], ['Summed Max'], [],
+                               self.derived_nodes, {}, {})
+        ktis, kpvs, sections, approaches, flight_attrs = derive_parameters(
+            hdf, node_mgr, self.process_order, **kwargs)
+        return hdf, node_mgr, kpvs
+
+    def test_derive_parameters(self):
+        hdf, node_mgr, kpvs = self._derive()
+        self.assertEqual(hdf['Summed'].array.tolist(),
+                         range(0, 50, 5))
+        self.assertEqual(kpvs['Summed Max'][0].index, 9)
+        self.assertEqual(kpvs['Summed Max'][0].value, 45)
+        self.assertEqual(node_mgr.hdf_keys,
+                         ['Raw', 'Doubled', 'Tripled', 'Summed'])
+        # Parameters are read from the HDF file once and derived parameters
+        # are kept in memory for their dependants.
+        self.assertEqual(hdf.reads, ['Raw'])
+
+    def test_derive_parameters_workers(self):
+        hdf, node_mgr, kpvs = self._derive(workers=2, worker_type='thread')
+        self.assertEqual(hdf['Summed'].array.tolist(),
+                         range(0, 50, 5))
+        self.assertEqual(kpvs['Summed Max'][0].index, 9)
+        self.assertEqual(kpvs['Summed Max'][0].value, 45)
+        # Dependencies are stored before the nodes which depend upon them.
+        self.assertEqual(node_mgr.hdf_keys[0], 'Raw')
+        self.assertEqual(node_mgr.hdf_keys[-1], 'Summed')
+        self.assertEqual(set(node_mgr.hdf_keys),
+                         set(['Raw', 'Doubled', 'Tripled', 'Summed']))
+
+    def test_derive_parameters_profiler(self):
+        for workers in (0, 2):
+            profiler = NodeProfiler()
+            self._derive(workers=workers, profiler=profiler)
+            self.assertEqual(set(profiler.profiles),
+                             set(['Doubled', 'Tripled', 'Summed',
+                                  'Summed Max']))
+            doubled = profiler['Doubled']
+            self.assertEqual(doubled.node_type, 'DerivedParameterNode')
+            self.assertEqual(profiler['Summed Max'].node_type,
+                             'KeyPointValueNode')
+            self.assertEqual(doubled.nbytes,
+                             (np.ma.arange(10) * 2).nbytes)
+            self.assertEqual(profiler['Summed Max'].nbytes, 0)
+            for profile in profiler:
+                self.assertTrue(profile.wall >= profile.read + profile.write +
+                                profile.align)
+
+    def test_derive_parameters_multi_output(self):
+        self.derived_nodes['Doubled'] = Multiples
+        self.derived_nodes['Tripled'] = Multiples
+        for workers in (0, 2):
+            Multiples.derived = 0
+            hdf, node_mgr, kpvs = self._derive(workers=workers)
+            # Both outputs are stored by deriving the node once.
+            self.assertEqual(Multiples.derived, 1)
+            self.assertEqual(hdf['Doubled'].array.tolist(), range(0, 20, 2))
+            self.assertEqual(hdf['Tripled'].array.tolist(), range(0, 30, 3))
+            self.assertEqual(hdf['Summed'].array.tolist(), range(0, 50, 5))
+            self.assertEqual(kpvs['Summed Max'][0].value, 45)
+            self.assertEqual(hdf.reads, ['Raw'])
+
+    def test_derive_parameters_store(self):
+        for workers in (0, 2):
+            with ParameterStore() as store:
+                hdf, node_mgr, kpvs = self._derive(workers=workers,
+                                                   store=store)
+                self.assertEqual(hdf['Summed'].array.tolist(),
+                                 range(0, 50, 5))
+                self.assertEqual(kpvs['Summed Max'][0].value, 45)
+                self.assertEqual(hdf.reads, ['Raw'])
+                # Parameters are removed once their dependants are derived.
+                self.assertEqual(len(store), 0)
+
+    def test_derive_parameters_workers_raises(self):
+        self.derived_nodes['Doubled'] = Broken
+        for worker_type in ('thread', 'process'):
+            self.assertRaises(ZeroDivisionError, self._derive, workers=2,
+                              worker_type=worker_type)
+        # The traceback of the derive method is kept.
+        try:
+            self._derive(workers=2)
+        except ZeroDivisionError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.assertEqual(frames[-1][2], 'derive')
+
+    def test_derive_parameters_workers_unreported(self):
+        # Results which cannot be pickled are never reported by the pool's
+        # callback.
+        self.derived_nodes['Doubled'] = Unpicklable
+        self.assertRaises(multiprocessing.pool.MaybeEncodingError,
+                          self._derive, workers=2, worker_type='process')
+        self.derived_nodes['Doubled'] = Slow
+        with mock.patch('analysis_engine.settings.DERIVE_WORKER_TIMEOUT',
+                        0.1):
+            self.assertRaises(multiprocessing.TimeoutError, self._derive,
+                              workers=2)
+
+    def test_derive_parameters_unknown_worker_type(self):
+        self.assertRaises(ValueError, self._derive, workers=2,
+                          worker_type='fibre')
+
+
+class TestParameterResidency(unittest.TestCase):
+
+    def setUp(self):
+        self.hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))})
+        self.derived_nodes = {'Doubled': Doubled, 'Tripled': Tripled,
+                              'Summed': Summed}
+        self.residency = ParameterResidency(
+            self.hdf, ['Doubled', 'Tripled', 'Summed'], self.derived_nodes)
+
+    def test_get(self):
+        raw = self.residency.get('Raw')
+        raw.array[0] = 100
+        self.assertEqual(self.residency.get('Raw').array[0], 0)
+        self.assertEqual(self.hdf.reads, ['Raw'])
+        self.assertEqual(self.residency.reads, 1)
+        self.assertTrue('Raw' in self.residency)
+
+    def test_get_invalid(self):
+        self.assertEqual(self.residency.get('Missing'), None)
+        self.assertFalse('Missing' in self.residency)
+
+    def test_release(self):
+        self.residency.get('Raw')
+        self.residency.release(Doubled)
+        self.assertTrue('Raw' in self.residency)
+        self.residency.release(Tripled)
+        self.assertFalse('Raw' in self.residency)
+        self.assertEqual(self.residency.evictions, 1)
+
+    def test_add(self):
+        self.residency.add(P('Doubled', np.ma.arange(10)))
+        self.residency.add(P('Summed', np.ma.arange(10)))
+        self.assertTrue('Doubled' in self.residency)
+        # Nothing depends upon Summed.
+        self.assertFalse('Summed' in self.residency)
+
+    def test_store(self):
+        with ParameterStore() as store:
+            residency = ParameterResidency(
+                self.hdf, ['Doubled', 'Tripled', 'Summed'],
+                self.derived_nodes, store=store)
+            raw = residency.get('Raw')
+            self.assertTrue('Raw' in store)
+            self.assertTrue(isinstance(raw.array.data, np.memmap))
+            raw.array[0] = 100
+            self.assertEqual(residency.get('Raw').array[0], 0)
+            self.assertEqual(self.hdf.reads, ['Raw'])
+            residency.add(P('Doubled', np.ma.arange(10)))
+            self.assertTrue('Doubled' in store)
+            residency.release(Doubled)
+            residency.release(Tripled)
+            self.assertFalse('Raw' in residency)
+            self.assertFalse('Raw' in store)
+            self.assertEqual(residency.evictions, 1)
+
+    def test_store_objects(self):
+        # Arrays of objects cannot be stored, so are kept in memory.
+        self.hdf['Raw'] = P('Raw', np.ma.array(['a'] * 10, dtype=object))
+        with ParameterStore() as store:
+            residency = ParameterResidency(
+                self.hdf, ['Doubled', 'Tripled', 'Summed'],
+                self.derived_nodes, store=store)
+            self.assertEqual(residency.get('Raw').array.tolist(), ['a'] * 10)
+            self.assertFalse('Raw' in store)
+            self.assertTrue('Raw' in residency)
+            residency.add(P('Doubled', np.ma.array(['b'] * 10, dtype=object)))
+            self.assertFalse('Doubled' in store)
+            self.assertEqual(residency.get('Doubled').array.tolist(),
+                             ['b'] * 10)
+            self.assertEqual(self.hdf.reads, ['Raw'])
+
+
+class TestGeoLocate(unittest.TestCase):
+
+    def setUp(self):
+        self.ktis = {'Liftoff': [KeyTimeInstance(0, 'Liftoff'),
+                                 KeyTimeInstance(5.5, 'Liftoff')]}
+        self.kpvs = {'Airspeed Max': [KeyPointValue(2.25, 200,
+                                                    'Airspeed Max')]}
+
+    def test_geo_locate(self):
+        lat = np.ma.arange(10, 30, dtype=float)
+        lat[:4] = np.ma.masked
+        hdf = MockHDF({
+            'Latitude Smoothed': P('Latitude Smoothed', lat, frequency=2),
+            'Longitude Smoothed': P('Longitude Smoothed',
+                                    np.ma.arange(10) * -1.0, offset=0.5),
+        })
+        ktis, kpvs = geo_locate(hdf, self.ktis, self.kpvs)
+        self.assertTrue(ktis is self.ktis)
+        self.assertTrue(kpvs is self.kpvs)
+        liftoffs = ktis['Liftoff']
+        # Masked values at the start of the data are extrapolated.
+        self.assertEqual(liftoffs[0].latitude, 14)
+        self.assertEqual(liftoffs[1].latitude, 21)
+        # Zero is treated as unknown.
+        self.assertEqual(liftoffs[0].longitude, None)
+        self.assertAlmostEqual(liftoffs[1].longitude, -5, places=5)
+        self.assertEqual(kpvs['Airspeed Max'][0].latitude, 14.5)
+        self.assertAlmostEqual(kpvs['Airspeed Max'][0].longitude, -1.75,
+                               places=5)
+        # Parameters within the HDF file are not modified.
+        self.assertEqual(np.ma.count_masked(hdf['Latitude Smoothed'].array),
+                         4)
+
+    def test_geo_locate_missing(self):
+        hdf = MockHDF({'Latitude Smoothed': P('Latitude Smoothed',
+                                              np.ma.arange(10))})
+        self.assertTrue(geo_locate(hdf, self.ktis) is self.ktis)
+        self.assertEqual(self.ktis['Liftoff'][1].latitude, None)
+
+    def test_timestamp(self):
+        start = datetime(2013, 6, 1, 12)
+        ktis, kpvs = _timestamp(start, self.ktis, self.kpvs)
+        self.assertEqual([k.datetime for k in ktis['Liftoff']],
+                         [start, datetime(2013, 6, 1, 12, 0, 5, 500000)])
+        self.assertEqual(kpvs['Airspeed Max'][0].datetime,
+                         datetime(2013, 6, 1, 12, 0, 2, 250000))
+
+
+class Incremented(DerivedParameterNode):
+    derived = 0
+
+    def derive(self, raw=P('Raw')):
+        Incremented.derived += 1
+        self.array = raw.array + 1
+
+
+class IncrementedMax(KeyPointValueNode):
+    derived = 0
+
+    def derive(self, incremented=P('Incremented')):
+        IncrementedMax.derived += 1
+        index = np.ma.argmax(incremented.array)
+        self.create_kpv(index, incremented.array[index])
+
 
 class TestProcessFlight(unittest.TestCase):
 
+    def test_process_flight_incremental(self):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))})
+        derived_nodes = {
+            'Incremented': Incremented,
+            'Incremented Max': IncrementedMax,
+        }
+        Incremented.derived = IncrementedMax.derived = 0
+
+        def process(initial={}):
+            return process_flight(
+                {'File': 'flight.hdf5', 'Start Datetime': datetime.now()},
+                'G-ABCD', aircraft_info={'Family': 'B737'},
+                requested=['Incremented Max'],
+                include_flight_attributes=False, initial=initial,
+                derived_nodes=derived_nodes, incremental=True)
+
+        # The dependency tree stored within the HDF file is not tested.
+        with mock.patch('analysis_engine.process_flight.hdf_file',
+                        return_value=hdf), \
+                mock.patch('analysis_engine.process_flight.json_graph'):
+            res = process()
+            self.assertEqual((Incremented.derived, IncrementedMax.derived),
+                             (1, 1))
+            fingerprints = hdf.get_attr('node_fingerprints')
+            self.assertEqual(sorted(fingerprints),
+                             ['Incremented', 'Incremented Max'])
+            # Unchanged nodes are reused from the HDF file and initial.
+            res = process(initial=res)
+            self.assertEqual((Incremented.derived, IncrementedMax.derived),
+                             (1, 1))
+            self.assertEqual(res['kpv']['Incremented Max'][0].value, 10)
+            self.assertEqual(hdf.get_attr('node_fingerprints'), fingerprints)
+            # Nodes are derived again once a helper within their module has
+            # changed.
+            with mock.patch(
+                    'analysis_engine.dependency_graph._module_code_hash',
+                    return_value='changed'):
+                res = process(initial=res)
+            self.assertEqual((Incremented.derived, IncrementedMax.derived),
+                             (2, 2))
+            self.assertEqual(res['kpv']['Incremented Max'][0].value, 10)
+            changed = hdf.get_attr('node_fingerprints')
+            self.assertEqual(sorted(changed), sorted(fingerprints))
+            for name in fingerprints:
+                self.assertNotEqual(changed[name], fingerprints[name])
+
     @unittest.skip('Test Not Implemented')
     def test_get_derived_nodes(self):
         '''
@@ -14,4 +429,3 @@ class TestProcessFlight(unittest.TestCase):
         '''
         '''
         self.assertTrue(False, msg='Test not implemented.')
-
@@ -0,0 +1,74 @@
+import networkx as nx
+import simplejson
+import time
+import unittest
+
+from analysis_engine.profiling import active, NodeProfiler, timer
+
+
+class TestTimer(unittest.TestCase):
+
+    def test_timer(self):
+        profiler = NodeProfiler()
+        profile = profiler.profile('Node', 'DerivedParameterNode')
+        # Nothing is recorded without an active profile.
+        with timer('read'):
+            pass
+        self.assertEqual(profile.read, 0)
+        with active(profile):
+            with timer('read'):
+                time.sleep(0.001)
+            with timer('write'):
+                time.sleep(0.001)
+        self.assertTrue(profile.read > 0)
+        self.assertTrue(profile.write > 0)
+        self.assertEqual(profile.align, 0)
+        self.assertTrue(profile.wall >= profile.read + profile.write)
+
+
+class TestNodeProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = nx.DiGraph()
+        self.graph.add_edges_from([
+            ('root', 'Summed Max'),
+            ('Summed Max', 'Summed'),
+            ('Summed', 'Doubled'),
+            ('Summed', 'Tripled'),
+            ('Doubled', 'Raw'),
+            ('Tripled', 'Raw'),
+        ])
+        self.profiler = NodeProfiler(self.graph)
+        for name, node_type, wall in (
+                ('Doubled', 'DerivedParameterNode', 1.0),
+                ('Tripled', 'DerivedParameterNode', 3.0),
+                ('Summed', 'DerivedParameterNode', 0.5),
+                ('Summed Max', 'KeyPointValueNode', 0.25)):
+            profile = self.profiler.profile(name, node_type)
+            profile.wall = wall
+        self.profiler['Tripled'].read = 0.5
+
+    def test_critical_path(self):
+        self.assertEqual(self.profiler.critical_path(),
+                         (['Summed Max', 'Summed', 'Tripled', 'Raw'], 3.75))
+        self.assertEqual(NodeProfiler().critical_path(nx.DiGraph()),
+                         ([], 0.0))
+        self.assertRaises(ValueError, NodeProfiler().critical_path)
+
+    def test_to_json(self):
+        result = simplejson.loads(self.profiler.to_json())
+        self.assertEqual([n['name'] for n in result['nodes']],
+                         ['Doubled', 'Tripled', 'Summed', 'Summed Max'])
+        self.assertEqual(result['nodes'][1]['read'], 0.5)
+        self.assertEqual(result['critical_path'],
+                         {'nodes': ['Summed Max', 'Summed', 'Tripled', 'Raw'],
+                          'wall': 3.75})
+
+    def test_to_folded(self):
+        self.assertEqual(self.profiler.to_folded().splitlines(), [
+            'DerivedParameterNode;Doubled;derive 1000000',
+            'DerivedParameterNode;Tripled;read 500000',
+            'DerivedParameterNode;Tripled;derive 2500000',
+            'DerivedParameterNode;Summed;derive 500000',
+            'KeyPointValueNode;Summed Max;derive 250000',
+        ])
@@ -4,7 +4,7 @@ import os.path
 import pytz
 import unittest
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from analysis_engine.split_hdf_to_segments import (
     _calculate_start_datetime,
@@ -14,7 +14,9 @@ from analysis_engine.split_hdf_to_segments import (
     calculate_fallback_dt,
     has_constant_time,
     split_segments,
+    split_segments_streaming,
     TimebaseError)
+from analysis_engine.library import hash_array, runs_of_ones
 from analysis_engine.node import P, Parameter
 
 from hdfaccess.file import hdf_file
@@ -31,6 +33,30 @@ class MockHDF(dict):
         self.duration = duration
 
 
+class WindowedHDF(MockHDF):
+    '''
+    Records the windows of parameters read with get_param.
+    '''
+    reliable_frame_counter = False
+
+    def __init__(self, *args, **kwargs):
+        super(WindowedHDF, self).__init__(*args, **kwargs)
+        self.reads = []
+
+    def __getitem__(self, name):
+        return self.get_param(name)
+
+    def get_param(self, name, valid_only=False, _slice=None):
+        param = dict.__getitem__(self, name)
+        array = param.array
+        if _slice is not None:
+            array = array[int(_slice.start * param.frequency):
+                          int(_slice.stop * param.frequency)]
+        self.reads.append((name, len(array)))
+        return P(name, array=array.copy(), frequency=param.frequency,
+                 offset=param.offset)
+
+
 class TestInvalidYears(unittest.TestCase):
     def test_mask_invalid_years(self):
         array = np.ma.array([0, 2, 9, 10, 13, 14, 15, 88, 99,
@@ -469,6 +495,69 @@ class TestSplitSegments(unittest.TestCase):
         self.assertEqual(np.ma.argmin(norm_array), 715)
 
 
+class TestSplitSegmentsStreaming(unittest.TestCase):
+    def setUp(self):
+        # Three flights with masked samples spread throughout.
+        flight = np.concatenate([np.zeros(400), np.linspace(0, 250, 300),
+                                 np.ones(2000) * 250,
+                                 np.linspace(250, 0, 300), np.zeros(400)])
+        airspeed = np.ma.concatenate([flight] * 3)
+        airspeed[::97] = np.ma.masked
+        duration = len(airspeed)
+        heading = np.ma.arange(duration, dtype=float) % 360
+        eng = np.ma.where(airspeed.data > 10, 90.0, 1.0)
+        self.airspeed = airspeed
+        self.hdf = WindowedHDF({
+            'Airspeed': P('Airspeed', airspeed),
+            'Heading': P('Heading', heading),
+            'Eng (1) N1': P('Eng (1) N1', eng),
+        }, duration=duration)
+
+    def test_split_segments_streaming(self):
+        expected = split_segments(self.hdf)
+        self.assertEqual(len(expected), 3)
+        for window in (333, 1000, 100000):
+            segment_tuples = split_segments_streaming(self.hdf,
+                                                      window=window)
+            self.assertEqual([s[:2] for s in segment_tuples], expected)
+
+    def test_split_segments_streaming_windows(self):
+        self.hdf.reads = []
+        split_segments_streaming(self.hdf, window=500)
+        self.assertTrue(self.hdf.reads)
+        self.assertTrue(max(l for n, l in self.hdf.reads
+                            if n == 'Airspeed') <= 500)
+        # Other parameters are only read within slow slices and segments.
+        self.assertTrue(max(l for n, l in self.hdf.reads) <
+                        self.hdf.duration / 2)
+
+    def test_split_segments_streaming_hash(self):
+        segment_tuples = split_segments_streaming(self.hdf, boundary=64,
+                                                  window=333)
+        for segment_type, segment_slice, go_fast_index, airspeed_hash in \
+                segment_tuples:
+            self.assertEqual(segment_type, 'START_AND_STOP')
+            # Segments are padded to the boundary when written.
+            start = int(segment_slice.start) // 64 * 64
+            stop = min(int(np.ceil(segment_slice.stop / 64.0)) * 64,
+                       len(self.airspeed))
+            array = self.airspeed[start:stop]
+            self.assertEqual(airspeed_hash, hash_array(
+                array.data, runs_of_ones(array.data > 80), 64))
+            self.assertEqual(go_fast_index,
+                             np.ma.where(array > 80)[0][0])
+
+    def test_split_segments_streaming_masked(self):
+        self.airspeed[:] = np.ma.masked
+        segment_tuples = split_segments_streaming(self.hdf, window=500)
+        self.assertEqual(len(segment_tuples), 1)
+        segment_type, segment_slice, go_fast_index, airspeed_hash = \
+            segment_tuples[0]
+        self.assertEqual(segment_slice, slice(0, self.hdf.duration))
+        self.assertEqual(go_fast_index, None)
+        self.assertEqual(airspeed_hash, None)
+
+
 class mocked_hdf(object):
     def __init__(self, path=None):
         pass
@@ -579,6 +668,18 @@ class TestSegmentInfo(unittest.TestCase):
         self.assertEqual(seg.go_fast_dt, datetime(2012, 12, 25, 0, 6, 52, tzinfo=pytz.utc))
         self.assertEqual(seg.stop_dt, datetime(2012, 12, 25, 11, 29, 56, tzinfo=pytz.utc))
 
+    @mock.patch('analysis_engine.split_hdf_to_segments.sha_hash_file')
+    @mock.patch('analysis_engine.split_hdf_to_segments.hdf_file',
+                new_callable=mocked_hdf)
+    def test_append_segment_info_precomputed(self, hdf_file_patch,
+                                             sha_hash_file_patch):
+        seg = append_segment_info('fast', 'START_AND_STOP', slice(10, 1000),
+                                  4, go_fast_index=100, airspeed_hash='ABC')
+        self.assertEqual(seg.hash, 'ABC')
+        self.assertEqual(seg.go_fast_dt - seg.start_dt,
+                         timedelta(seconds=100))
+        self.assertFalse(sha_hash_file_patch.called)
+
     @mock.patch('analysis_engine.split_hdf_to_segments.sha_hash_file')
     @mock.patch('analysis_engine.split_hdf_to_segments.hdf_file',
                 new_callable=mocked_hdf)